@@ -0,0 +1,85 @@
+"""Compare full hybrid retrieval with the latency-budgeted cascade and ColBERT rescoring modes: latency, overlap with the full result and stage skip rates."""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from chunk.parent_child import chunk_document
+from eval.metrics import overlap_recall_at_k
+from index.dense import DenseIndexer
+from index.embedder import BGEEmbedder
+from index.multivector import MultiVectorIndexer
+from index.sparse import SparseIndexer
+from korean_bulk_ingest import generate_documents
+from retrieval.hybrid import CASCADE, HybridRetriever
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=60, help="생성할 합성 문서 수")
+    parser.add_argument("--queries", type=int, default=30, help="측정할 질의 수")
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--margin", type=float, action="append", help="조기 종료 top-1 상대 마진; 여러 번 지정 가능")
+    parser.add_argument("--budget-ms", type=float, default=None, help="질의당 지연 예산(ms)")
+    parser.add_argument("--colbert-depth", type=int, action="append", help="ColBERT 재점수화 후보 수; 여러 번 지정 가능")
+    parser.add_argument("--no-restrict", action="store_true", help="후속 레그를 희소 후보로 제한하지 않음")
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    embedder = BGEEmbedder()
+    dense = DenseIndexer(embedder=embedder)
+    sparse = SparseIndexer(embedder=embedder, use_lexical_weights=True)
+    multivector = MultiVectorIndexer(embedder=embedder)
+    children = [c for doc in generate_documents(args.docs, 8, 5, args.seed) for c in chunk_document(doc)[1]]
+    batch = embedder.encode_batch([child.text for child in children])
+    for idx, child in enumerate(children):
+        dense.add(child.chunk_id, child.text, vector=batch.dense.row(idx))
+        sparse.add(child.chunk_id, child.text, lexical_weights=batch.lexical[idx])
+        multivector.add(child.chunk_id, child.text, token_vectors=batch.colbert_vectors(idx))
+    print(f"indexed {len(children)} chunks")
+
+    words = [word for child in children for word in child.text.split()]
+    queries = [" ".join(rng.sample(words, rng.randint(1, 4))) for _ in range(args.queries)]
+    full = HybridRetriever(dense, sparse, multivector)
+    start = time.perf_counter()
+    reference = [[cid for cid, _ in full.query(q, top_n=args.top_n)] for q in queries]
+    full_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    print(f"full: {full_ms:.2f} ms/query")
+    budget = args.budget_ms / 1000 if args.budget_ms is not None else None
+    for margin in args.margin or [0.1, 0.3, 0.6]:
+        cascade = HybridRetriever(
+            dense,
+            sparse,
+            multivector,
+            cascade=True,
+            cascade_margin=margin,
+            latency_budget=budget,
+            cascade_restrict=not args.no_restrict,
+        )
+        start = time.perf_counter()
+        results = [[cid for cid, _ in cascade.query(q, top_n=args.top_n)] for q in queries]
+        cascade_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        overlap = overlap_recall_at_k(results, reference, k=args.top_n)
+        skips = " ".join(f"{leg}={cascade.cascade_stats.skip_rate(leg):.0%}" for leg in CASCADE[1:])
+        print(f"cascade margin={margin}: {cascade_ms:.2f} ms/query overlap@{args.top_n}={overlap:.3f} skipped {skips}")
+    for mode in ("rrf", "score"):
+        for depth in args.colbert_depth or [50, 100]:
+            rescoring = HybridRetriever(dense, sparse, multivector, colbert_mode=mode, colbert_depth=depth)
+            start = time.perf_counter()
+            results = [[cid for cid, _ in rescoring.query(q, top_n=args.top_n)] for q in queries]
+            rescore_ms = (time.perf_counter() - start) * 1000 / len(queries)
+            overlap = overlap_recall_at_k(results, reference, k=args.top_n)
+            print(f"colbert {mode} depth={depth}: {rescore_ms:.2f} ms/query overlap@{args.top_n}={overlap:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Compare exact, HNSW and quantized dense search: recall@k against exact search, latency and bytes per vector."""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from eval.metrics import overlap_recall_at_k
+from index.dense import DenseIndexer
+from index.embedder import BGEEmbedder
+
+VOCAB = [
+    "변압기", "절연유", "수소", "아세틸렌", "부분방전", "진단", "기준", "농도", "결함", "운전",
+    "finance", "research", "engineering", "compliance", "legal", "monitoring", "gas", "analysis",
+]
+
+
+def random_texts(count: int, words: int, rng: random.Random) -> List[str]:
+    return [" ".join(rng.choice(VOCAB) for _ in range(words)) + f" #{idx}" for idx in range(count)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=1000, help="인덱싱할 합성 청크 수")
+    parser.add_argument("--queries", type=int, default=50, help="측정할 질의 수")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--m", type=int, default=16, help="HNSW 노드당 링크 수")
+    parser.add_argument("--ef-construction", type=int, default=100)
+    parser.add_argument("--ef-search", type=int, action="append", help="측정할 ef_search 값; 여러 번 지정 가능")
+    parser.add_argument("--pq-subvectors", type=int, default=16)
+    parser.add_argument("--pq-bits", type=int, default=8)
+    parser.add_argument("--rescore-k", type=int, default=50, help="양자화 후보 중 정확 재점수화할 개수")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    embedder = BGEEmbedder()
+    texts = random_texts(args.chunks, 12, rng)
+    index = DenseIndexer(embedder=embedder, mode="hnsw", hnsw_m=args.m, ef_construction=args.ef_construction)
+    start = time.perf_counter()
+    for idx, text in enumerate(texts):
+        index.add(f"c{idx}", text)
+    print(f"build: {args.chunks} vectors in {time.perf_counter() - start:.2f}s")
+
+    q_vecs = [embedder.encode_dense(q) for q in random_texts(args.queries, 4, rng)]
+    start = time.perf_counter()
+    exact = [[cid for cid, _ in index.query_vector(q, args.top_k, exact=True)] for q in q_vecs]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(q_vecs)
+    print(f"exact: {exact_ms:.2f} ms/query")
+    for ef in args.ef_search or [16, 32, 64, 128]:
+        start = time.perf_counter()
+        approx = [[cid for cid, _ in index.query_vector(q, args.top_k, ef_search=ef)] for q in q_vecs]
+        ann_ms = (time.perf_counter() - start) * 1000 / len(q_vecs)
+        recall = overlap_recall_at_k(approx, exact, k=args.top_k)
+        print(f"hnsw ef_search={ef}: recall@{args.top_k}={recall:.3f} {ann_ms:.2f} ms/query")
+
+    print(f"float32: {index.bytes_per_vector()} bytes/vector")
+    modes = [
+        ("int8", {"quantization": "int8"}),
+        ("pq", {"quantization": "pq", "pq_subvectors": args.pq_subvectors, "pq_bits": args.pq_bits}),
+        ("pq+rescore", {"quantization": "pq", "pq_subvectors": args.pq_subvectors, "pq_bits": args.pq_bits, "rescore_k": args.rescore_k}),
+    ]
+    for label, options in modes:
+        quantized = DenseIndexer(embedder=embedder, **options)
+        for idx, text in enumerate(texts):
+            quantized.add(f"c{idx}", text, vector=index.vector(f"c{idx}"))
+        start = time.perf_counter()
+        quantized.train_quantizer()
+        train_s = time.perf_counter() - start
+        start = time.perf_counter()
+        approx = [[cid for cid, _ in quantized.query_vector(q, args.top_k)] for q in q_vecs]
+        q_ms = (time.perf_counter() - start) * 1000 / len(q_vecs)
+        recall = overlap_recall_at_k(approx, exact, k=args.top_k)
+        print(
+            f"{label}: {quantized.bytes_per_vector()} bytes/vector recall@{args.top_k}={recall:.3f} "
+            f"{q_ms:.2f} ms/query (train {train_s:.1f}s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
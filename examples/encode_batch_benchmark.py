@@ -0,0 +1,49 @@
+"""Measure BGEEmbedder.encode_batch throughput (chunks/sec) against the number of worker processes."""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from chunk.parent_child import chunk_document
+from index.embedder import BGEEmbedder
+from korean_bulk_ingest import generate_documents
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=200, help="생성할 합성 문서 수")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, action="append", help="측정할 프로세스 수; 여러 번 지정 가능")
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    texts = [
+        child.text
+        for doc in generate_documents(args.docs, 8, 5, args.seed)
+        for child in chunk_document(doc, target_min_tokens=50, target_max_tokens=120)[1]
+    ]
+    print(f"{len(texts)} chunks, {os.cpu_count()} CPUs")
+    for workers in args.workers or [0, 2, 4]:
+        embedder = BGEEmbedder(workers=workers, batch_size=args.batch_size)
+        # Warm up the pool (process start-up is a one-off cost) on a single batch pair.
+        embedder.encode_batch(texts[: 2 * args.batch_size])
+        start = time.perf_counter()
+        batch = embedder.encode_batch(texts)
+        elapsed = time.perf_counter() - start
+        embedder.close()
+        print(
+            f"workers={workers}: {len(texts) / elapsed:.0f} chunks/s "
+            f"({len(batch.colbert)} token vectors, {elapsed:.2f}s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -90,8 +90,7 @@ def generate_documents(
 
 
 def ingest_documents(service: SearchService, documents: Iterable[DocumentBlocks]) -> None:
-    for doc in documents:
-        service.ingest(doc)
+    service.ingest_many(documents)
 
 
 def run_queries(service: SearchService, queries: List[str], top_n: int) -> None:
@@ -109,6 +108,7 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--sentences", type=int, default=5, help="단락당 문장 수")
     parser.add_argument("--seed", type=int, default=13, help="재현 가능한 결과를 위한 시드")
     parser.add_argument("--top-n", type=int, default=3, help="질의당 반환할 상위 결과 수")
+    parser.add_argument("--workers", type=int, default=0, help="임베딩 인코딩 프로세스 수 (0이면 현재 프로세스)")
     return parser.parse_args()
 
 
@@ -120,8 +120,9 @@ def main() -> None:
         sentences_per_paragraph=args.sentences,
         seed=args.seed,
     )
-    service = SearchService()
+    service = SearchService(encode_workers=args.workers)
     ingest_documents(service, documents)
+    service.embedder.close()
     print(f"총 {len(documents)}개 문서, {len(service.children)}개 하위 청크가 인덱싱되었습니다.")
     sample_queries = [
         "에너지 전환 투자 전략",
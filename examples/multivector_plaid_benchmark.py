@@ -0,0 +1,85 @@
+"""Compare exhaustive, centroid-probed (PLAID-style) and compressed late-interaction search: recall@k, latency, bytes per token and score error."""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from chunk.parent_child import chunk_document
+from eval.metrics import overlap_recall_at_k
+from index.embedder import BGEEmbedder
+from index.multivector import MultiVectorIndexer
+from korean_bulk_ingest import generate_documents
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=60, help="생성할 합성 문서 수")
+    parser.add_argument("--queries", type=int, default=20, help="측정할 질의 수")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--centroids", type=int, default=32, help="토큰 벡터 군집(centroid) 수")
+    parser.add_argument("--nprobe", type=int, action="append", help="질의 토큰당 탐색할 centroid 수; 여러 번 지정 가능")
+    parser.add_argument("--ndocs", type=int, action="append", help="정확 MaxSim으로 재점수화할 후보 수; 여러 번 지정 가능")
+    parser.add_argument("--residual-bits", type=int, action="append", help="잔차 양자화 비트 수; 여러 번 지정 가능")
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    embedder = BGEEmbedder()
+    index = MultiVectorIndexer(embedder=embedder, num_centroids=args.centroids)
+    children = [c for doc in generate_documents(args.docs, 8, 5, args.seed) for c in chunk_document(doc)[1]]
+    start = time.perf_counter()
+    for child in children:
+        index.add(child.chunk_id, child.text)
+    print(f"build: {len(children)} chunks / {len(index.matrix)} tokens in {time.perf_counter() - start:.2f}s")
+    start = time.perf_counter()
+    index.train_centroids()
+    print(f"train: {len(index.centroids)} centroids in {time.perf_counter() - start:.2f}s")
+
+    words = [word for child in children for word in child.text.split()]
+    q_vecs = [embedder.encode_colbert(" ".join(rng.sample(words, 4))) for _ in range(args.queries)]
+    start = time.perf_counter()
+    exact = [[cid for cid, _ in index.query_vectors(q, args.top_k, exhaustive=True)] for q in q_vecs]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(q_vecs)
+    print(f"exhaustive: {exact_ms:.2f} ms/query")
+    for nprobe in args.nprobe or [1, 4]:
+        for ndocs in args.ndocs or [0, 100, 50]:
+            candidates = sum(len(index.candidates(q, nprobe, ndocs)) for q in q_vecs) / len(q_vecs)
+            start = time.perf_counter()
+            approx = [[cid for cid, _ in index.query_vectors(q, args.top_k, nprobe=nprobe, ndocs=ndocs)] for q in q_vecs]
+            probe_ms = (time.perf_counter() - start) * 1000 / len(q_vecs)
+            recall = overlap_recall_at_k(approx, exact, k=args.top_k)
+            print(
+                f"nprobe={nprobe} ndocs={ndocs}: recall@{args.top_k}={recall:.3f} "
+                f"candidates={candidates:.0f}/{len(index)} {probe_ms:.2f} ms/query"
+            )
+
+    exact_scores = [index.maxsim_scores(q) for q in q_vecs]
+    print(f"float32: {index.bytes_per_token()} bytes/token")
+    modes = [("float16", {"compression": "float16"})] + [
+        (f"residual {bits}-bit", {"compression": "residual", "residual_bits": bits}) for bits in args.residual_bits or [2, 4]
+    ]
+    for label, options in modes:
+        compressed = MultiVectorIndexer(embedder=embedder, num_centroids=args.centroids, **options)
+        for child in children:
+            compressed.add(child.chunk_id, child.text)
+        compressed.train_centroids()
+        start = time.perf_counter()
+        approx = [[cid for cid, _ in compressed.query_vectors(q, args.top_k, exhaustive=True)] for q in q_vecs]
+        q_ms = (time.perf_counter() - start) * 1000 / len(q_vecs)
+        errors = [abs(a - b) for q, scores in zip(q_vecs, exact_scores) for a, b in zip(compressed.maxsim_scores(q), scores)]
+        recall = overlap_recall_at_k(approx, exact, k=args.top_k)
+        print(
+            f"{label}: {compressed.bytes_per_token()} bytes/token recall@{args.top_k}={recall:.3f} "
+            f"score error mean={sum(errors) / len(errors):.4f} max={max(errors):.4f} {q_ms:.2f} ms/query"
+        )
+
+if __name__ == "__main__":
+    main()
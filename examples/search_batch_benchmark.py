@@ -0,0 +1,47 @@
+"""Compare SearchService.search one query at a time with SearchService.search_batch: queries/sec and per-leg time."""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from korean_bulk_ingest import generate_documents
+from serve.api import SearchService
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=60, help="생성할 합성 문서 수")
+    parser.add_argument("--queries", type=int, default=64, help="측정할 질의 수")
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    service = SearchService(query_cache_size=0)
+    service.ingest_many(generate_documents(args.docs, 8, 5, args.seed))
+    words = [word for child in service.children.values() for word in child.text.split()]
+    queries = [" ".join(rng.sample(words, rng.randint(1, 4))) for _ in range(args.queries)]
+    print(f"{len(service.children)} chunks, {len(queries)} queries")
+
+    start = time.perf_counter()
+    sequential = [service.search(query, top_n=args.top_n) for query in queries]
+    sequential_s = time.perf_counter() - start
+    print(f"search: {len(queries) / sequential_s:.1f} queries/s")
+    start = time.perf_counter()
+    batched = service.search_batch(queries, top_n=args.top_n)
+    batch_s = time.perf_counter() - start
+    legs = " ".join(f"{leg}={seconds * 1000:.0f}ms" for leg, seconds in service.retriever.last_query_stats.latencies.items())
+    print(f"search_batch: {len(queries) / batch_s:.1f} queries/s ({legs})")
+    print(f"identical results: {batched == sequential}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Throughput of ShardedSearchService against shard count, with a single-process SearchService as baseline."""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from korean_bulk_ingest import generate_documents
+from serve.api import SearchService
+from serve.shard import ShardedSearchService
+
+
+def run_batches(service, queries, batch_size: int, top_n: int):
+    start = time.perf_counter()
+    results = []
+    for offset in range(0, len(queries), batch_size):
+        results.extend(service.search_batch(queries[offset : offset + batch_size], top_n=top_n))
+    return results, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=60, help="생성할 합성 문서 수")
+    parser.add_argument("--queries", type=int, default=64, help="측정할 질의 수")
+    parser.add_argument("--batch-size", type=int, default=16, help="search_batch 한 번에 보낼 질의 수")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4], help="측정할 샤드 수 목록")
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    docs = generate_documents(args.docs, 8, 5, args.seed)
+    baseline = SearchService(query_cache_size=0)
+    start = time.perf_counter()
+    baseline.ingest_many(docs)
+    ingest_s = time.perf_counter() - start
+    words = [word for child in baseline.children.values() for word in child.text.split()]
+    queries = [" ".join(rng.sample(words, rng.randint(1, 4))) for _ in range(args.queries)]
+    expected, search_s = run_batches(baseline, queries, args.batch_size, args.top_n)
+    print(f"{len(baseline.children)} chunks, {len(queries)} queries")
+    print(f"single process: ingest {ingest_s:.2f}s, {len(queries) / search_s:.1f} queries/s")
+
+    for shards in args.shards:
+        with ShardedSearchService(shards=shards, query_cache_size=0) as sharded:
+            start = time.perf_counter()
+            sharded.ingest_many(docs)
+            ingest_s = time.perf_counter() - start
+            results, search_s = run_batches(sharded, queries, args.batch_size, args.top_n)
+            print(
+                f"{shards} shard(s) {sharded.chunk_counts}: ingest {ingest_s:.2f}s, "
+                f"{len(queries) / search_s:.1f} queries/s, identical results: {results == expected}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -46,3 +46,13 @@ def faithfulness_proxy(responses: List[Dict]) -> float:
         if resp.get("chunk_id") in resp.get("cited_chunks", [resp.get("chunk_id")]):
             faithful += 1
     return faithful / len(responses) if responses else 0.0
+
+
+def overlap_recall_at_k(approx: List[List[str]], exact: List[List[str]], k: int = 10) -> float:
+    """Mean fraction of the exact top-k recovered by an approximate search."""
+
+    total = 0.0
+    for pred, gold in zip(approx, exact):
+        expected = set(gold[:k])
+        total += len(expected & set(pred[:k])) / len(expected) if expected else 1.0
+    return total / len(exact) if exact else 0.0
@@ -1,25 +1,257 @@
-from typing import Dict, List, Optional, Tuple
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
 from index.embedder import BGEEmbedder
+from index.hnsw import HNSWIndex
+from index.matrix import FloatMatrix, select_top_k
+from index.quantize import ProductQuantizer, ScalarQuantizer
+from index.storage import open_index, write_index, writable
 
 
 class DenseIndexer:
-    """Dense indexer backed by the BGE-m3 embedder."""
+    """
+    Dense indexer backed by the BGE-m3 embedder.
 
-    def __init__(self, embedder: Optional[BGEEmbedder] = None) -> None:
+    Vectors live in one contiguous float32 matrix; ``chunk_ids``/``rows`` map
+    between chunk ids and matrix rows so a query is a single matrix-vector
+    product followed by partial top-k selection.
+
+    ``mode="hnsw"`` additionally links every row into an HNSW graph so queries
+    visit a sub-linear number of vectors. ``hnsw_m``/``ef_construction`` are
+    build-time knobs and ``ef_search`` is the default query-time beam width.
+
+    ``quantization="int8"`` or ``"pq"`` stores compact codes instead of floats.
+    The quantizer is trained from the vectors added so far, either explicitly
+    via ``train_quantizer()`` or on the first query; afterwards the float
+    matrix is released unless ``rescore_k`` asks for exact re-scoring of the
+    top quantized candidates.
+
+    ``save()`` writes the index to a versioned file that ``open()`` maps
+    read-only, so a new process can serve queries without re-encoding.
+    """
+
+    def __init__(
+        self,
+        embedder: Optional[BGEEmbedder] = None,
+        mode: str = "exact",
+        hnsw_m: int = 16,
+        ef_construction: int = 100,
+        ef_search: int = 64,
+        quantization: Optional[str] = None,
+        pq_subvectors: int = 16,
+        pq_bits: int = 8,
+        rescore_k: int = 0,
+    ) -> None:
+        if mode not in {"exact", "hnsw"}:
+            raise ValueError(f"Unsupported dense mode: {mode}")
+        if quantization not in {None, "int8", "pq"}:
+            raise ValueError(f"Unsupported quantization: {quantization}")
+        if quantization and mode == "hnsw":
+            raise ValueError("Quantized storage is only supported in exact mode")
         self.embedder = embedder or BGEEmbedder()
-        self.vectors: Dict[str, List[float]] = {}
+        self.options: Dict[str, Any] = {
+            "mode": mode,
+            "hnsw_m": hnsw_m,
+            "ef_construction": ef_construction,
+            "ef_search": ef_search,
+            "quantization": quantization,
+            "pq_subvectors": pq_subvectors,
+            "pq_bits": pq_bits,
+            "rescore_k": rescore_k,
+        }
+        self.mode = mode
+        self.ef_search = ef_search
+        self.matrix = FloatMatrix(self.embedder.dim)
+        self.hnsw = HNSWIndex(self.matrix, m=hnsw_m, ef_construction=ef_construction) if mode == "hnsw" else None
+        self.quantizer: Optional[Union[ScalarQuantizer, ProductQuantizer]] = None
+        if quantization == "int8":
+            self.quantizer = ScalarQuantizer(self.embedder.dim)
+        elif quantization == "pq":
+            self.quantizer = ProductQuantizer(self.embedder.dim, subvectors=pq_subvectors, bits=pq_bits)
+        self.codes = array(self.quantizer.code_typecode) if self.quantizer else None
+        self.rescore_k = rescore_k
+        self.chunk_ids: List[str] = []
+        self.rows: Dict[str, int] = {}
         self.texts: Dict[str, str] = {}
 
-    def add(self, chunk_id: str, text: str, vector: Optional[List[float]] = None) -> None:
-        self.vectors[chunk_id] = vector or self.embedder.encode_dense(text)
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    @property
+    def _quantized(self) -> bool:
+        return self.quantizer is not None and self.quantizer.trained
+
+    @property
+    def _has_floats(self) -> bool:
+        return len(self.matrix) == len(self.chunk_ids)
+
+    def add(self, chunk_id: str, text: str, vector: Optional[Sequence[float]] = None) -> None:
+        vec = vector if vector is not None else self.embedder.encode_dense(text)
+        row = self.rows.get(chunk_id)
+        keep_floats = not self._quantized or self.rescore_k > 0
+        if row is None:
+            row = len(self.chunk_ids)
+            self.rows[chunk_id] = row
+            self.chunk_ids.append(chunk_id)
+            if keep_floats:
+                self.matrix.append(vec)
+            if self._quantized:
+                self.codes = writable(self.codes, self.quantizer.code_typecode)
+                self.codes.extend(self.quantizer.encode(vec))
+            if self.hnsw is not None:
+                self.hnsw.insert(row)
+        else:
+            if keep_floats:
+                self.matrix.set_row(row, vec)
+            if self.hnsw is not None:
+                self.hnsw.update(row)
+            if self._quantized:
+                size = self.quantizer.code_size
+                self.codes = writable(self.codes, self.quantizer.code_typecode)
+                self.codes[row * size : (row + 1) * size] = self.quantizer.encode(vec)
         self.texts[chunk_id] = text
 
-    def query(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
-        q_vec = self.embedder.encode_dense(query)
-        results: List[Tuple[str, float]] = []
-        for chunk_id, vec in self.vectors.items():
-            score = sum(a * b for a, b in zip(q_vec, vec))
-            results.append((chunk_id, score))
-        results.sort(key=lambda x: x[1], reverse=True)
-        return results[:top_k]
+    def train_quantizer(self) -> None:
+        """
+        Train the quantizer on the indexed vectors and encode all of them.
+
+        Once the float matrix has been released, retraining (e.g. after more
+        adds) trains on the vectors decoded from the current codes.
+        """
+
+        if self.quantizer is None:
+            raise ValueError("DenseIndexer was created without quantization")
+        if not self.chunk_ids:
+            raise ValueError("No vectors to train the quantizer on")
+        vectors = [self.vector(cid) for cid in self.chunk_ids]
+        self.quantizer.train(vectors)
+        self.codes = array(self.quantizer.code_typecode)
+        for vec in vectors:
+            self.codes.extend(self.quantizer.encode(vec))
+        if not self.rescore_k:
+            self.matrix = FloatMatrix(self.embedder.dim)
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Write the index (vectors, codes, graph and ids) to ``path``."""
+
+        header = {
+            "dim": self.matrix.dim,
+            "options": self.options,
+            "chunk_ids": self.chunk_ids,
+            "texts": [self.texts[cid] for cid in self.chunk_ids],
+            "quantizer": self.quantizer.state() if self._quantized else None,
+            "hnsw": self.hnsw.state() if self.hnsw is not None else None,
+        }
+        sections = {"vectors": self.matrix.data}
+        if self._quantized:
+            sections["codes"] = self.codes
+        write_index(path, "dense", header, sections)
+
+    @classmethod
+    def open(cls, path: Union[str, Path], embedder: Optional[BGEEmbedder] = None) -> "DenseIndexer":
+        """Map an index written by ``save()``; vectors are not copied until modified."""
+
+        header, sections = open_index(path, "dense")
+        embedder = embedder or BGEEmbedder(dim=header["dim"])
+        if embedder.dim != header["dim"]:
+            raise ValueError(f"Index dim {header['dim']} does not match embedder dim {embedder.dim}")
+        index = cls(embedder=embedder, **header["options"])
+        index.matrix.data = sections["vectors"]
+        index.chunk_ids = header["chunk_ids"]
+        index.rows = {cid: row for row, cid in enumerate(index.chunk_ids)}
+        index.texts = dict(zip(index.chunk_ids, header["texts"]))
+        if header["quantizer"] is not None:
+            index.quantizer.load_state(header["quantizer"])
+            index.codes = sections["codes"]
+        if header["hnsw"] is not None:
+            index.hnsw.load_state(header["hnsw"])
+        return index
+
+    def bytes_per_vector(self) -> int:
+        """Storage cost of one indexed vector in the current mode."""
+
+        size = 0
+        if self._quantized:
+            size += self.quantizer.code_size * self.codes.itemsize
+        if not self._quantized or self.rescore_k:
+            size += self.matrix.dim * self.matrix.data.itemsize
+        return size
+
+    def vector(self, chunk_id: str) -> List[float]:
+        row = self.rows[chunk_id]
+        if self._has_floats:
+            return self.matrix.row(row).tolist()
+        size = self.quantizer.code_size
+        return self.quantizer.decode(self.codes[row * size : (row + 1) * size])
+
+    def query(self, query: str, top_k: int = 10, allowed: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        return self.query_vector(self.embedder.encode_dense(query), top_k=top_k, allowed=allowed)
+
+    def query_vector(
+        self,
+        q_vec: Sequence[float],
+        top_k: int = 10,
+        exact: bool = False,
+        ef_search: Optional[int] = None,
+        allowed: Optional[Iterable[str]] = None,
+    ) -> List[Tuple[str, float]]:
+        if allowed is not None:
+            # Pre-filtered search scores only the eligible rows (also in HNSW mode, where a
+            # filtered graph walk could miss eligible neighbours).
+            return self.query_candidates(q_vec, allowed, top_k)
+        # Inner products read the query once per row; list items avoid re-boxing array elements.
+        q_vec = list(q_vec)
+        if self.hnsw is not None and not exact:
+            hits = self.hnsw.search(q_vec, top_k, ef=ef_search or self.ef_search)
+            return [(self.chunk_ids[row], score) for score, row in hits]
+        if self.quantizer is not None and not (exact and self._has_floats):
+            return self._query_quantized(q_vec, top_k)
+        scores = self.matrix.dot_all(q_vec)
+        return [(self.chunk_ids[row], score) for row, score in select_top_k(scores, top_k)]
+
+    def query_vectors_batch(
+        self, q_vecs: Sequence[Sequence[float]], top_k: int = 10, allowed: Optional[Iterable[str]] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """``query_vector`` for many queries; exact float search runs as one matrix-matrix product."""
+
+        if self.hnsw is not None or self.quantizer is not None or allowed is not None:
+            allowed = None if allowed is None else list(allowed)
+            return [self.query_vector(q_vec, top_k=top_k, allowed=allowed) for q_vec in q_vecs]
+        return [
+            [(self.chunk_ids[row], score) for row, score in select_top_k(scores, top_k)]
+            for scores in self.matrix.dot_many(q_vecs)
+        ]
+
+    def query_candidates(
+        self, q_vec: Sequence[float], chunk_ids: Iterable[str], top_k: int = 10
+    ) -> List[Tuple[str, float]]:
+        """Score only ``chunk_ids`` (unknown ids are ignored), best ``top_k`` first."""
+
+        q_vec = list(q_vec)
+        rows = [self.rows[cid] for cid in chunk_ids if cid in self.rows]
+        if self._has_floats:
+            scores = [self.matrix.dot(row, q_vec) for row in rows]
+        else:
+            if not self.quantizer.trained:
+                self.train_quantizer()
+            scorer = self.quantizer.query_scorer(q_vec)
+            size = self.quantizer.code_size
+            view = memoryview(self.codes)
+            scores = [scorer(view[row * size : (row + 1) * size]) for row in rows]
+        return [(self.chunk_ids[rows[pos]], score) for pos, score in select_top_k(scores, top_k)]
+
+    def _query_quantized(self, q_vec: Sequence[float], top_k: int) -> List[Tuple[str, float]]:
+        if not self.chunk_ids:
+            return []
+        if not self.quantizer.trained:
+            self.train_quantizer()
+        scorer = self.quantizer.query_scorer(q_vec)
+        size = self.quantizer.code_size
+        view = memoryview(self.codes)
+        scores = [scorer(view[start : start + size]) for start in range(0, len(self.codes), size)]
+        hits = select_top_k(scores, max(top_k, self.rescore_k))
+        if self.rescore_k and self._has_floats:
+            hits = [(row, self.matrix.dot(row, q_vec)) for row, _ in hits]
+            hits.sort(key=lambda x: x[1], reverse=True)
+        return [(self.chunk_ids[row], score) for row, score in hits[:top_k]]
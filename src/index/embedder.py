@@ -1,6 +1,54 @@
 import hashlib
 import math
-from typing import Dict, List
+import struct
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from operator import mul
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from index.matrix import FloatMatrix
+
+
+@dataclass
+class EncodedText:
+    """All three BGE-m3 outputs for one text, as produced by ``encode_all``."""
+
+    dense: array
+    lexical: Dict[str, float]
+    colbert: List[array]
+
+
+@dataclass
+class EncodedBatch:
+    """
+    Stacked outputs of ``encode_batch``; fields not requested are ``None``.
+
+    ``dense`` has one row per text. ColBERT vectors of all texts are packed
+    into ``colbert``; text ``i`` owns rows ``colbert_offsets[i]:colbert_offsets[i + 1]``.
+    """
+
+    dense: Optional[FloatMatrix]
+    lexical: Optional[List[Dict[str, float]]]
+    colbert: Optional[FloatMatrix]
+    colbert_offsets: Optional[array]
+
+    def colbert_vectors(self, idx: int) -> List[memoryview]:
+        return [self.colbert.row(r) for r in range(self.colbert_offsets[idx], self.colbert_offsets[idx + 1])]
+
+
+_Shard = Tuple[bytes, Optional[List[Dict[str, float]]], bytes, List[int]]
+_worker_embedder: Optional["BGEEmbedder"] = None
+
+
+def _init_worker(dim: int, colbert_dim: int, token_cache_size: int) -> None:
+    global _worker_embedder
+    _worker_embedder = BGEEmbedder(dim=dim, colbert_dim=colbert_dim, token_cache_size=token_cache_size)
+
+
+def _encode_shard(texts: List[str], outputs: Tuple[bool, bool, bool]) -> _Shard:
+    return _worker_embedder._encode_shard(texts, outputs)
 
 
 class BGEEmbedder:
@@ -14,22 +62,48 @@ class BGEEmbedder:
 
     This helper mirrors that contract using stable hashing so the rest of the
     pipeline can be exercised without external dependencies.
+
+    ``encode_all`` returns the three outputs from a single tokenization, like
+    one model forward pass. Per-token ColBERT vectors and lexical weights are
+    memoized in an LRU of ``token_cache_size`` entries; the cached float32
+    arrays are shared between calls and must not be modified.
+
+    ``encode_batch`` encodes a list of texts into stacked arrays, the shape a
+    batching model backend returns. With ``workers > 1`` batches of
+    ``batch_size`` texts are spread over a process pool that lives until
+    ``close()``.
     """
 
-    def __init__(self, dim: int = 1024, colbert_dim: int = 128) -> None:
+    def __init__(
+        self,
+        dim: int = 1024,
+        colbert_dim: int = 128,
+        token_cache_size: int = 65536,
+        workers: int = 0,
+        batch_size: int = 64,
+    ) -> None:
         self.dim = dim
         self.colbert_dim = colbert_dim
+        self.token_cache_size = token_cache_size
+        self.workers = workers
+        self.batch_size = batch_size
+        self._token_cache: "OrderedDict[str, Tuple[array, float]]" = OrderedDict()
+        self._pool: Optional[ProcessPoolExecutor] = None
 
     def _tokenize(self, text: str) -> List[str]:
         return [tok for tok in text.lower().split() if tok]
 
     def _hash_to_unit_vector(self, text: str, dim: int) -> List[float]:
-        h = hashlib.sha256(text.encode("utf-8")).digest()
-        numbers = [int.from_bytes(h[i : i + 4], "big") for i in range(0, len(h), 4)]
-        vec = [numbers[i % len(numbers)] % 1000 / 1000.0 for i in range(dim)]
-        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        numbers = struct.unpack(">8I", hashlib.sha256(text.encode("utf-8")).digest())
+        # The vector is the 8 hash-derived values repeated up to ``dim``.
+        vec = ([n % 1000 / 1000.0 for n in numbers] * (dim // len(numbers) + 1))[:dim]
+        norm = math.sqrt(sum(map(mul, vec, vec))) or 1.0
         return [v / norm for v in vec]
 
+    def _token_weight(self, tok: str) -> float:
+        # Use a stable hash-derived weight to mimic learned lexical scores.
+        return (int(hashlib.md5(tok.encode("utf-8")).hexdigest(), 16) % 1000) / 1000.0
+
     def encode_dense(self, text: str) -> List[float]:
         """Return a deterministic dense embedding for the full text."""
 
@@ -42,9 +116,7 @@ class BGEEmbedder:
         tokens = self._tokenize(text)
         total = len(tokens) or 1
         for tok in tokens:
-            # Use a stable hash-derived weight to mimic learned lexical scores.
-            weight = (int(hashlib.md5(tok.encode("utf-8")).hexdigest(), 16) % 1000) / 1000.0
-            weights[tok] = weights.get(tok, 0.0) + weight
+            weights[tok] = weights.get(tok, 0.0) + self._token_weight(tok)
         # Normalize by token count to keep magnitudes comparable across lengths.
         return {tok: w / total for tok, w in weights.items()}
 
@@ -57,3 +129,109 @@ class BGEEmbedder:
         """
 
         return [self._hash_to_unit_vector(tok, self.colbert_dim) for tok in self._tokenize(text)]
+
+    def _token_entry(self, tok: str) -> Tuple[array, float]:
+        entry = self._token_cache.get(tok)
+        if entry is None:
+            entry = (array("f", self._hash_to_unit_vector(tok, self.colbert_dim)), self._token_weight(tok))
+            self._token_cache[tok] = entry
+            if len(self._token_cache) > self.token_cache_size:
+                self._token_cache.popitem(last=False)
+        else:
+            self._token_cache.move_to_end(tok)
+        return entry
+
+    def encode_all(self, text: str) -> EncodedText:
+        """
+        Dense, lexical and ColBERT outputs from one tokenization.
+
+        Values match ``encode_dense``/``encode_lexical``/``encode_colbert``;
+        the vectors are float32 arrays, the precision the indexes store.
+        """
+
+        lexical, colbert = self._encode_tokens(text)
+        return EncodedText(dense=array("f", self._hash_to_unit_vector(text, self.dim)), lexical=lexical, colbert=colbert)
+
+    def _encode_tokens(self, text: str) -> Tuple[Dict[str, float], List[array]]:
+        tokens = self._tokenize(text)
+        weights: Dict[str, float] = {}
+        colbert: List[array] = []
+        for tok in tokens:
+            vec, weight = self._token_entry(tok)
+            colbert.append(vec)
+            weights[tok] = weights.get(tok, 0.0) + weight
+        total = len(tokens) or 1
+        return {tok: w / total for tok, w in weights.items()}, colbert
+
+    def _encode_shard(self, texts: Sequence[str], outputs: Tuple[bool, bool, bool]) -> _Shard:
+        return_dense, return_lexical, return_colbert = outputs
+        dense = array("f")
+        lexical: Optional[List[Dict[str, float]]] = [] if return_lexical else None
+        colbert = array("f")
+        counts: List[int] = []
+        for text in texts:
+            if return_dense:
+                dense.extend(self._hash_to_unit_vector(text, self.dim))
+            if not (return_lexical or return_colbert):
+                continue
+            weights, vectors = self._encode_tokens(text)
+            if return_lexical:
+                lexical.append(weights)
+            if return_colbert:
+                for vec in vectors:
+                    colbert.extend(vec)
+                counts.append(len(vectors))
+        return dense.tobytes(), lexical, colbert.tobytes(), counts
+
+    def encode_batch(
+        self,
+        texts: Sequence[str],
+        return_dense: bool = True,
+        return_lexical: bool = True,
+        return_colbert: bool = True,
+    ) -> EncodedBatch:
+        """Encode ``texts`` in batches, in order, optionally across the worker pool."""
+
+        outputs = (return_dense, return_lexical, return_colbert)
+        batches = [list(texts[i : i + self.batch_size]) for i in range(0, len(texts), self.batch_size)]
+        if self.workers > 1 and len(batches) > 1:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_init_worker,
+                    initargs=(self.dim, self.colbert_dim, self.token_cache_size),
+                )
+            shards = list(self._pool.map(_encode_shard, batches, [outputs] * len(batches)))
+        else:
+            shards = [self._encode_shard(batch, outputs) for batch in batches]
+        dense = FloatMatrix(self.dim) if return_dense else None
+        lexical: Optional[List[Dict[str, float]]] = [] if return_lexical else None
+        colbert = FloatMatrix(self.colbert_dim) if return_colbert else None
+        offsets = array("q", [0]) if return_colbert else None
+        for dense_bytes, shard_lexical, colbert_bytes, counts in shards:
+            if return_dense:
+                dense.data.frombytes(dense_bytes)
+            if return_lexical:
+                lexical.extend(shard_lexical)
+            if return_colbert:
+                colbert.data.frombytes(colbert_bytes)
+                for count in counts:
+                    offsets.append(offsets[-1] + count)
+        return EncodedBatch(dense=dense, lexical=lexical, colbert=colbert, colbert_offsets=offsets)
+
+    def encode_dense_batch(self, texts: Sequence[str]) -> FloatMatrix:
+        return self.encode_batch(texts, return_lexical=False, return_colbert=False).dense
+
+    def encode_lexical_batch(self, texts: Sequence[str]) -> List[Dict[str, float]]:
+        return self.encode_batch(texts, return_dense=False, return_colbert=False).lexical
+
+    def encode_colbert_batch(self, texts: Sequence[str]) -> Tuple[FloatMatrix, array]:
+        batch = self.encode_batch(texts, return_dense=False, return_lexical=False)
+        return batch.colbert, batch.colbert_offsets
+
+    def close(self) -> None:
+        """Shut down the worker pool, if one was started."""
+
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from index.embedder import BGEEmbedder, EncodedBatch
+from index.matrix import FloatMatrix
+
+# (dense float32 bytes, lexical weights, colbert float32 bytes)
+_Entry = Tuple[bytes, Dict[str, float], bytes]
+
+
+@dataclass
+class CacheStats:
+    """Counters exposed as ``EmbeddingCache.stats``."""
+
+    hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+class EmbeddingCache:
+    """
+    Content-addressed cache of ``BGEEmbedder`` outputs.
+
+    Entries are keyed by a hash of the embedder configuration and the chunk
+    text, so unchanged chunks skip the encoder on re-ingest and a different
+    model or dimension never reuses stale vectors. The memory tier is an LRU
+    of ``max_entries`` texts (0 disables it); with ``path`` set, every
+    encoded text is also written to a SQLite file that survives restarts and
+    backs memory misses.
+
+    A memory entry holds the text's dense vector, lexical weights and every
+    ColBERT token vector: about ``4 * (dim + tokens * colbert_dim)`` bytes,
+    roughly 60 KB for a 100-token chunk at the default dimensions. The
+    indexes already hold the same data, so keep the memory tier small and
+    use ``path`` to cache a whole corpus.
+    """
+
+    def __init__(
+        self, embedder: BGEEmbedder, max_entries: int = 256, path: Optional[Union[str, Path]] = None
+    ) -> None:
+        self.embedder = embedder
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._memory: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._config = f"{type(embedder).__name__}:dim={embedder.dim}:colbert_dim={embedder.colbert_dim}"
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, dense BLOB, lexical TEXT, colbert BLOB)"
+            )
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self._config}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, entry: _Entry) -> None:
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats.evictions += 1
+
+    def _lookup(self, key: str) -> Optional[_Entry]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            self.stats.hits += 1
+            return entry
+        if self._db is not None:
+            row = self._db.execute("SELECT dense, lexical, colbert FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                entry = (bytes(row[0]), json.loads(row[1]), bytes(row[2]))
+                self._remember(key, entry)
+                self.stats.disk_hits += 1
+                return entry
+        self.stats.misses += 1
+        return None
+
+    def encode_batch(self, texts: Sequence[str]) -> EncodedBatch:
+        """``BGEEmbedder.encode_batch`` with every already-seen text served from the cache."""
+
+        with self._lock:
+            keys = [self.key(text) for text in texts]
+            entries: List[Optional[_Entry]] = [self._lookup(key) for key in keys]
+            missing: Dict[str, int] = {}
+            for idx, entry in enumerate(entries):
+                if entry is None:
+                    missing.setdefault(keys[idx], idx)
+            if missing:
+                encoded = self.embedder.encode_batch([texts[idx] for idx in missing.values()])
+                dim = encoded.colbert.dim
+                colbert = memoryview(encoded.colbert.data)
+                offsets = encoded.colbert_offsets
+                fresh: Dict[str, _Entry] = {}
+                for pos, key in enumerate(missing):
+                    fresh[key] = (
+                        encoded.dense.row(pos).tobytes(),
+                        encoded.lexical[pos],
+                        colbert[offsets[pos] * dim : offsets[pos + 1] * dim].tobytes(),
+                    )
+                    self._remember(key, fresh[key])
+                if self._db is not None:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)",
+                        [(key, dense, json.dumps(lexical), tokens) for key, (dense, lexical, tokens) in fresh.items()],
+                    )
+                    self._db.commit()
+                entries = [entry if entry is not None else fresh[key] for key, entry in zip(keys, entries)]
+        return self._stack(entries)
+
+    def _stack(self, entries: List[_Entry]) -> EncodedBatch:
+        dense = FloatMatrix(self.embedder.dim)
+        colbert = FloatMatrix(self.embedder.colbert_dim)
+        offsets = array("q", [0])
+        lexical: List[Dict[str, float]] = []
+        for dense_bytes, weights, colbert_bytes in entries:
+            dense.data.frombytes(dense_bytes)
+            lexical.append(weights)
+            colbert.data.frombytes(colbert_bytes)
+            offsets.append(len(colbert))
+        return EncodedBatch(dense=dense, lexical=lexical, colbert=colbert, colbert_offsets=offsets)
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,150 @@
+import heapq
+import math
+import random
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from index.matrix import FloatMatrix
+
+
+class HNSWIndex:
+    """
+    Hierarchical navigable small world graph over the rows of a ``FloatMatrix``.
+
+    The graph stores row ids only; vectors stay in the shared matrix and
+    similarity is the inner product (BGE-m3 dense vectors are unit-norm).
+    ``m`` bounds the links per node on upper layers (``2 * m`` on layer 0),
+    ``ef_construction`` is the beam width used while inserting and ``ef`` at
+    query time trades recall for latency.
+    """
+
+    def __init__(self, matrix: FloatMatrix, m: int = 16, ef_construction: int = 100, seed: int = 0) -> None:
+        if m < 2:
+            raise ValueError("m must be at least 2")
+        self.matrix = matrix
+        self.m = m
+        self.m0 = 2 * m
+        self.ef_construction = ef_construction
+        self.level_mult = 1 / math.log(m)
+        self.rng = random.Random(seed)
+        self.layers: List[Dict[int, List[int]]] = []
+        self.entry_point: Optional[int] = None
+        self.max_level = -1
+
+    def __len__(self) -> int:
+        return len(self.layers[0]) if self.layers else 0
+
+    def _sim(self, vec: Sequence[float], node: int) -> float:
+        return self.matrix.dot(node, vec)
+
+    def _random_level(self) -> int:
+        return int(-math.log(1.0 - self.rng.random()) * self.level_mult)
+
+    def _search_layer(
+        self, vec: Sequence[float], entry_points: List[Tuple[float, int]], ef: int, layer: int
+    ) -> List[Tuple[float, int]]:
+        graph = self.layers[layer]
+        visited = {node for _, node in entry_points}
+        candidates = [(-score, node) for score, node in entry_points]
+        heapq.heapify(candidates)
+        results = list(entry_points)
+        heapq.heapify(results)
+        while candidates:
+            neg_score, node = heapq.heappop(candidates)
+            if len(results) >= ef and -neg_score < results[0][0]:
+                break
+            for neighbour in graph.get(node, ()):
+                if neighbour in visited:
+                    continue
+                visited.add(neighbour)
+                score = self._sim(vec, neighbour)
+                if len(results) < ef or score > results[0][0]:
+                    heapq.heappush(candidates, (-score, neighbour))
+                    heapq.heappush(results, (score, neighbour))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return sorted(results, key=lambda x: (-x[0], x[1]))
+
+    def _prune(self, node: int, links: List[int], max_links: int) -> List[int]:
+        base = self.matrix.row(node).tolist()
+        ranked = sorted(links, key=lambda other: -self._sim(base, other))
+        return ranked[:max_links]
+
+    def insert(self, node: int) -> None:
+        """Link matrix row ``node`` into the graph."""
+
+        vec = self.matrix.row(node).tolist()
+        level = self._random_level()
+        while len(self.layers) <= level:
+            self.layers.append({})
+        if self.entry_point is None:
+            for layer in range(level + 1):
+                self.layers[layer][node] = []
+            self.entry_point = node
+            self.max_level = level
+            return
+
+        entry_level = self.max_level
+        self._connect(node, vec, level)
+        for layer in range(entry_level + 1, level + 1):
+            self.layers[layer][node] = []
+        if level > entry_level:
+            self.entry_point = node
+            self.max_level = level
+
+    def update(self, node: int) -> None:
+        """
+        Relink row ``node`` after its vector was overwritten in the matrix.
+
+        The node keeps its level; its links are rebuilt from a fresh search
+        for the new vector and it is linked back from its new neighbours.
+        Links into it from its old neighbourhood stay until pruned.
+        """
+
+        levels = [layer for layer, graph in enumerate(self.layers) if node in graph]
+        if not levels:
+            self.insert(node)
+            return
+        self._connect(node, self.matrix.row(node).tolist(), max(levels))
+
+    def _connect(self, node: int, vec: List[float], level: int) -> None:
+        """Pick ``node``'s neighbours on layers ``level``..0 and link them both ways."""
+
+        entry = [(self._sim(vec, self.entry_point), self.entry_point)]
+        for layer in range(self.max_level, level, -1):
+            entry = self._search_layer(vec, entry, 1, layer)[:1]
+        for layer in range(min(level, self.max_level), -1, -1):
+            found = [hit for hit in self._search_layer(vec, entry, self.ef_construction, layer) if hit[1] != node]
+            max_links = self.m0 if layer == 0 else self.m
+            neighbours = [n for _, n in found[: self.m]]
+            graph = self.layers[layer]
+            graph[node] = neighbours
+            for neighbour in neighbours:
+                links = graph[neighbour]
+                if node in links:
+                    continue
+                links.append(node)
+                if len(links) > max_links:
+                    graph[neighbour] = self._prune(neighbour, links, max_links)
+            entry = found or entry
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "layers": [list(layer.items()) for layer in self.layers],
+            "entry_point": self.entry_point,
+            "max_level": self.max_level,
+        }
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        self.layers = [{node: links for node, links in layer} for layer in state["layers"]]
+        self.entry_point = state["entry_point"]
+        self.max_level = state["max_level"]
+
+    def search(self, vec: Sequence[float], k: int, ef: int = 64) -> List[Tuple[float, int]]:
+        """Return up to ``k`` ``(score, row)`` pairs, best first."""
+
+        if self.entry_point is None or k <= 0:
+            return []
+        entry = [(self._sim(vec, self.entry_point), self.entry_point)]
+        for layer in range(self.max_level, 0, -1):
+            entry = self._search_layer(vec, entry, 1, layer)[:1]
+        return self._search_layer(vec, entry, max(ef, k), 0)[:k]
@@ -0,0 +1,108 @@
+import heapq
+from array import array
+from operator import mul
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
+
+from index.storage import writable
+
+
+class FloatMatrix:
+    """
+    Row-major float matrix kept in a single contiguous ``array``.
+
+    Rows are appended in place, so growth is amortized by the underlying
+    buffer instead of allocating one Python list per vector. The default
+    ``typecode`` of ``"f"`` stores float32 values (4 bytes per dimension).
+
+    ``data`` may also be a read-only ``memoryview`` over a mapped index file;
+    it is copied into an ``array`` only when the matrix is first modified.
+    """
+
+    def __init__(self, dim: int, typecode: str = "f", data: Optional[memoryview] = None) -> None:
+        self.dim = dim
+        self.typecode = typecode
+        self.data: Union[array, memoryview] = array(typecode) if data is None else data
+
+    def __len__(self) -> int:
+        return len(self.data) // self.dim if self.dim else 0
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data) * self.data.itemsize
+
+    def _as_row(self, row: Sequence[float]) -> array:
+        if len(row) != self.dim:
+            raise ValueError(f"Expected vector of dim {self.dim}, got {len(row)}")
+        if isinstance(row, array) and row.typecode == self.typecode:
+            return row
+        if isinstance(row, memoryview) and row.format == self.typecode:
+            return array(self.typecode, row.tobytes())
+        return array(self.typecode, row)
+
+    def append(self, row: Sequence[float]) -> int:
+        """Append ``row`` and return its row index."""
+
+        self.data = writable(self.data, self.typecode)
+        if isinstance(row, memoryview) and row.format == self.typecode and len(row) == self.dim:
+            self.data.frombytes(row.cast("B"))
+        else:
+            self.data.extend(self._as_row(row))
+        return len(self) - 1
+
+    def set_row(self, idx: int, row: Sequence[float]) -> None:
+        start = idx * self.dim
+        self.data = writable(self.data, self.typecode)
+        self.data[start : start + self.dim] = self._as_row(row)
+
+    def row(self, idx: int) -> memoryview:
+        """Zero-copy view of a single row."""
+
+        start = idx * self.dim
+        return memoryview(self.data)[start : start + self.dim]
+
+    def dot(self, idx: int, vec: Sequence[float]) -> float:
+        return sum(map(mul, vec, self.row(idx)))
+
+    def dot_all(self, vec: Sequence[float], rows: Optional[Iterable[int]] = None) -> List[float]:
+        """Matrix-vector product over every row (or only ``rows``)."""
+
+        view = memoryview(self.data)
+        dim = self.dim
+        if rows is None:
+            return [sum(map(mul, vec, view[start : start + dim])) for start in range(0, len(self.data), dim)]
+        return [sum(map(mul, vec, view[r * dim : r * dim + dim])) for r in rows]
+
+    def dot_many(self, vecs: Sequence[Sequence[float]]) -> List[List[float]]:
+        """
+        Matrix-matrix product: one ``dot_all`` score list per vector in ``vecs``.
+
+        Each row is unpacked once and reused for every vector, which is where
+        a batch saves over repeated ``dot_all`` calls; scores are identical.
+        """
+
+        vecs = [list(vec) for vec in vecs]
+        scores: List[List[float]] = [[] for _ in vecs]
+        view = memoryview(self.data)
+        dim = self.dim
+        for start in range(0, len(self.data), dim):
+            row = view[start : start + dim].tolist()
+            for out, vec in zip(scores, vecs):
+                out.append(sum(map(mul, vec, row)))
+        return scores
+
+
+def select_top_k(scores: Sequence[float], k: int) -> List[Tuple[int, float]]:
+    """
+    Partial top-k selection over ``scores``.
+
+    Equivalent to a stable descending sort truncated to ``k`` (ties keep
+    insertion order) without sorting the full list.
+    """
+
+    if k <= 0:
+        return []
+    if k >= len(scores):
+        order = sorted(range(len(scores)), key=scores.__getitem__, reverse=True)
+    else:
+        order = heapq.nlargest(k, range(len(scores)), key=scores.__getitem__)
+    return [(idx, scores[idx]) for idx in order]
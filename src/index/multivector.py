@@ -1,31 +1,420 @@
-from typing import Dict, List, Optional, Tuple
+import random
+from array import array
+from collections.abc import Mapping
+from operator import add, mul
+from pathlib import Path
+from typing import AbstractSet, Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
 from index.embedder import BGEEmbedder
+from index.matrix import FloatMatrix, select_top_k
+from index.quantize import Float16Quantizer, ResidualQuantizer, _sq_norms, kmeans, nearest_centroid
+from index.storage import open_index, write_index, writable
+
+TRAIN_POINTS_PER_CENTROID = 32
+
+
+class PackedTokenVectors(Mapping):
+    """Read-only ``chunk_id -> token vectors`` view over a ``MultiVectorIndexer``."""
+
+    def __init__(self, index: "MultiVectorIndexer") -> None:
+        self.index = index
+
+    def __getitem__(self, chunk_id: str) -> List[List[float]]:
+        idx = self.index.rows[chunk_id]
+        return [self.index._row_vector(r) for r in range(self.index.starts[idx], self.index.ends[idx])]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.index.chunk_ids)
+
+    def __len__(self) -> int:
+        return len(self.index.chunk_ids)
 
 
 class MultiVectorIndexer:
-    """ColBERT-style late interaction indexer using BGE-m3 token vectors."""
+    """
+    ColBERT-style late interaction indexer using BGE-m3 token vectors.
+
+    Token vectors of all chunks live in one packed float32 matrix; chunk ``i``
+    owns rows ``starts[i]:ends[i]``. A query computes each query token's
+    similarity to every distinct token vector once and reduces the results
+    with a max per chunk segment (MaxSim), instead of looping chunk by chunk.
+
+    Re-adding a chunk appends its new tokens and repoints its segment; the
+    orphaned rows are dropped the next time the index is saved.
+
+    With ``num_centroids > 0`` token vectors are clustered with k-means (PLAID
+    style) and every centroid keeps an inverted list of the chunks owning one
+    of its tokens. A query then probes the ``nprobe`` nearest centroids of each
+    query token; if that finds more than ``ndocs`` chunks they are ranked by
+    MaxSim against their tokens' centroids and only the best ``ndocs`` are
+    scored exactly.
+    Centroids are trained by ``train_centroids()`` or on the first query;
+    tokens added later are assigned to the existing centroids.
+
+    ``compression="float16"`` stores every token in half precision;
+    ``compression="residual"`` (requires centroids) stores each token as its
+    centroid id plus a ``residual_bits``-per-dimension residual once the
+    centroids are trained, releasing the float32 matrix. Tokens are decoded on
+    the fly while scoring.
+    """
 
-    def __init__(self, embedder: Optional[BGEEmbedder] = None) -> None:
+    def __init__(
+        self,
+        embedder: Optional[BGEEmbedder] = None,
+        num_centroids: int = 0,
+        nprobe: int = 4,
+        ndocs: int = 256,
+        seed: int = 0,
+        compression: Optional[str] = None,
+        residual_bits: int = 2,
+    ) -> None:
+        if compression not in {None, "float16", "residual"}:
+            raise ValueError(f"Unsupported compression: {compression}")
+        if compression == "residual" and not num_centroids:
+            raise ValueError("Residual compression requires num_centroids > 0")
         self.embedder = embedder or BGEEmbedder()
-        self.token_vectors: Dict[str, List[List[float]]] = {}
+        self.options: Dict[str, Any] = {
+            "num_centroids": num_centroids,
+            "nprobe": nprobe,
+            "ndocs": ndocs,
+            "seed": seed,
+            "compression": compression,
+            "residual_bits": residual_bits,
+        }
+        self.num_centroids = num_centroids
+        self.nprobe = nprobe
+        self.ndocs = ndocs
+        self.matrix = FloatMatrix(self.embedder.colbert_dim)
+        self.chunk_ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.starts = array("q")
+        self.ends = array("q")
+        self._distinct: Optional[Tuple[List[int], array]] = None
+        self.centroids: List[List[float]] = []
+        self._centroid_norms: List[float] = []
+        self.centroid_ids: Union[array, memoryview] = array("I")
+        self.centroid_chunks: List[array] = []
+        self.chunk_centroids: List[array] = []
+        self.compression = compression
+        self.codec: Optional[Union[Float16Quantizer, ResidualQuantizer]] = None
+        if compression == "float16":
+            self.codec = Float16Quantizer(self.embedder.colbert_dim)
+        elif compression == "residual":
+            self.codec = ResidualQuantizer(self.embedder.colbert_dim, bits=residual_bits)
+        self.codes: Union[array, memoryview] = array("B")
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    @property
+    def _encoded(self) -> bool:
+        return self.codec is not None and self.codec.trained
+
+    def _token_count(self) -> int:
+        return len(self.codes) // self.codec.code_size if self._encoded else len(self.matrix)
+
+    def _row_bytes(self, row: int) -> bytes:
+        if self._encoded:
+            size = self.codec.code_size
+            code = bytes(self.codes[row * size : (row + 1) * size])
+            if self.compression == "residual":
+                # A residual code only means something relative to its centroid.
+                return code + self.centroid_ids[row].to_bytes(4, "little")
+            return code
+        return self.matrix.row(row).tobytes()
+
+    def _row_vector(self, row: int) -> List[float]:
+        if not self._encoded:
+            return self.matrix.row(row).tolist()
+        size = self.codec.code_size
+        values = self.codec.decode(self.codes[row * size : (row + 1) * size])
+        if self.compression == "residual":
+            return list(map(add, self.centroids[self.centroid_ids[row]], values))
+        return values
+
+    def _encode_token(self, vec: Sequence[float], centroid: int) -> array:
+        if self.compression == "residual":
+            return self.codec.encode([x - c for x, c in zip(vec, self.centroids[centroid])])
+        return self.codec.encode(vec)
+
+    def bytes_per_token(self) -> int:
+        """Storage cost of one token vector in the current mode."""
+
+        if not self._encoded:
+            return self.matrix.dim * self.matrix.data.itemsize
+        if self.compression == "residual":
+            return self.codec.code_size + self.centroid_ids.itemsize
+        return self.codec.code_size
+
+    @property
+    def token_vectors(self) -> PackedTokenVectors:
+        return PackedTokenVectors(self)
 
     def add(self, chunk_id: str, text: str, token_vectors: Optional[List[List[float]]] = None) -> None:
-        self.token_vectors[chunk_id] = token_vectors or self.embedder.encode_colbert(text)
-
-    def _late_interaction_score(self, query_vecs: List[List[float]], doc_vecs: List[List[float]]) -> float:
-        score = 0.0
-        if not query_vecs or not doc_vecs:
-            return score
-        for q_vec in query_vecs:
-            max_sim = max(sum(a * b for a, b in zip(q_vec, d_vec)) for d_vec in doc_vecs)
-            score += max_sim
-        return score / len(query_vecs)
-
-    def query(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
-        q_vecs = self.embedder.encode_colbert(query)
-        scores: List[Tuple[str, float]] = []
-        for chunk_id, doc_vecs in self.token_vectors.items():
-            score = self._late_interaction_score(q_vecs, doc_vecs)
-            scores.append((chunk_id, score))
-        return sorted(scores, key=lambda x: x[1], reverse=True)[:top_k]
+        vectors = token_vectors or self.embedder.encode_colbert(text)
+        start = self._token_count()
+        assigned = [nearest_centroid(self.centroids, self._centroid_norms, vec) for vec in vectors] if self.centroids else []
+        if self._encoded:
+            self.codes = writable(self.codes, "B")
+            for pos, vec in enumerate(vectors):
+                self.codes.extend(self._encode_token(vec, assigned[pos] if assigned else 0))
+        else:
+            for vec in vectors:
+                self.matrix.append(vec)
+        end = self._token_count()
+        self._distinct = None
+        idx = self.rows.get(chunk_id)
+        if idx is None:
+            idx = len(self.chunk_ids)
+            self.rows[chunk_id] = idx
+            self.chunk_ids.append(chunk_id)
+            self.starts.append(start)
+            self.ends.append(end)
+        else:
+            self.starts[idx] = start
+            self.ends[idx] = end
+        if self.centroids:
+            self.centroid_ids = writable(self.centroid_ids, "I")
+            self.centroid_ids.extend(assigned)
+            centroids = array("I", sorted(set(assigned)))
+            for centroid in centroids:
+                self.centroid_chunks[centroid].append(idx)
+            if idx < len(self.chunk_centroids):
+                self.chunk_centroids[idx] = centroids
+            else:
+                self.chunk_centroids.append(centroids)
+
+    def train_centroids(self) -> None:
+        """
+        Cluster a sample of the distinct token vectors and build the centroid -> chunk lists.
+
+        In residual mode this also trains the residual codec on the sample and
+        re-encodes every token, releasing the float32 matrix.
+        """
+
+        if not self.num_centroids:
+            raise ValueError("MultiVectorIndexer was created without centroids")
+        distinct, slots = self._distinct_rows()
+        vectors = [self._row_vector(row) for row in distinct]
+        rng = random.Random(self.options["seed"])
+        sample = sorted(rng.sample(range(len(distinct)), min(len(distinct), self.num_centroids * TRAIN_POINTS_PER_CENTROID)))
+        self.centroids = kmeans([vectors[slot] for slot in sample], self.num_centroids, seed=self.options["seed"])
+        self._centroid_norms = _sq_norms(self.centroids)
+        assigned = [nearest_centroid(self.centroids, self._centroid_norms, vec) for vec in vectors]
+        self.centroid_ids = array("I", (assigned[slot] for slot in slots))
+        self._build_centroid_chunks()
+        if self.compression == "residual":
+            self.codec.train([[x - c for x, c in zip(vectors[slot], self.centroids[assigned[slot]])] for slot in sample])
+            encoded = [self._encode_token(vec, centroid) for vec, centroid in zip(vectors, assigned)]
+            self.codes = array("B")
+            for slot in slots:
+                self.codes.extend(encoded[slot])
+            self.matrix = FloatMatrix(self.matrix.dim)
+
+    def _build_centroid_chunks(self) -> None:
+        self.centroid_chunks = [array("I") for _ in self.centroids]
+        self.chunk_centroids = []
+        for idx in range(len(self.chunk_ids)):
+            centroids = array("I", sorted(set(self.centroid_ids[self.starts[idx] : self.ends[idx]])))
+            for centroid in centroids:
+                self.centroid_chunks[centroid].append(idx)
+            self.chunk_centroids.append(centroids)
+
+    def candidates(
+        self,
+        query_vecs: Sequence[Sequence[float]],
+        nprobe: Optional[int] = None,
+        ndocs: Optional[int] = None,
+        eligible: Optional[AbstractSet[int]] = None,
+    ) -> List[int]:
+        """Sorted indices of the chunks (within ``eligible``, if given) that should be scored exactly for ``query_vecs``."""
+
+        if not self.centroids:
+            self.train_centroids()
+        nprobe = nprobe or self.nprobe
+        ndocs = self.ndocs if ndocs is None else ndocs
+        centroid_sims = [[sum(map(mul, q_vec, c)) for c in self.centroids] for q_vec in query_vecs]
+        probed = set()
+        for sims in centroid_sims:
+            # L2-nearest centroids, matching how tokens were assigned.
+            distances = [2 * sim - norm for sim, norm in zip(sims, self._centroid_norms)]
+            probed.update(centroid for centroid, _ in select_top_k(distances, nprobe))
+        found = set()
+        for centroid in probed:
+            found.update(self.centroid_chunks[centroid])
+        if eligible is not None:
+            found &= eligible
+        chunks = sorted(found)
+        if ndocs and len(chunks) > ndocs:
+            approx = [
+                sum(max(map(sims.__getitem__, self.chunk_centroids[idx])) for sims in centroid_sims) for idx in chunks
+            ]
+            chunks = sorted(chunks[pos] for pos, _ in select_top_k(approx, ndocs))
+        return chunks
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Write all token vectors (or their codes) packed in chunk order plus per-chunk offsets."""
+
+        if self._encoded:
+            name, view, width, packed = "codes", memoryview(self.codes), self.codec.code_size, array("B")
+        else:
+            name, view, width, packed = "vectors", memoryview(self.matrix.data), self.matrix.dim, array("f")
+        offsets = array("q", [0])
+        centroid_ids = array("I")
+        for idx in range(len(self.chunk_ids)):
+            start, end = self.starts[idx], self.ends[idx]
+            packed.frombytes(view[start * width : end * width].cast("B"))
+            offsets.append(offsets[-1] + end - start)
+            if self.centroids:
+                centroid_ids.extend(self.centroid_ids[start:end])
+        header = {
+            "colbert_dim": self.matrix.dim,
+            "options": self.options,
+            "chunk_ids": self.chunk_ids,
+            "centroids": self.centroids,
+            "codec": self.codec.state() if self._encoded else None,
+        }
+        sections = {"offsets": offsets, name: packed}
+        if self.centroids:
+            sections["centroid_ids"] = centroid_ids
+        write_index(path, "multivector", header, sections)
+
+    @classmethod
+    def open(cls, path: Union[str, Path], embedder: Optional[BGEEmbedder] = None) -> "MultiVectorIndexer":
+        """Map a file written by ``save()``; token vectors stay in the shared mapping."""
+
+        header, sections = open_index(path, "multivector")
+        embedder = embedder or BGEEmbedder(colbert_dim=header["colbert_dim"])
+        if embedder.colbert_dim != header["colbert_dim"]:
+            raise ValueError(
+                f"Index colbert_dim {header['colbert_dim']} does not match embedder colbert_dim {embedder.colbert_dim}"
+            )
+        index = cls(embedder=embedder, **header["options"])
+        if header["codec"] is not None:
+            index.codec.load_state(header["codec"])
+            index.codes = sections["codes"]
+        else:
+            index.matrix.data = sections["vectors"]
+        index.chunk_ids = header["chunk_ids"]
+        index.rows = {cid: idx for idx, cid in enumerate(index.chunk_ids)}
+        offsets = sections["offsets"]
+        index.starts = array("q", offsets[:-1])
+        index.ends = array("q", offsets[1:])
+        if header["centroids"]:
+            index.centroids = header["centroids"]
+            index._centroid_norms = _sq_norms(index.centroids)
+            index.centroid_ids = sections["centroid_ids"]
+            index._build_centroid_chunks()
+        return index
+
+    def _distinct_rows(self) -> Tuple[List[int], array]:
+        """Token rows holding each distinct token vector, and the distinct slot of every row."""
+
+        if self._distinct is None:
+            slots_by_bytes: Dict[bytes, int] = {}
+            distinct: List[int] = []
+            slots = array("I")
+            for row in range(self._token_count()):
+                slot = slots_by_bytes.setdefault(self._row_bytes(row), len(distinct))
+                if slot == len(distinct):
+                    distinct.append(row)
+                slots.append(slot)
+            self._distinct = (distinct, slots)
+        return self._distinct
+
+    def maxsim_scores(self, query_vecs: Sequence[Sequence[float]], chunks: Optional[Iterable[int]] = None) -> List[float]:
+        """
+        Late interaction score of every chunk (or of the chunk indices in ``chunks``).
+
+        Each score is the mean over query tokens of the best dot product with
+        any of the chunk's token vectors; chunks without tokens score 0.
+        """
+
+        return self.maxsim_scores_batch([query_vecs], chunks)[0]
+
+    def maxsim_scores_batch(
+        self, query_sets: Sequence[Sequence[Sequence[float]]], chunks: Optional[Iterable[int]] = None
+    ) -> List[List[float]]:
+        """``maxsim_scores`` for several queries; every distinct token vector is decoded once for all of them."""
+
+        chunks = range(len(self.chunk_ids)) if chunks is None else list(chunks)
+        query_sets = [[list(q_vec) for q_vec in query_vecs] for query_vecs in query_sets]
+        flat = [q_vec for query_vecs in query_sets for q_vec in query_vecs]
+        if not flat:
+            return [[0.0] * len(chunks) for _ in query_sets]
+        distinct, slots = self._distinct_rows()
+        segments = [slots[self.starts[idx] : self.ends[idx]] for idx in chunks]
+        needed = sorted(set().union(*segments)) if len(chunks) < len(self.chunk_ids) else range(len(distinct))
+        sims = [[0.0] * len(distinct) for _ in flat]
+        for slot in needed:
+            doc_vec = self._row_vector(distinct[slot])
+            for q_sims, q_vec in zip(sims, flat):
+                q_sims[slot] = sum(map(mul, q_vec, doc_vec))
+        results: List[List[float]] = []
+        offset = 0
+        for query_vecs in query_sets:
+            totals = [0.0] * len(segments)
+            for q_sims in sims[offset : offset + len(query_vecs)]:
+                for pos, segment in enumerate(segments):
+                    if segment:
+                        totals[pos] += max(map(q_sims.__getitem__, segment))
+            offset += len(query_vecs)
+            results.append([total / len(query_vecs) for total in totals] if query_vecs else [0.0] * len(segments))
+        return results
+
+    def query_candidates(
+        self, query_vecs: Sequence[Sequence[float]], chunk_ids: Iterable[str], top_k: int = 10
+    ) -> List[Tuple[str, float]]:
+        """Exact MaxSim over ``chunk_ids`` only (unknown ids are ignored), best ``top_k`` first."""
+
+        chunks = [self.rows[cid] for cid in chunk_ids if cid in self.rows]
+        scores = self.maxsim_scores(query_vecs, chunks)
+        return [(self.chunk_ids[chunks[pos]], score) for pos, score in select_top_k(scores, top_k)]
+
+    def query_vectors_batch(
+        self,
+        query_sets: Sequence[Sequence[Sequence[float]]],
+        top_k: int = 10,
+        exhaustive: bool = False,
+        allowed: Optional[Iterable[str]] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """``query_vectors`` for many queries; exhaustive scoring shares one pass over the token vectors."""
+
+        allowed = None if allowed is None else list(allowed)
+        if not self.chunk_ids:
+            return [[] for _ in query_sets]
+        if self.num_centroids and not exhaustive:
+            return [self.query_vectors(query_vecs, top_k=top_k, allowed=allowed) for query_vecs in query_sets]
+        chunks = list(range(len(self.chunk_ids)))
+        if allowed is not None:
+            chunks = sorted({self.rows[cid] for cid in allowed if cid in self.rows})
+        return [
+            [(self.chunk_ids[chunks[pos]], score) for pos, score in select_top_k(scores, top_k)]
+            for scores in self.maxsim_scores_batch(query_sets, chunks)
+        ]
+
+    def query(self, query: str, top_k: int = 10, allowed: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        return self.query_vectors(self.embedder.encode_colbert(query), top_k=top_k, allowed=allowed)
+
+    def query_vectors(
+        self,
+        query_vecs: Sequence[Sequence[float]],
+        top_k: int = 10,
+        exhaustive: bool = False,
+        nprobe: Optional[int] = None,
+        ndocs: Optional[int] = None,
+        allowed: Optional[Iterable[str]] = None,
+    ) -> List[Tuple[str, float]]:
+        """Top-k chunks by MaxSim; ``allowed`` restricts both candidate generation and scoring to those chunk ids."""
+
+        if not self.chunk_ids:
+            return []
+        eligible = None if allowed is None else {self.rows[cid] for cid in allowed if cid in self.rows}
+        if exhaustive or not self.num_centroids:
+            if eligible is not None:
+                return self.query_candidates(query_vecs, [self.chunk_ids[idx] for idx in sorted(eligible)], top_k)
+            scores = self.maxsim_scores(query_vecs)
+            return [(self.chunk_ids[idx], score) for idx, score in select_top_k(scores, top_k)]
+        chunks = self.candidates(query_vecs, nprobe, ndocs, eligible)
+        scores = self.maxsim_scores(query_vecs, chunks)
+        return [(self.chunk_ids[chunks[pos]], score) for pos, score in select_top_k(scores, top_k)]
@@ -0,0 +1,65 @@
+from array import array
+from typing import Optional, Sequence, Tuple
+
+WEIGHT_LEVELS = 255
+
+
+def encode_varint(value: int, out: bytearray) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(buf: Sequence[int], pos: int) -> Tuple[int, int]:
+    """Decode one varint at ``pos``; return ``(value, next_pos)``."""
+
+    value = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode_postings(ordinals: Sequence[int], weights: Sequence[float], weight_scale: Optional[float]) -> bytes:
+    """
+    Encode one posting list as ``count``, delta-gapped ordinals and weights, all varints.
+
+    With ``weight_scale=None`` weights are integer term counts and stored
+    exactly; otherwise each weight is quantized to ``1..WEIGHT_LEVELS`` steps
+    of ``weight_scale`` (positive weights never round down to zero).
+    """
+
+    out = bytearray()
+    encode_varint(len(ordinals), out)
+    previous = 0
+    for ordinal in ordinals:
+        encode_varint(ordinal - previous, out)
+        previous = ordinal
+    for weight in weights:
+        if weight_scale is None:
+            encode_varint(int(weight), out)
+        else:
+            encode_varint(max(1, min(WEIGHT_LEVELS, round(weight / weight_scale))) if weight > 0 else 0, out)
+    return bytes(out)
+
+
+def decode_postings(buf: Sequence[int], pos: int, weight_scale: Optional[float]) -> Tuple[array, array]:
+    """Inverse of ``encode_postings`` starting at byte offset ``pos`` of ``buf``."""
+
+    count, pos = decode_varint(buf, pos)
+    ordinals = array("I")
+    ordinal = 0
+    for _ in range(count):
+        gap, pos = decode_varint(buf, pos)
+        ordinal += gap
+        ordinals.append(ordinal)
+    weights = array("d")
+    scale = 1.0 if weight_scale is None else weight_scale
+    for _ in range(count):
+        value, pos = decode_varint(buf, pos)
+        weights.append(value * scale)
+    return ordinals, weights
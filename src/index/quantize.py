@@ -0,0 +1,262 @@
+import random
+import struct
+from array import array
+from bisect import bisect_right
+from itertools import chain
+from operator import getitem, mul
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+def _sq_norms(centroids: List[List[float]]) -> List[float]:
+    return [sum(v * v for v in c) for c in centroids]
+
+
+def nearest_centroid(centroids: List[List[float]], norms: List[float], point: Sequence[float]) -> int:
+    """Index of the L2-nearest centroid (``||c||^2 - 2 p.c`` is minimised)."""
+
+    best, best_dist = 0, float("inf")
+    for idx, centroid in enumerate(centroids):
+        dist = norms[idx] - 2 * sum(map(mul, point, centroid))
+        if dist < best_dist:
+            best, best_dist = idx, dist
+    return best
+
+
+def kmeans(points: Sequence[Sequence[float]], k: int, iterations: int = 10, seed: int = 0) -> List[List[float]]:
+    """
+    Plain Lloyd k-means with deterministic seeding.
+
+    ``k`` is capped by the number of points; a cluster that ends up empty keeps
+    its previous centroid.
+    """
+
+    if not points:
+        return []
+    rng = random.Random(seed)
+    k = min(k, len(points))
+    centroids = [list(points[i]) for i in rng.sample(range(len(points)), k)]
+    dim = len(centroids[0])
+    for _ in range(iterations):
+        norms = _sq_norms(centroids)
+        sums = [[0.0] * dim for _ in range(k)]
+        counts = [0] * k
+        for point in points:
+            idx = nearest_centroid(centroids, norms, point)
+            counts[idx] += 1
+            acc = sums[idx]
+            for d, value in enumerate(point):
+                acc[d] += value
+        moved = False
+        for idx in range(k):
+            if counts[idx]:
+                mean = [v / counts[idx] for v in sums[idx]]
+                if mean != centroids[idx]:
+                    centroids[idx] = mean
+                    moved = True
+        if not moved:
+            break
+    return centroids
+
+
+class ScalarQuantizer:
+    """
+    Per-dimension int8 scalar quantizer (one byte per dimension).
+
+    Minimum and step size per dimension are trained from the indexed vectors;
+    inner products are computed asymmetrically against the int8 codes without
+    decoding them.
+    """
+
+    code_typecode = "b"
+
+    def __init__(self, dim: int) -> None:
+        self.dim = dim
+        self.code_size = dim
+        self.mins: Optional[List[float]] = None
+        self.scales: Optional[List[float]] = None
+
+    @property
+    def trained(self) -> bool:
+        return self.mins is not None
+
+    def train(self, vectors: Sequence[Sequence[float]]) -> None:
+        columns = list(zip(*vectors))
+        self.mins = [min(col) for col in columns]
+        self.scales = [((max(col) - lo) / 255) or 1.0 for col, lo in zip(columns, self.mins)]
+
+    def state(self) -> Dict[str, Any]:
+        return {"mins": self.mins, "scales": self.scales}
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        self.mins, self.scales = state["mins"], state["scales"]
+
+    def encode(self, vec: Sequence[float]) -> array:
+        return array(
+            self.code_typecode,
+            [max(-128, min(127, round((x - lo) / s) - 128)) for x, lo, s in zip(vec, self.mins, self.scales)],
+        )
+
+    def decode(self, codes: Sequence[int]) -> List[float]:
+        return [lo + (c + 128) * s for c, lo, s in zip(codes, self.mins, self.scales)]
+
+    def query_scorer(self, q_vec: Sequence[float]) -> Callable[[Sequence[int]], float]:
+        weights = [q * s for q, s in zip(q_vec, self.scales)]
+        base = sum(map(mul, q_vec, self.mins)) + 128 * sum(weights)
+        return lambda codes: base + sum(map(mul, weights, codes))
+
+
+class ProductQuantizer:
+    """
+    Product quantizer: ``subvectors`` sub-spaces, each with a k-means codebook
+    of ``2 ** bits`` centroids, so a vector is stored as ``subvectors`` bytes.
+
+    Queries build one lookup table of sub-space inner products and score each
+    code with ``subvectors`` table lookups (asymmetric distance computation).
+    """
+
+    code_typecode = "B"
+
+    def __init__(self, dim: int, subvectors: int = 16, bits: int = 8, iterations: int = 10, seed: int = 0) -> None:
+        if dim % subvectors:
+            raise ValueError("dim must be divisible by subvectors")
+        if not 1 <= bits <= 8:
+            raise ValueError("bits must be between 1 and 8")
+        self.dim = dim
+        self.subvectors = subvectors
+        self.dsub = dim // subvectors
+        self.ksub = 2**bits
+        self.iterations = iterations
+        self.seed = seed
+        self.code_size = subvectors
+        self.codebooks: List[List[List[float]]] = []
+        self._norms: List[List[float]] = []
+
+    @property
+    def trained(self) -> bool:
+        return bool(self.codebooks)
+
+    def _split(self, vec: Sequence[float]) -> List[Sequence[float]]:
+        return [vec[j * self.dsub : (j + 1) * self.dsub] for j in range(self.subvectors)]
+
+    def train(self, vectors: Sequence[Sequence[float]]) -> None:
+        rows = [list(v) for v in vectors]
+        self.codebooks = [
+            kmeans([row[j * self.dsub : (j + 1) * self.dsub] for row in rows], self.ksub, self.iterations, self.seed + j)
+            for j in range(self.subvectors)
+        ]
+        self._norms = [_sq_norms(book) for book in self.codebooks]
+
+    def state(self) -> Dict[str, Any]:
+        return {"codebooks": self.codebooks}
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        self.codebooks = state["codebooks"]
+        self._norms = [_sq_norms(book) for book in self.codebooks]
+
+    def encode(self, vec: Sequence[float]) -> array:
+        parts = self._split(list(vec))
+        return array(
+            self.code_typecode,
+            [nearest_centroid(book, norms, part) for book, norms, part in zip(self.codebooks, self._norms, parts)],
+        )
+
+    def decode(self, codes: Sequence[int]) -> List[float]:
+        vec: List[float] = []
+        for book, code in zip(self.codebooks, codes):
+            vec.extend(book[code])
+        return vec
+
+    def query_scorer(self, q_vec: Sequence[float]) -> Callable[[Sequence[int]], float]:
+        tables = [[sum(map(mul, part, c)) for c in book] for book, part in zip(self.codebooks, self._split(list(q_vec)))]
+        return lambda codes: sum(map(getitem, tables, codes))
+
+
+class Float16Quantizer:
+    """Half-precision storage (two bytes per dimension); needs no training."""
+
+    code_typecode = "B"
+    trained = True
+
+    def __init__(self, dim: int) -> None:
+        self.dim = dim
+        self.code_size = 2 * dim
+        self._struct = struct.Struct(f"={dim}e")
+
+    def train(self, vectors: Sequence[Sequence[float]]) -> None:
+        pass
+
+    def state(self) -> Dict[str, Any]:
+        return {}
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        pass
+
+    def encode(self, vec: Sequence[float]) -> array:
+        return array(self.code_typecode, self._struct.pack(*vec))
+
+    def decode(self, codes: Sequence[int]) -> List[float]:
+        return list(self._struct.unpack(codes))
+
+
+class ResidualQuantizer:
+    """
+    ColBERTv2-style residual codec: ``bits`` per dimension, packed into bytes.
+
+    Residuals (vector minus its centroid) are bucketed with cutoffs at the
+    quantiles of all trained residual values, and each bucket decodes to the
+    residual value at its midpoint quantile. Decoding is one table lookup per
+    byte.
+    """
+
+    code_typecode = "B"
+
+    def __init__(self, dim: int, bits: int = 2) -> None:
+        if bits not in {1, 2, 4, 8}:
+            raise ValueError("bits must be 1, 2, 4 or 8")
+        if dim * bits % 8:
+            raise ValueError("dim * bits must be a multiple of 8")
+        self.dim = dim
+        self.bits = bits
+        self.code_size = dim * bits // 8
+        self.cutoffs: List[float] = []
+        self.weights: List[float] = []
+        self._table: List[Tuple[float, ...]] = []
+
+    @property
+    def trained(self) -> bool:
+        return bool(self.weights)
+
+    def train(self, residuals: Sequence[Sequence[float]]) -> None:
+        values = sorted(v for residual in residuals for v in residual)
+        buckets = 2**self.bits
+        self.cutoffs = [values[len(values) * i // buckets] for i in range(1, buckets)]
+        self.weights = [values[min(len(values) - 1, int(len(values) * (i + 0.5) / buckets))] for i in range(buckets)]
+        self._build_table()
+
+    def _build_table(self) -> None:
+        per_byte = 8 // self.bits
+        mask = 2**self.bits - 1
+        self._table = [
+            tuple(self.weights[(byte >> (self.bits * k)) & mask] for k in range(per_byte)) for byte in range(256)
+        ]
+
+    def state(self) -> Dict[str, Any]:
+        return {"cutoffs": self.cutoffs, "weights": self.weights}
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        self.cutoffs, self.weights = state["cutoffs"], state["weights"]
+        self._build_table()
+
+    def encode(self, residual: Sequence[float]) -> array:
+        buckets = [bisect_right(self.cutoffs, v) for v in residual]
+        per_byte = 8 // self.bits
+        packed = array(self.code_typecode)
+        for start in range(0, len(buckets), per_byte):
+            byte = 0
+            for k, bucket in enumerate(buckets[start : start + per_byte]):
+                byte |= bucket << (self.bits * k)
+            packed.append(byte)
+        return packed
+
+    def decode(self, codes: Sequence[int]) -> List[float]:
+        return list(chain.from_iterable(map(self._table.__getitem__, codes)))
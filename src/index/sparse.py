@@ -1,9 +1,82 @@
+import bisect
+import heapq
+import itertools
 import math
 import re
-from collections import Counter, defaultdict
-from typing import Dict, List, Optional, Tuple
+import sys
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AbstractSet, Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
 
 from index.embedder import BGEEmbedder
+from index.postings import WEIGHT_LEVELS, decode_postings, encode_postings
+from index.storage import open_index, write_index, writable
+
+
+POSTING_BLOCK_SIZE = 64
+# Absolute slack on bound comparisons so float rounding can never prune a
+# document whose exact score would have entered the top-k.
+_BOUND_SLACK = 1e-9
+_EXHAUSTED = 1 << 62
+
+# (term ids, score_fn, bound_fn, query weight per term id in lexical mode)
+_QueryPlan = Tuple[
+    List[int],
+    Callable[[int, float, int], float],
+    Callable[[int, float, float], float],
+    Optional[Dict[int, float]],
+]
+
+
+@dataclass
+class QueryStats:
+    """Per-query pruning counters exposed as ``SparseIndexer.last_query_stats``."""
+
+    scored: int = 0
+    skipped: int = 0
+    postings_skipped: int = 0
+    # Postings passed over because their document was outside ``allowed``.
+    filtered: int = 0
+
+
+@dataclass
+class _BlockMaxima:
+    last: array
+    max_weights: array
+    min_lens: array
+
+
+class _CompressedPostings:
+    """Posting lists of an opened index, decoded one term at a time."""
+
+    def __init__(self, data: memoryview, offsets: memoryview, weight_scale: Optional[float]) -> None:
+        self.data = data
+        self.offsets = offsets
+        self.weight_scale = weight_scale
+
+    def decode(self, term_id: int) -> Tuple[array, array]:
+        return decode_postings(self.data, self.offsets[term_id], self.weight_scale)
+
+
+class _Cursor:
+    __slots__ = ("term", "count", "ordinals", "weights", "blocks", "upper", "pos")
+
+    def __init__(self, term: int, count: int, ordinals: array, weights: array, blocks: _BlockMaxima, upper: float) -> None:
+        self.term = term
+        self.count = count
+        self.ordinals = ordinals
+        self.weights = weights
+        self.blocks = blocks
+        self.upper = upper
+        self.pos = 0
+
+    def block_bound(self, doc: int, bound_fn: Callable[[int, float, float], float]) -> float:
+        idx = bisect.bisect_left(self.blocks.last, doc, self.pos // POSTING_BLOCK_SIZE)
+        if idx >= len(self.blocks.last):
+            return 0.0
+        return bound_fn(self.term, self.blocks.max_weights[idx], self.blocks.min_lens[idx]) * self.count
 
 
 class SparseIndexer:
@@ -11,57 +84,495 @@ class SparseIndexer:
     Sparse indexer that can operate in two modes:
     - Traditional BM25 scoring using term counts.
     - Lexical weight scoring using BGE-m3-generated weights (dense-sparse hybrid).
+
+    Both modes are served from an inverted index. Terms are interned once in
+    ``terms``/``term_ids``; everything else refers to integer term ids. The
+    posting list of a term id holds parallel arrays of document ordinals
+    (ascending) and term counts/weights, so a query only touches the posting
+    lists of its own terms. Document lengths, document frequencies, the
+    corpus length total and the IDF table are maintained on ``add`` instead of
+    being recomputed per query.
+
+    With ``dynamic_pruning`` top-k queries use block-max MaxScore: per-term
+    and per-block score upper bounds let whole documents be skipped once they
+    can no longer enter the top-k, while returning the same results as
+    exhaustive scoring. It pays off when query terms have long posting lists
+    relative to ``top_k`` (large corpora, frequent terms); on small corpora the
+    exhaustive term-at-a-time loop is cheaper, hence it is opt-in.
+    ``last_query_stats`` records how many documents were fully scored versus
+    skipped.
+
+    ``query(allowed=...)`` restricts scoring to the given chunk ids: postings
+    of other documents are passed over before any score is computed.
+
+    ``save()`` writes a sorted term dictionary and delta/varint-compressed
+    posting lists (lexical weights quantized to ``WEIGHT_LEVELS`` steps);
+    ``open()`` maps that file and decodes a posting list only when a query
+    or an update first needs it.
     """
 
-    def __init__(self, embedder: Optional[BGEEmbedder] = None, use_lexical_weights: bool = False) -> None:
+    def __init__(
+        self,
+        embedder: Optional[BGEEmbedder] = None,
+        use_lexical_weights: bool = False,
+        dynamic_pruning: bool = False,
+    ) -> None:
         self.embedder = embedder or BGEEmbedder()
         self.use_lexical_weights = use_lexical_weights
-        self.doc_freq: Counter[str] = Counter()
-        self.chunk_terms: Dict[str, Dict[str, float]] = {}
+        self.dynamic_pruning = dynamic_pruning
+        self.terms: List[str] = []
+        self.term_ids: Dict[str, int] = {}
+        self.doc_freqs = array("I")
         self.total_docs = 0
+        self.chunk_ids: List[str] = []
+        self.ordinals: Dict[str, int] = {}
+        self.doc_lens = array("d")
+        self.total_len = 0.0
+        # Forward index (term ids per document), used to replace a re-added chunk's postings.
+        self.doc_terms: List[Optional[array]] = []
+        self._postings: List[Optional[Tuple[array, array]]] = []
+        self._compressed: Optional[_CompressedPostings] = None
+        self._idf: Dict[int, float] = {}
+        self._blocks: Dict[int, _BlockMaxima] = {}
+        self.last_query_stats = QueryStats()
 
     def _tokenize(self, text: str) -> List[str]:
         return re.findall(r"\w+", text.lower())
 
+    def _term_id(self, term: str) -> int:
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            term_id = len(self.terms)
+            term = sys.intern(term)
+            self.term_ids[term] = term_id
+            self.terms.append(term)
+            self.doc_freqs.append(0)
+            self._postings.append((array("I"), array("d")))
+        return term_id
+
+    def _posting(self, term_id: int) -> Tuple[array, array]:
+        posting = self._postings[term_id]
+        if posting is None:
+            posting = self._compressed.decode(term_id)
+            self._postings[term_id] = posting
+        return posting
+
+    def posting(self, term: str) -> Optional[Tuple[array, array]]:
+        """``(ordinals, weights)`` posting list of ``term``, or ``None`` if unseen."""
+
+        term_id = self.term_ids.get(term)
+        return self._posting(term_id) if term_id is not None else None
+
+    def doc_freq(self, term: str) -> int:
+        term_id = self.term_ids.get(term)
+        return self.doc_freqs[term_id] if term_id is not None else 0
+
+    def terms_for(self, chunk_id: str) -> Dict[str, float]:
+        """Reconstruct the ``term -> count/weight`` map of an indexed chunk."""
+
+        ordinal = self.ordinals[chunk_id]
+        result: Dict[str, float] = {}
+        for term_id in self._doc_terms(ordinal):
+            ordinals, weights = self._posting(term_id)
+            result[self.terms[term_id]] = weights[bisect.bisect_left(ordinals, ordinal)]
+        return result
+
+    def _doc_terms(self, ordinal: int) -> array:
+        if self.doc_terms[ordinal] is None:
+            # Documents opened from disk have no forward entry; rebuild them from the postings once.
+            missing = {doc for doc, terms in enumerate(self.doc_terms) if terms is None}
+            for doc in missing:
+                self.doc_terms[doc] = array("I")
+            for term_id in range(len(self.terms)):
+                for doc in self._posting(term_id)[0]:
+                    if doc in missing:
+                        self.doc_terms[doc].append(term_id)
+        return self.doc_terms[ordinal]
+
     def add(self, chunk_id: str, text: str, lexical_weights: Optional[Dict[str, float]] = None) -> None:
         if self.use_lexical_weights:
-            weights = lexical_weights or self.embedder.encode_lexical(text)
-            self.chunk_terms[chunk_id] = weights
+            terms = lexical_weights or self.embedder.encode_lexical(text)
+        else:
+            terms = {term: float(count) for term, count in Counter(self._tokenize(text)).items()}
+
+        ordinal = self.ordinals.get(chunk_id)
+        if ordinal is None:
+            ordinal = len(self.chunk_ids)
+            self.ordinals[chunk_id] = ordinal
+            self.chunk_ids.append(chunk_id)
+            self.doc_lens.append(0.0)
+            self.doc_terms.append(None)
             self.total_docs += 1
-            for term in weights:
-                self.doc_freq[term] += 1
-            return
+        else:
+            self._remove_postings(ordinal)
 
-        terms_counter = Counter(self._tokenize(text))
-        self.chunk_terms[chunk_id] = {term: float(count) for term, count in terms_counter.items()}
-        self.total_docs += 1
-        for term in terms_counter:
-            self.doc_freq[term] += 1
+        term_ids = array("I")
+        for term, weight in terms.items():
+            term_id = self._term_id(term)
+            term_ids.append(term_id)
+            self.doc_freqs[term_id] += 1
+            self._blocks.pop(term_id, None)
+            ordinals, weights = self._posting(term_id)
+            pos = len(ordinals) if not ordinals or ordinals[-1] < ordinal else bisect.bisect_left(ordinals, ordinal)
+            ordinals.insert(pos, ordinal)
+            weights.insert(pos, weight)
+        self.doc_terms[ordinal] = term_ids
+        doc_len = sum(terms.values())
+        self.doc_lens[ordinal] = doc_len
+        self.total_len += doc_len
+        self._idf.clear()
+
+    def _remove_postings(self, ordinal: int) -> None:
+        for term_id in self._doc_terms(ordinal):
+            ordinals, weights = self._posting(term_id)
+            pos = bisect.bisect_left(ordinals, ordinal)
+            del ordinals[pos]
+            del weights[pos]
+            self.doc_freqs[term_id] -= 1
+            self._blocks.pop(term_id, None)
+        self.total_len -= self.doc_lens[ordinal]
+
+    def _encode(self) -> Tuple[Dict[str, Any], Dict[str, array]]:
+        """Build the sorted term dictionary and compressed posting sections."""
+
+        live = sorted((term_id for term_id in range(len(self.terms)) if self.doc_freqs[term_id]), key=self.terms.__getitem__)
+        weight_scale = None
+        if self.use_lexical_weights:
+            max_weight = max((max(self._posting(term_id)[1]) for term_id in live), default=0.0)
+            weight_scale = (max_weight / WEIGHT_LEVELS) or 1.0
+        data = array("B")
+        offsets = array("Q")
+        for term_id in live:
+            offsets.append(len(data))
+            data.frombytes(encode_postings(*self._posting(term_id), weight_scale))
+        offsets.append(len(data))
+        header = {
+            "use_lexical_weights": self.use_lexical_weights,
+            "weight_scale": weight_scale,
+            "chunk_ids": self.chunk_ids,
+            "total_len": self.total_len,
+        }
+        sections = {
+            "terms": array("B", "\n".join(self.terms[term_id] for term_id in live).encode("utf-8")),
+            "doc_freqs": array("I", [self.doc_freqs[term_id] for term_id in live]),
+            "offsets": offsets,
+            "postings": data,
+            "doc_lens": writable(self.doc_lens, "d"),
+        }
+        return header, sections
 
-    def _bm25(self, term: str, freq: float, doc_len: float, avg_len: float) -> float:
+    def save(self, path: Union[str, Path]) -> None:
+        """Write the term dictionary and compressed postings to ``path``."""
+
+        header, sections = self._encode()
+        write_index(path, "sparse", header, sections)
+
+    @classmethod
+    def open(
+        cls, path: Union[str, Path], embedder: Optional[BGEEmbedder] = None, dynamic_pruning: bool = False
+    ) -> "SparseIndexer":
+        """Map a file written by ``save()`` without re-tokenizing any chunk."""
+
+        header, sections = open_index(path, "sparse")
+        index = cls(embedder=embedder, use_lexical_weights=header["use_lexical_weights"], dynamic_pruning=dynamic_pruning)
+        raw_terms = sections["terms"].tobytes().decode("utf-8")
+        index.terms = [sys.intern(term) for term in raw_terms.split("\n")] if raw_terms else []
+        index.term_ids = {term: term_id for term_id, term in enumerate(index.terms)}
+        index.doc_freqs = writable(sections["doc_freqs"], "I")
+        index._postings = [None] * len(index.terms)
+        index._compressed = _CompressedPostings(sections["postings"], sections["offsets"], header["weight_scale"])
+        index.chunk_ids = header["chunk_ids"]
+        index.ordinals = {cid: ordinal for ordinal, cid in enumerate(index.chunk_ids)}
+        index.doc_lens = writable(sections["doc_lens"], "d")
+        index.doc_terms = [None] * len(index.chunk_ids)
+        index.total_docs = len(index.chunk_ids)
+        index.total_len = header["total_len"]
+        return index
+
+    def size_report(self) -> Dict[str, float]:
+        """Bytes per posting of the in-memory arrays versus the compressed format."""
+
+        postings = sum(self.doc_freqs)
+        in_memory = 0
+        for term_id in range(len(self.terms)):
+            ordinals, weights = self._posting(term_id)
+            in_memory += len(ordinals) * ordinals.itemsize + len(weights) * weights.itemsize
+        _, sections = self._encode()
+        compressed = sum(len(sections[name]) * sections[name].itemsize for name in ("postings", "offsets"))
+        return {
+            "postings": postings,
+            "terms": len(sections["doc_freqs"]),
+            "dictionary_bytes": len(sections["terms"]),
+            "memory_bytes_per_posting": in_memory / max(postings, 1),
+            "compressed_bytes_per_posting": compressed / max(postings, 1),
+        }
+
+    def _idf_for(self, term_id: int) -> float:
+        idf = self._idf.get(term_id)
+        if idf is None:
+            df = self.doc_freqs[term_id]
+            idf = math.log((self.total_docs - df + 0.5) / (df + 0.5) + 1)
+            self._idf[term_id] = idf
+        return idf
+
+    def _bm25(self, term_id: int, freq: float, doc_len: float, avg_len: float) -> float:
         k1, b = 1.5, 0.75
-        idf = math.log((self.total_docs - self.doc_freq[term] + 0.5) / (self.doc_freq[term] + 0.5) + 1)
+        idf = self._idf_for(term_id)
         return idf * ((freq * (k1 + 1)) / (freq + k1 * (1 - b + b * (doc_len / avg_len))))
 
     def _lexical_score(self, query_weights: Dict[str, float], doc_weights: Dict[str, float]) -> float:
         return sum(query_weights.get(term, 0.0) * doc_weights.get(term, 0.0) for term in doc_weights)
 
-    def query(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+    def _rank(self, scores: Dict[int, float], top_k: int) -> List[Tuple[str, float]]:
+        ranked = heapq.nsmallest(top_k, scores.items(), key=lambda x: (-x[1], x[0]))
+        return [(self.chunk_ids[ordinal], score) for ordinal, score in ranked]
+
+    def _query_term_ids(self, terms: List[str]) -> List[int]:
+        ids = (self.term_ids.get(term) for term in terms)
+        return [term_id for term_id in ids if term_id is not None and self.doc_freqs[term_id]]
+
+    def _eligible(self, allowed: Optional[Iterable[str]]) -> Optional[Set[int]]:
+        return None if allowed is None else {self.ordinals[cid] for cid in allowed if cid in self.ordinals}
+
+    def _plan(self, query: str, lexical_weights: Optional[Dict[str, float]] = None) -> _QueryPlan:
+        """Query term ids plus the per-posting score and per-block bound functions for ``query``."""
+
+        if self.use_lexical_weights:
+            q_weights = lexical_weights or self.embedder.encode_lexical(query)
+            sequence = self._query_term_ids(list(q_weights))
+            q_by_id = {self.term_ids[term]: weight for term, weight in q_weights.items() if term in self.term_ids}
+
+            def score_fn(term_id: int, weight: float, ordinal: int) -> float:
+                return q_by_id[term_id] * weight
+
+            def bound_fn(term_id: int, max_weight: float, min_len: float) -> float:
+                return q_by_id[term_id] * max_weight
+
+            return sequence, score_fn, bound_fn, q_by_id
+
+        avg_len = self.total_len / max(self.total_docs, 1) or 1.0
+        sequence = self._query_term_ids(self._tokenize(query))
+
+        def score_fn(term_id: int, freq: float, ordinal: int) -> float:
+            return self._bm25(term_id, freq, self.doc_lens[ordinal], avg_len)
+
+        def bound_fn(term_id: int, max_freq: float, min_len: float) -> float:
+            return self._bm25(term_id, max_freq, min_len, avg_len)
+
+        return sequence, score_fn, bound_fn, None
+
+    def query(
+        self,
+        query: str,
+        top_k: int = 10,
+        lexical_weights: Optional[Dict[str, float]] = None,
+        allowed: Optional[Iterable[str]] = None,
+    ) -> List[Tuple[str, float]]:
+        eligible = self._eligible(allowed)
+        sequence, score_fn, bound_fn, _ = self._plan(query, lexical_weights)
+        if self.dynamic_pruning:
+            scores = self._maxscore(sequence, top_k, score_fn, bound_fn, eligible)
+        else:
+            scores = self._exhaustive(sequence, score_fn, eligible)
+        return self._ranked(scores, top_k, eligible)
+
+    def query_batch(
+        self,
+        queries: Sequence[str],
+        top_k: int = 10,
+        lexical_weights: Optional[Sequence[Dict[str, float]]] = None,
+        allowed: Optional[Iterable[str]] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        ``query`` for many queries at once, with the same results.
+
+        Without ``dynamic_pruning`` the posting list of every distinct query
+        term is read once for the whole batch (and in BM25 mode, where a
+        posting's score does not depend on the query, scored once); each
+        query then sums the contributions of its own terms. With pruning
+        every query runs its own MaxScore.
+        """
+
+        eligible = self._eligible(allowed)
+        plans = [self._plan(query, lexical_weights[idx] if lexical_weights else None) for idx, query in enumerate(queries)]
+        if self.dynamic_pruning:
+            return [
+                self._ranked(self._maxscore(sequence, top_k, score_fn, bound_fn, eligible), top_k, eligible)
+                for sequence, score_fn, bound_fn, _ in plans
+            ]
+        stats = QueryStats()
+        contributions: Dict[int, List[Tuple[int, float]]] = {}
+        for sequence, score_fn, _, q_by_id in plans:
+            for term_id in sequence:
+                if term_id in contributions:
+                    continue
+                pairs = []
+                for ordinal, weight in zip(*self._posting(term_id)):
+                    if eligible is not None and ordinal not in eligible:
+                        stats.filtered += 1
+                        continue
+                    pairs.append((ordinal, weight if q_by_id is not None else score_fn(term_id, weight, ordinal)))
+                contributions[term_id] = pairs
+        results = []
+        for sequence, _, _, q_by_id in plans:
+            scores: Dict[int, float] = {}
+            for term_id in sequence:
+                q_weight = q_by_id[term_id] if q_by_id is not None else None
+                for ordinal, value in contributions[term_id]:
+                    contribution = value if q_weight is None else q_weight * value
+                    scores[ordinal] = scores.get(ordinal, 0.0) + contribution
+            stats.scored += len(scores)
+            results.append(self._ranked(scores, top_k, eligible))
+        self.last_query_stats = stats
+        return results
+
+    def _ranked(self, scores: Dict[int, float], top_k: int, eligible: Optional[Set[int]]) -> List[Tuple[str, float]]:
+        ranked = self._rank({ordinal: score for ordinal, score in scores.items() if score > 0}, top_k)
         if self.use_lexical_weights:
-            q_weights = self.embedder.encode_lexical(query)
-            scores: Dict[str, float] = {}
-            for chunk_id, weights in self.chunk_terms.items():
-                scores[chunk_id] = self._lexical_score(q_weights, weights)
-            ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-            return ranked[:top_k]
-
-        q_terms = self._tokenize(query)
-        avg_len = sum(sum(c.values()) for c in self.chunk_terms.values()) / max(self.total_docs, 1)
-        scores: Dict[str, float] = defaultdict(float)
-        for chunk_id, terms in self.chunk_terms.items():
-            doc_len = sum(terms.values())
-            for term in q_terms:
-                if term in terms:
-                    scores[chunk_id] += self._bm25(term, terms[term], doc_len, avg_len or 1.0)
-        ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        return ranked[:top_k]
+            # Lexical scoring ranks every chunk; chunks without overlap follow with a zero score.
+            matched = {self.ordinals[cid] for cid, _ in ranked}
+            for ordinal, chunk_id in enumerate(self.chunk_ids):
+                if len(ranked) >= top_k:
+                    break
+                if eligible is not None and ordinal not in eligible:
+                    continue
+                if ordinal not in matched and scores.get(ordinal, 0.0) <= 0:
+                    ranked.append((chunk_id, 0.0))
+        return ranked
+
+    def _exhaustive(
+        self,
+        sequence: List[int],
+        score_fn: Callable[[int, float, int], float],
+        eligible: Optional[AbstractSet[int]] = None,
+    ) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        filtered = 0
+        for term_id in sequence:
+            for ordinal, weight in zip(*self._posting(term_id)):
+                if eligible is not None and ordinal not in eligible:
+                    filtered += 1
+                    continue
+                scores[ordinal] = scores.get(ordinal, 0.0) + score_fn(term_id, weight, ordinal)
+        self.last_query_stats = QueryStats(scored=len(scores), filtered=filtered)
+        return scores
+
+    def _block_maxima(self, term_id: int) -> _BlockMaxima:
+        blocks = self._blocks.get(term_id)
+        if blocks is None:
+            ordinals, weights = self._posting(term_id)
+            blocks = _BlockMaxima(array("I"), array("d"), array("d"))
+            for start in range(0, len(ordinals), POSTING_BLOCK_SIZE):
+                end = min(start + POSTING_BLOCK_SIZE, len(ordinals))
+                blocks.last.append(ordinals[end - 1])
+                blocks.max_weights.append(max(weights[start:end]))
+                blocks.min_lens.append(min(self.doc_lens[o] for o in ordinals[start:end]))
+            self._blocks[term_id] = blocks
+        return blocks
+
+    def _maxscore(
+        self,
+        sequence: List[int],
+        top_k: int,
+        score_fn: Callable[[int, float, int], float],
+        bound_fn: Callable[[int, float, float], float],
+        eligible: Optional[AbstractSet[int]] = None,
+    ) -> Dict[int, float]:
+        """
+        Document-at-a-time block-max MaxScore returning the exact top-k scores.
+
+        Terms are ordered by score upper bound; the low-bound prefix whose
+        bounds cannot lift a document past the current k-th score is
+        "non-essential" and only probed for candidates produced by the
+        essential lists. Candidates are dropped as soon as their partial score
+        plus the remaining term bounds (refined with the per-block maxima of
+        the block containing the document) cannot beat the threshold.
+        """
+
+        stats = QueryStats()
+        self.last_query_stats = stats
+        if top_k <= 0 or not sequence:
+            return {}
+        counts = Counter(sequence)
+        cursors: List[_Cursor] = []
+        for term, count in counts.items():
+            blocks = self._block_maxima(term)
+            upper = bound_fn(term, max(blocks.max_weights), min(blocks.min_lens)) * count
+            cursors.append(_Cursor(term, count, *self._posting(term), blocks, upper))
+        cursors.sort(key=lambda c: c.upper)
+        prefix = list(itertools.accumulate(c.upper for c in cursors))
+        # heads[i] is the next unread ordinal of cursor i (_EXHAUSTED once done).
+        heads = [c.ordinals[0] for c in cursors]
+        n_terms = len(cursors)
+
+        heap: List[Tuple[float, int]] = []
+        threshold = 0.0
+        first = 0
+        while first < n_terms:
+            doc = min(heads[first:])
+            if doc == _EXHAUSTED:
+                break
+            if eligible is not None and doc not in eligible:
+                for idx in range(first, n_terms):
+                    if heads[idx] == doc:
+                        c = cursors[idx]
+                        c.pos += 1
+                        heads[idx] = c.ordinals[c.pos] if c.pos < len(c.ordinals) else _EXHAUSTED
+                        stats.filtered += 1
+                continue
+            matched: List[Tuple[_Cursor, float]] = []
+            partial = 0.0
+            for idx in range(first, n_terms):
+                if heads[idx] == doc:
+                    c = cursors[idx]
+                    value = score_fn(c.term, c.weights[c.pos], doc)
+                    matched.append((c, value))
+                    partial += value * c.count
+                    c.pos += 1
+                    heads[idx] = c.ordinals[c.pos] if c.pos < len(c.ordinals) else _EXHAUSTED
+            if first:
+                if partial + prefix[first - 1] + _BOUND_SLACK <= threshold:
+                    stats.skipped += 1
+                    continue
+                block_bounds = [cursors[idx].block_bound(doc, bound_fn) for idx in range(first)]
+                remaining = sum(block_bounds)
+                if partial + remaining + _BOUND_SLACK <= threshold:
+                    stats.skipped += 1
+                    continue
+                pruned = False
+                for idx in range(first - 1, -1, -1):
+                    c = cursors[idx]
+                    remaining -= block_bounds[idx]
+                    pos = bisect.bisect_left(c.ordinals, doc, c.pos)
+                    stats.postings_skipped += pos - c.pos
+                    c.pos = pos
+                    if pos < len(c.ordinals) and c.ordinals[pos] == doc:
+                        value = score_fn(c.term, c.weights[pos], doc)
+                        matched.append((c, value))
+                        partial += value * c.count
+                        c.pos += 1
+                    heads[idx] = c.ordinals[c.pos] if c.pos < len(c.ordinals) else _EXHAUSTED
+                    if partial + remaining + _BOUND_SLACK <= threshold:
+                        pruned = True
+                        break
+                if pruned:
+                    stats.skipped += 1
+                    continue
+
+            # Sum in query-term order so scores match exhaustive evaluation exactly.
+            contributions = {c.term: value for c, value in matched}
+            score = 0.0
+            for term in sequence:
+                if term in contributions:
+                    score += contributions[term]
+            stats.scored += 1
+            if score > threshold:
+                heapq.heappush(heap, (score, -doc))
+                if len(heap) > top_k:
+                    heapq.heappop(heap)
+                if len(heap) == top_k:
+                    threshold = heap[0][0]
+                    while first < n_terms and prefix[first] <= threshold:
+                        first += 1
+        return {-neg_doc: score for score, neg_doc in heap}
+
@@ -0,0 +1,104 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Tuple, Union
+
+MAGIC = b"RAGIDX"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+_PREFIX = struct.Struct("<6sHQ")
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_index(
+    path: Union[str, Path], kind: str, header: Dict[str, Any], sections: Dict[str, Union[array, memoryview]]
+) -> None:
+    """
+    Write an index file: fixed prefix, JSON header, then raw array sections.
+
+    Every section starts on a 64-byte boundary so readers can ``mmap`` the
+    file and ``cast`` each section in place without copying.
+    """
+
+    header = dict(header, kind=kind, byteorder=sys.byteorder, sections={})
+    # Section offsets depend on the header length, so lay them out twice:
+    # the header size only grows by the digits of the offsets themselves.
+    for _ in range(2):
+        offset = _align(_PREFIX.size + len(json.dumps(header).encode("utf-8")) + ALIGNMENT)
+        layout = {}
+        for name, data in sections.items():
+            typecode = data.typecode if isinstance(data, array) else data.format
+            layout[name] = {"offset": offset, "typecode": typecode, "length": len(data)}
+            offset = _align(offset + len(data) * data.itemsize)
+        header["sections"] = layout
+    encoded = json.dumps(header).encode("utf-8")
+    if any(spec["offset"] < _PREFIX.size + len(encoded) for spec in header["sections"].values()):
+        raise RuntimeError("index header overlaps section data")
+    # Sections may be views into a mapping of ``path`` itself (open → save to
+    # the same file), so write a sibling temp file and swap it in afterwards.
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(encoded)))
+            handle.write(encoded)
+            for name, data in sections.items():
+                handle.seek(header["sections"][name]["offset"])
+                handle.write(memoryview(data).cast("B"))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def open_index(path: Union[str, Path], kind: str) -> Tuple[Dict[str, Any], Dict[str, memoryview]]:
+    """
+    Map an index file read-only and return its header plus zero-copy section views.
+
+    The views keep the mapping alive; processes opening the same file share
+    its physical pages through the OS page cache.
+    """
+
+    with open(path, "rb") as handle:
+        mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(mapped) < _PREFIX.size:
+        raise ValueError(f"{path} is truncated")
+    magic, version, header_len = _PREFIX.unpack_from(mapped, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not an index file")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported index format version {version} (expected {FORMAT_VERSION})")
+    if _PREFIX.size + header_len > len(mapped):
+        raise ValueError(f"{path} is truncated")
+    header = json.loads(mapped[_PREFIX.size : _PREFIX.size + header_len].decode("utf-8"))
+    if header.get("kind") != kind:
+        raise ValueError(f"{path} holds a {header.get('kind')} index, not {kind}")
+    if header.get("byteorder") != sys.byteorder:
+        raise ValueError(f"{path} was written on a {header.get('byteorder')}-endian host")
+    view = memoryview(mapped)
+    sections: Dict[str, memoryview] = {}
+    for name, spec in header["sections"].items():
+        itemsize = array(spec["typecode"]).itemsize
+        start = spec["offset"]
+        if start + spec["length"] * itemsize > len(mapped):
+            raise ValueError(f"{path} is truncated: section {name!r} ends past the end of the file")
+        sections[name] = view[start : start + spec["length"] * itemsize].cast(spec["typecode"])
+    return header, sections
+
+
+def writable(data: Union[array, memoryview], typecode: str) -> array:
+    """Return ``data`` as an appendable array, copying it out of a mapping if needed."""
+
+    if isinstance(data, array):
+        return data
+    copy = array(typecode)
+    copy.frombytes(data.cast("B"))
+    return copy
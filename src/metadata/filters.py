@@ -0,0 +1,114 @@
+from dataclasses import dataclass
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from schema.validators import Metadata
+
+# Set bit positions of every byte value, used to turn a bitmap into ordinals.
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+@dataclass(frozen=True)
+class MetadataFilter:
+    """
+    Subset of chunks to search within.
+
+    Every given field must match (AND); within a field any listed value
+    matches (OR). ``section_prefix`` matches chunks whose ``section_path``
+    starts with those section titles. Sequences are stored as tuples so a
+    filter can be part of a cache key.
+    """
+
+    doc_ids: Optional[Tuple[str, ...]] = None
+    source_types: Optional[Tuple[str, ...]] = None
+    domain_tags: Optional[Tuple[str, ...]] = None
+    section_prefix: Optional[Tuple[str, ...]] = None
+
+    def __post_init__(self) -> None:
+        for name in ("doc_ids", "source_types", "domain_tags", "section_prefix"):
+            value = getattr(self, name)
+            if value is not None:
+                if isinstance(value, str):
+                    raise ValueError(f"{name} must be a sequence of strings")
+                value = tuple(value)
+                if not all(isinstance(item, str) for item in value):
+                    raise ValueError(f"{name} must be a sequence of strings")
+                object.__setattr__(self, name, value)
+
+
+class MetadataIndex:
+    """
+    Bitmap index over child chunk ``Metadata``.
+
+    Chunks get ordinals in ingest order; every (field, value) pair keeps a
+    bitmap (a Python int, bit ``i`` = ordinal ``i``) so a filter is a few
+    big-integer ORs and ANDs. Every prefix of a ``section_path`` is indexed,
+    which makes prefix filters a single lookup. Re-adding a chunk id replaces
+    its previous metadata.
+    """
+
+    def __init__(self) -> None:
+        self.chunk_ids: List[str] = []
+        self.ordinals: Dict[str, int] = {}
+        self.bitmaps: Dict[Tuple[str, Hashable], int] = {}
+        self._keys: List[List[Tuple[str, Hashable]]] = []
+        self._all = 0
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    @staticmethod
+    def _metadata_keys(metadata: Metadata) -> List[Tuple[str, Hashable]]:
+        keys: List[Tuple[str, Hashable]] = [("doc_id", metadata.doc_id), ("source_type", metadata.source_type)]
+        keys.extend(("domain_tags", tag) for tag in set(metadata.domain_tags or []))
+        section_path = tuple(metadata.section_path or ())
+        keys.extend(("section_path", section_path[:depth]) for depth in range(1, len(section_path) + 1))
+        return keys
+
+    def add(self, chunk_id: str, metadata: Metadata) -> None:
+        ordinal = self.ordinals.get(chunk_id)
+        if ordinal is None:
+            ordinal = len(self.chunk_ids)
+            self.ordinals[chunk_id] = ordinal
+            self.chunk_ids.append(chunk_id)
+            self._keys.append([])
+            self._all |= 1 << ordinal
+        bit = 1 << ordinal
+        for key in self._keys[ordinal]:
+            self.bitmaps[key] &= ~bit
+        keys = self._metadata_keys(metadata)
+        for key in keys:
+            self.bitmaps[key] = self.bitmaps.get(key, 0) | bit
+        self._keys[ordinal] = keys
+
+    def _any_of(self, field: str, values: Iterable[Hashable]) -> int:
+        bitmap = 0
+        for value in values:
+            bitmap |= self.bitmaps.get((field, value), 0)
+        return bitmap
+
+    def bitmap(self, flt: MetadataFilter) -> int:
+        """Bitmap of the chunk ordinals matching ``flt``."""
+
+        bitmap = self._all
+        if flt.doc_ids is not None:
+            bitmap &= self._any_of("doc_id", flt.doc_ids)
+        if flt.source_types is not None:
+            bitmap &= self._any_of("source_type", flt.source_types)
+        if flt.domain_tags is not None:
+            bitmap &= self._any_of("domain_tags", flt.domain_tags)
+        if flt.section_prefix:
+            bitmap &= self.bitmaps.get(("section_path", flt.section_prefix), 0)
+        return bitmap
+
+    def match(self, flt: MetadataFilter) -> List[str]:
+        """Chunk ids matching ``flt``, in ingest order."""
+
+        bitmap = self.bitmap(flt)
+        if not bitmap:
+            return []
+        matched: List[str] = []
+        for pos, byte in enumerate(bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")):
+            if byte:
+                base = pos * 8
+                matched.extend(self.chunk_ids[base + bit] for bit in _BYTE_BITS[byte])
+        return matched
@@ -1,16 +1,116 @@
-from typing import List, Tuple
+import heapq
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
 
 from schema.validators import ChildChunk
 
+# Score contribution per character of chunk text (a mild preference for longer context).
+LENGTH_WEIGHT = 1e-4
+
+
+@dataclass
+class RerankStats:
+    """Counters exposed as ``CrossEncoderReranker.stats``."""
+
+    scored: int = 0
+    cache_hits: int = 0
+    pruned: int = 0
+    evictions: int = 0
+
 
 class CrossEncoderReranker:
+    """
+    Reranks candidates by query term overlap (a stand-in for a cross-encoder).
+
+    ``add`` precomputes each chunk's normalized term set at ingest time;
+    chunks that were never added are normalized on the fly. ``score_batch``
+    scores a whole candidate list in one call, remembers (query, chunk id)
+    scores in an LRU of ``cache_size`` entries and, given ``top_n``, stops as
+    soon as no remaining candidate's upper bound (full term overlap) can
+    enter the top ``top_n``.
+    """
+
+    def __init__(self, cache_size: int = 4096) -> None:
+        self.cache_size = cache_size
+        self.stats = RerankStats()
+        self._terms: Dict[str, Tuple[FrozenSet[str], int]] = {}
+        self._cache: "OrderedDict[Tuple[FrozenSet[str], str], float]" = OrderedDict()
+
+    @staticmethod
+    def _normalize(text: str) -> FrozenSet[str]:
+        return frozenset(text.lower().split())
+
+    def add(self, chunk: ChildChunk) -> None:
+        entry = (self._normalize(chunk.text), len(chunk.text))
+        previous = self._terms.get(chunk.chunk_id)
+        if previous is not None and previous != entry:
+            # Cached scores of the old text are stale; re-ingest is rare enough to drop them all.
+            self._cache.clear()
+        self._terms[chunk.chunk_id] = entry
+
+    def _entry(self, chunk: ChildChunk) -> Tuple[FrozenSet[str], int]:
+        entry = self._terms.get(chunk.chunk_id)
+        if entry is None:
+            entry = (self._normalize(chunk.text), len(chunk.text))
+        return entry
+
     def score(self, query: str, candidates: List[ChildChunk]) -> List[Tuple[ChildChunk, float]]:
-        query_terms = set(query.lower().split())
-        results: List[Tuple[ChildChunk, float]] = []
-        for cand in candidates:
-            text_terms = cand.text.lower().split()
-            overlap = len(query_terms.intersection(text_terms))
-            score = overlap / max(len(query_terms), 1) + len(cand.text) * 1e-4
-            results.append((cand, score))
-        results.sort(key=lambda x: x[1], reverse=True)
-        return results
+        return self.score_batch(query, candidates)
+
+    def score_batch(
+        self, query: str, candidates: Sequence[ChildChunk], top_n: Optional[int] = None
+    ) -> List[Tuple[ChildChunk, float]]:
+        """
+        Candidates with their scores, best first (ties keep candidate order).
+
+        With ``top_n`` only candidates that could still reach the top
+        ``top_n`` are scored and returned; the first ``top_n`` entries equal
+        those of a full scoring.
+        """
+
+        if top_n is not None and top_n <= 0:
+            return []
+        query_terms = self._normalize(query)
+        q_norm = max(len(query_terms), 1)
+        entries = [self._entry(cand) for cand in candidates]
+        # A candidate scores at most full overlap plus its length bonus.
+        bounds = [(1.0 if query_terms else 0.0) + length * LENGTH_WEIGHT for _, length in entries]
+        order = range(len(candidates))
+        if top_n is not None:
+            order = sorted(order, key=lambda pos: -bounds[pos])
+        scored: List[Tuple[float, int]] = []
+        best: List[float] = []  # min-heap of the top_n scores so far
+        for rank, pos in enumerate(order):
+            if top_n is not None and len(best) >= top_n and bounds[pos] < best[0]:
+                self.stats.pruned += len(candidates) - rank
+                break
+            score = self._cached_score(query_terms, q_norm, candidates[pos], entries[pos])
+            scored.append((score, pos))
+            if top_n is not None:
+                if len(best) < top_n:
+                    heapq.heappush(best, score)
+                elif score > best[0]:
+                    heapq.heapreplace(best, score)
+        scored.sort(key=lambda x: (-x[0], x[1]))
+        return [(candidates[pos], score) for score, pos in scored]
+
+    def _cached_score(
+        self, query_terms: FrozenSet[str], q_norm: int, chunk: ChildChunk, entry: Tuple[FrozenSet[str], int]
+    ) -> float:
+        # Keyed by the normalized query, so case and spacing variants share entries.
+        key = (query_terms, chunk.chunk_id)
+        score = self._cache.get(key)
+        if score is not None and chunk.chunk_id in self._terms:
+            self._cache.move_to_end(key)
+            self.stats.cache_hits += 1
+            return score
+        terms, length = entry
+        score = len(query_terms & terms) / q_norm + length * LENGTH_WEIGHT
+        self.stats.scored += 1
+        if self.cache_size > 0 and chunk.chunk_id in self._terms:
+            self._cache[key] = score
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+                self.stats.evictions += 1
+        return score
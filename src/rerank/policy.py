@@ -0,0 +1,91 @@
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from rerank.cross_encoder import CrossEncoderReranker
+from schema.validators import ChildChunk
+
+
+@dataclass
+class RerankDecision:
+    """Per-query record exposed as ``SearchService.last_rerank_stats``."""
+
+    depth: int = 0
+    reranked: int = 0
+    seconds: float = 0.0
+    budget_exhausted: bool = False
+
+
+class RerankPolicy:
+    """
+    Chooses how many fused candidates to rerank and bounds the time spent.
+
+    At most ``max_depth_factor * top_n`` candidates are reranked. With
+    ``tolerance`` set, the depth shrinks to the candidates whose fused score
+    is within ``tolerance`` (relative) of the ``top_n``-th fused score, but
+    never below ``top_n``: a clear gap after the top ``top_n`` means the tail
+    cannot plausibly move up. With ``budget_seconds`` set, candidates are
+    reranked in blocks of ``block_size`` and the clock is checked between
+    blocks; once the budget is spent the remaining candidates keep their
+    fused order (and fused score) after the reranked ones. The default
+    policy reranks ``2 * top_n`` candidates without a budget.
+    """
+
+    def __init__(
+        self,
+        max_depth_factor: float = 2.0,
+        tolerance: Optional[float] = None,
+        budget_seconds: Optional[float] = None,
+        block_size: int = 8,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        self.max_depth_factor = max_depth_factor
+        self.tolerance = tolerance
+        self.budget_seconds = budget_seconds
+        self.block_size = block_size
+        self.clock = clock
+
+    def max_depth(self, top_n: int) -> int:
+        return max(top_n, int(top_n * self.max_depth_factor))
+
+    def depth(self, fused_scores: Sequence[float], top_n: int) -> int:
+        """Number of leading fused candidates to rerank."""
+
+        limit = min(len(fused_scores), self.max_depth(top_n))
+        if self.tolerance is None or limit <= top_n:
+            return limit
+        cutoff = fused_scores[top_n - 1] * (1 - self.tolerance)
+        depth = top_n
+        while depth < limit and fused_scores[depth] >= cutoff:
+            depth += 1
+        return depth
+
+    def rerank(
+        self,
+        reranker: CrossEncoderReranker,
+        query: str,
+        fused: Sequence[Tuple[ChildChunk, float]],
+        top_n: int,
+    ) -> Tuple[List[Tuple[ChildChunk, float]], RerankDecision]:
+        """The top ``top_n`` of ``fused`` (candidates with fused scores) after reranking, plus the decision."""
+
+        start = self.clock()
+        depth = self.depth([score for _, score in fused], top_n)
+        decision = RerankDecision(depth=depth)
+        candidates = [child for child, _ in fused[:depth]]
+        if self.budget_seconds is None:
+            reranked = reranker.score_batch(query, candidates, top_n=top_n)
+            decision.reranked = len(candidates)
+        else:
+            reranked = []
+            for block_start in range(0, len(candidates), self.block_size):
+                if self.clock() - start >= self.budget_seconds:
+                    decision.budget_exhausted = True
+                    break
+                reranked.extend(reranker.score_batch(query, candidates[block_start : block_start + self.block_size]))
+                decision.reranked = min(block_start + self.block_size, len(candidates))
+            # Blocks were scored separately; a stable sort keeps candidate order among ties.
+            reranked.sort(key=lambda x: x[1], reverse=True)
+            reranked.extend(fused[decision.reranked : depth])
+        decision.seconds = self.clock() - start
+        return reranked[:top_n], decision
@@ -1,25 +1,283 @@
-from typing import Dict, List, Tuple
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
 
 from index.dense import DenseIndexer
+from index.embedder import EncodedText
 from index.multivector import MultiVectorIndexer
 from index.sparse import SparseIndexer
 
+LEGS = ("dense", "sparse", "multivector")
+# How the multi-vector leg takes part: a full leg, or MaxSim over the fused dense + sparse candidates
+# added as a third RRF list ("rrf") or used as the final ranking ("score").
+COLBERT_MODES = ("full", "rrf", "score")
+# Cascade order: cheapest leg first, late interaction last.
+CASCADE = ("sparse", "dense", "multivector")
+
+Hits = List[Tuple[str, float]]
+
+
+def rrf_fuse(*hits_lists: Hits, k: int = 60) -> Hits:
+    """Reciprocal rank fusion of ranked hit lists (only ranks count, not scores)."""
+
+    scores: Dict[str, float] = {}
+    for hits in hits_lists:
+        for rank, (cid, _) in enumerate(hits):
+            scores[cid] = scores.get(cid, 0) + 1 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+
+
+@dataclass
+class RetrievalStats:
+    """Per-query leg timings exposed as ``HybridRetriever.last_query_stats``."""
+
+    latencies: Dict[str, float] = field(default_factory=dict)
+    timed_out: List[str] = field(default_factory=list)
+    # Cascade legs that did not run, mapped to "confident" or "budget".
+    skipped: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class CascadeStats:
+    """Cumulative cascade counters exposed as ``HybridRetriever.cascade_stats``."""
+
+    queries: int = 0
+    runs: Dict[str, int] = field(default_factory=dict)
+    skipped_confident: Dict[str, int] = field(default_factory=dict)
+    skipped_budget: Dict[str, int] = field(default_factory=dict)
+
+    def skip_rate(self, leg: str) -> float:
+        skipped = self.skipped_confident.get(leg, 0) + self.skipped_budget.get(leg, 0)
+        return skipped / self.queries if self.queries else 0.0
+
 
 class HybridRetriever:
+    """
+    Runs the dense, sparse and multi-vector legs and fuses them with RRF.
+
+    With ``concurrent=True`` the legs run on a thread pool and each leg may
+    have a deadline in ``leg_deadlines`` (seconds from the moment the leg
+    starts running). Fusion proceeds with the legs that finished in time; late
+    legs are listed in ``last_query_stats.timed_out`` and left to finish in
+    the background. While a late run is still going, later queries do not
+    start that leg again (it counts as timed out) so it cannot pile up
+    behind itself, and the pool keeps room for one late run per leg so the
+    other legs never wait for a thread. The legs are pure Python, so
+    threads overlap only where a leg releases the GIL; the deadlines still
+    bound the wait.
+
+    With ``cascade=True`` the legs instead run one after another, cheapest
+    first (sparse, dense, multi-vector), and the query stops early once the
+    last leg's relative top-1 margin ``(s1 - s2) / |s1|`` reaches
+    ``cascade_margin`` or once the next leg's expected latency (a running
+    average of its past runs) would overrun ``latency_budget`` seconds. With
+    ``cascade_restrict`` the later legs score only the sparse candidates.
+    Skips are counted in ``cascade_stats``.
+
+    ``colbert_mode="rrf"`` or ``"score"`` turns the multi-vector leg into a
+    rescoring stage: dense and sparse are fused first and ColBERT MaxSim is
+    computed only for the top ``colbert_depth`` fused candidates, then either
+    fused in as a third RRF list or used as the final order (the rest of the
+    fused list follows when ``top_n`` exceeds the depth).
+    """
+
     def __init__(
-        self, dense: DenseIndexer, sparse: SparseIndexer, multivector: MultiVectorIndexer | None = None
+        self,
+        dense: DenseIndexer,
+        sparse: SparseIndexer,
+        multivector: MultiVectorIndexer | None = None,
+        concurrent: bool = False,
+        leg_deadlines: Optional[Dict[str, float]] = None,
+        cascade: bool = False,
+        cascade_margin: float = 0.3,
+        latency_budget: Optional[float] = None,
+        cascade_restrict: bool = True,
+        colbert_mode: str = "full",
+        colbert_depth: int = 100,
     ) -> None:
+        if colbert_mode not in COLBERT_MODES:
+            raise ValueError(f"Unsupported colbert_mode: {colbert_mode}")
+        if cascade and colbert_mode != "full":
+            raise ValueError("cascade already restricts the multi-vector leg; use colbert_mode='full'")
         self.dense = dense
         self.sparse = sparse
         shared_embedder = getattr(dense, "embedder", None)
-        self.multivector = multivector or MultiVectorIndexer(embedder=shared_embedder)
+        self.multivector = multivector if multivector is not None else MultiVectorIndexer(embedder=shared_embedder)
+        self.concurrent = concurrent
+        self.leg_deadlines = leg_deadlines or {}
+        self.cascade = cascade
+        self.cascade_margin = cascade_margin
+        self.latency_budget = latency_budget
+        self.cascade_restrict = cascade_restrict
+        self.cascade_stats = CascadeStats()
+        self.colbert_mode = colbert_mode
+        self.colbert_depth = colbert_depth
+        self.last_query_stats = RetrievalStats()
+        self._leg_costs: Dict[str, float] = {}
+        self._pool: Optional[ThreadPoolExecutor] = None
+        # Legs abandoned at their deadline that may still be running, by leg name.
+        self._in_flight: Dict[str, Future] = {}
 
     def rrf_fuse(self, *hits_lists: List[List[Tuple[str, float]]], k: int = 60) -> List[Tuple[str, float]]:
-        scores: Dict[str, float] = {}
-        for hits in hits_lists:
-            for rank, (cid, _) in enumerate(hits):
-                scores[cid] = scores.get(cid, 0) + 1 / (k + rank + 1)
-        return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        return rrf_fuse(*hits_lists, k=k)
+
+    def encode(self, query: str) -> Optional[EncodedText]:
+        """Encode ``query`` once for all legs, or ``None`` if the legs use different embedders."""
+
+        embedder = self.dense.embedder
+        if self.sparse.embedder is not embedder or self.multivector.embedder is not embedder:
+            return None
+        return embedder.encode_all(query)
+
+    def encode_batch(self, queries: Sequence[str]) -> Optional[List[EncodedText]]:
+        """``encode`` for many queries through the embedder's batch API."""
+
+        embedder = self.dense.embedder
+        if self.sparse.embedder is not embedder or self.multivector.embedder is not embedder:
+            return None
+        batch = embedder.encode_batch(queries)
+        return [
+            EncodedText(dense=batch.dense.row(idx), lexical=batch.lexical[idx], colbert=batch.colbert_vectors(idx))
+            for idx in range(len(queries))
+        ]
+
+    def _legs(
+        self,
+        query: str,
+        encoded: Optional[EncodedText],
+        top_k_d: int,
+        top_k_s: int,
+        top_k_mv: int,
+        allowed: Optional[Sequence[str]] = None,
+    ) -> Dict[str, Callable[[], Hits]]:
+        if encoded is None:
+            return {
+                "dense": lambda: self.dense.query(query, top_k=top_k_d, allowed=allowed),
+                "sparse": lambda: self.sparse.query(query, top_k=top_k_s, allowed=allowed),
+                "multivector": lambda: self.multivector.query(query, top_k=top_k_mv, allowed=allowed),
+            }
+        return {
+            "dense": lambda: self.dense.query_vector(encoded.dense, top_k=top_k_d, allowed=allowed),
+            "sparse": lambda: self.sparse.query(
+                query, top_k=top_k_s, lexical_weights=encoded.lexical, allowed=allowed
+            ),
+            "multivector": lambda: self.multivector.query_vectors(encoded.colbert, top_k=top_k_mv, allowed=allowed),
+        }
+
+    def _restricted_legs(
+        self, query: str, encoded: Optional[EncodedText], candidates: List[str], top_k_d: int, top_k_mv: int
+    ) -> Dict[str, Callable[[], Hits]]:
+        if encoded is None:
+            return {
+                "dense": lambda: self.dense.query_candidates(
+                    self.dense.embedder.encode_dense(query), candidates, top_k=top_k_d
+                ),
+                "multivector": lambda: self.multivector.query_candidates(
+                    self.multivector.embedder.encode_colbert(query), candidates, top_k=top_k_mv
+                ),
+            }
+        return {
+            "dense": lambda: self.dense.query_candidates(encoded.dense, candidates, top_k=top_k_d),
+            "multivector": lambda: self.multivector.query_candidates(encoded.colbert, candidates, top_k=top_k_mv),
+        }
+
+    @staticmethod
+    def _margin(hits: Hits) -> float:
+        if len(hits) < 2:
+            return float("inf") if hits else 0.0
+        top, second = hits[0][1], hits[1][1]
+        return (top - second) / abs(top) if top else 0.0
+
+    def _run_cascade(
+        self,
+        query: str,
+        encoded: Optional[EncodedText],
+        top_k_d: int,
+        top_k_s: int,
+        top_k_mv: int,
+        stats: RetrievalStats,
+        allowed: Optional[Sequence[str]] = None,
+    ) -> Dict[str, Hits]:
+        legs = self._legs(query, encoded, top_k_d, top_k_s, top_k_mv, allowed)
+        counters = self.cascade_stats
+        counters.queries += 1
+        start = time.perf_counter()
+        results: Dict[str, Hits] = {}
+        stop: Optional[str] = None
+        for name in CASCADE:
+            if stop is None and results:
+                if self._margin(results[CASCADE[len(results) - 1]]) >= self.cascade_margin:
+                    stop = "confident"
+                elif self.latency_budget is not None:
+                    expected = self._leg_costs.get(name, 0.0)
+                    if time.perf_counter() - start + expected > self.latency_budget:
+                        stop = "budget"
+            if stop is not None:
+                stats.skipped[name] = stop
+                skipped = counters.skipped_confident if stop == "confident" else counters.skipped_budget
+                skipped[name] = skipped.get(name, 0) + 1
+                continue
+            candidates = [cid for cid, score in results.get("sparse", []) if score > 0]
+            if name == "dense" and self.cascade_restrict and candidates:
+                legs.update(self._restricted_legs(query, encoded, candidates, top_k_d, top_k_mv))
+            results[name], elapsed = self._timed(legs[name])
+            stats.latencies[name] = elapsed
+            previous = self._leg_costs.get(name)
+            self._leg_costs[name] = elapsed if previous is None else 0.8 * previous + 0.2 * elapsed
+            counters.runs[name] = counters.runs.get(name, 0) + 1
+        return results
+
+    @staticmethod
+    def _timed(leg: Callable[[], Hits]) -> Tuple[Hits, float]:
+        start = time.perf_counter()
+        hits = leg()
+        return hits, time.perf_counter() - start
+
+    def _run_legs(self, legs: Dict[str, Callable[[], Hits]], stats: RetrievalStats) -> Dict[str, Hits]:
+        results: Dict[str, Hits] = {}
+        if not self.concurrent:
+            for name, leg in legs.items():
+                results[name], stats.latencies[name] = self._timed(leg)
+            return results
+        if self._pool is None:
+            # Room for one abandoned run per leg besides a full query, so no leg ever queues behind a late one.
+            self._pool = ThreadPoolExecutor(max_workers=2 * len(LEGS), thread_name_prefix="hybrid-leg")
+        futures: Dict[str, Future] = {}
+        started: Dict[str, Tuple[threading.Event, List[float]]] = {}
+        for name, leg in legs.items():
+            late = self._in_flight.get(name)
+            if late is not None and not late.done():
+                continue
+            self._in_flight.pop(name, None)
+            started[name] = (threading.Event(), [])
+            futures[name] = self._pool.submit(self._started_leg, leg, *started[name])
+        for name in legs:
+            future = futures.get(name)
+            if future is None:
+                # The previous run of this leg is still going; a second copy could not beat its deadline either.
+                stats.timed_out.append(name)
+                continue
+            deadline = self.leg_deadlines.get(name)
+            timeout = None
+            if deadline is not None:
+                # Measured from when the leg starts running, not from when it was submitted.
+                event, start = started[name]
+                event.wait()
+                timeout = max(0.0, start[0] + deadline - time.perf_counter())
+            try:
+                results[name], stats.latencies[name] = future.result(timeout=timeout)
+            except FutureTimeout:
+                stats.timed_out.append(name)
+                self._in_flight[name] = future
+        return results
+
+    def _started_leg(self, leg: Callable[[], Hits], event: threading.Event, start: List[float]) -> Tuple[Hits, float]:
+        start.append(time.perf_counter())
+        event.set()
+        return self._timed(leg)
 
     def query(
         self,
@@ -28,9 +286,129 @@ class HybridRetriever:
         top_k_s: int = 40,
         top_k_mv: int = 20,
         top_n: int = 20,
+        encoded: Optional[EncodedText] = None,
+        allowed: Optional[Sequence[str]] = None,
     ) -> List[Tuple[str, float]]:
-        dense_hits = self.dense.query(query, top_k=top_k_d)
-        sparse_hits = self.sparse.query(query, top_k=top_k_s)
-        multivector_hits = self.multivector.query(query, top_k=top_k_mv)
-        fused = self.rrf_fuse(dense_hits, sparse_hits, multivector_hits)
+        """Fused top ``top_n``; ``allowed`` (chunk ids) is pushed down so every leg scores only those chunks."""
+
+        encoded = encoded or self.encode(query)
+        stats = RetrievalStats()
+        if self.cascade:
+            results = self._run_cascade(query, encoded, top_k_d, top_k_s, top_k_mv, stats, allowed)
+        elif self.colbert_mode != "full":
+            self.last_query_stats = stats
+            return self._rescore(query, encoded, top_k_d, top_k_s, top_k_mv, top_n, stats, allowed)
+        else:
+            results = self._run_legs(self._legs(query, encoded, top_k_d, top_k_s, top_k_mv, allowed), stats)
+        self.last_query_stats = stats
+        fused = self.rrf_fuse(*(results[name] for name in LEGS if name in results))
         return fused[:top_n]
+
+    def _rescore(
+        self,
+        query: str,
+        encoded: Optional[EncodedText],
+        top_k_d: int,
+        top_k_s: int,
+        top_k_mv: int,
+        top_n: int,
+        stats: RetrievalStats,
+        allowed: Optional[Sequence[str]],
+    ) -> List[Tuple[str, float]]:
+        legs = self._legs(query, encoded, top_k_d, top_k_s, top_k_mv, allowed)
+        del legs["multivector"]
+        results = self._run_legs(legs, stats)
+        first_stage = self.rrf_fuse(*(results[name] for name in LEGS if name in results))
+        candidates = [cid for cid, _ in first_stage[: self.colbert_depth]]
+        if not candidates:
+            return []
+        leg = self._restricted_legs(query, encoded, candidates, top_k_d, len(candidates))["multivector"]
+        rescored, stats.latencies["multivector"] = self._timed(leg)
+        if self.colbert_mode == "rrf":
+            return self.rrf_fuse(*(results[name] for name in LEGS if name in results), rescored[:top_k_mv])[:top_n]
+        return (rescored + first_stage[len(candidates) :])[:top_n]
+
+    def query_batch(
+        self,
+        queries: Sequence[str],
+        top_k_d: int = 20,
+        top_k_s: int = 40,
+        top_k_mv: int = 20,
+        top_n: int = 20,
+        encoded: Optional[List[EncodedText]] = None,
+        allowed: Optional[Sequence[str]] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        ``query`` for many queries, with the same results.
+
+        Queries are encoded in one batch and each leg scores the whole batch
+        at once (dense as a matrix-matrix product, sparse sharing posting list
+        reads, multi-vector sharing one pass over the token vectors). Cascade
+        and ColBERT rescoring modes decide per query, so they fall back to
+        ``query`` for each one. ``last_query_stats`` holds the batch totals.
+
+        With ``concurrent`` and ``leg_deadlines`` each batched leg runs on the
+        pool under its deadline, which then bounds the leg for the whole
+        batch: a leg that misses it is left out of every query's fusion and
+        listed in ``timed_out``. Results equal ``query``'s only when no leg
+        times out.
+        """
+
+        if not queries:
+            return []
+        encoded = encoded or self.encode_batch(queries)
+        if self.cascade or self.colbert_mode != "full" or encoded is None:
+            totals = RetrievalStats()
+            fused = []
+            for idx, q in enumerate(queries):
+                q_encoded = encoded[idx] if encoded else None
+                fused.append(self.query(q, top_k_d, top_k_s, top_k_mv, top_n, q_encoded, allowed))
+                stats = self.last_query_stats
+                for name, seconds in stats.latencies.items():
+                    totals.latencies[name] = totals.latencies.get(name, 0.0) + seconds
+                totals.timed_out.extend(name for name in stats.timed_out if name not in totals.timed_out)
+                totals.skipped.update(stats.skipped)
+            self.last_query_stats = totals
+            return fused
+        results = self.query_legs_batch(queries, top_k_d, top_k_s, top_k_mv, encoded, allowed)
+        return [self.rrf_fuse(*(legs[name] for name in LEGS))[:top_n] for legs in results]
+
+    def query_legs_batch(
+        self,
+        queries: Sequence[str],
+        top_k_d: int = 20,
+        top_k_s: int = 40,
+        top_k_mv: int = 20,
+        encoded: Optional[List[EncodedText]] = None,
+        allowed: Optional[Sequence[str]] = None,
+    ) -> List[Dict[str, Hits]]:
+        """Unfused per-leg hits of every query (the input of ``query_batch``'s fusion); timed-out legs are empty."""
+
+        if not queries:
+            return []
+        encoded = encoded or self.encode_batch(queries)
+        if encoded is None:
+            raise ValueError("batched legs need dense, sparse and multi-vector indexers sharing one embedder")
+        stats = RetrievalStats()
+        legs = {
+            "dense": lambda: self.dense.query_vectors_batch([e.dense for e in encoded], top_k=top_k_d, allowed=allowed),
+            "sparse": lambda: self.sparse.query_batch(
+                queries, top_k=top_k_s, lexical_weights=[e.lexical for e in encoded], allowed=allowed
+            ),
+            "multivector": lambda: self.multivector.query_vectors_batch(
+                [e.colbert for e in encoded], top_k=top_k_mv, allowed=allowed
+            ),
+        }
+        results = self._run_legs(legs, stats)
+        self.last_query_stats = stats
+        return [
+            {name: results[name][idx] if name in results else [] for name in LEGS} for idx in range(len(queries))
+        ]
+
+    def close(self) -> None:
+        """Shut down the leg thread pool, if one was started."""
+
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+        self._in_flight.clear()
@@ -1,71 +1,234 @@
-from typing import Dict, List
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
 from chunk.parent_child import chunk_document
 from ingest.loader import load_document
 from index.dense import DenseIndexer
-from index.embedder import BGEEmbedder
+from index.embedder import BGEEmbedder, EncodedText
+from index.embedding_cache import EmbeddingCache
 from index.multivector import MultiVectorIndexer
 from index.sparse import SparseIndexer
 from metadata.enrich import enrich_child_metadata
+from metadata.filters import MetadataFilter, MetadataIndex
 from rerank.cross_encoder import CrossEncoderReranker
+from rerank.policy import RerankDecision, RerankPolicy
 from retrieval.hybrid import HybridRetriever
 from schema.validators import ChildChunk, DocumentBlocks, ParentChunk
+from serve.cache import QueryResultCache, SemanticCache
+from serve.context import ContextAssembler
 
 
 class SearchService:
-    def __init__(self) -> None:
-        self.embedder = BGEEmbedder()
-        self.dense = DenseIndexer(embedder=self.embedder)
-        self.sparse = SparseIndexer(embedder=self.embedder, use_lexical_weights=True)
-        self.multivector = MultiVectorIndexer(embedder=self.embedder)
-        self.retriever = HybridRetriever(self.dense, self.sparse, self.multivector)
+    def __init__(
+        self,
+        dense_mode: str = "exact",
+        dense_options: Optional[Dict[str, Any]] = None,
+        sparse_options: Optional[Dict[str, Any]] = None,
+        multivector_options: Optional[Dict[str, Any]] = None,
+        encode_workers: int = 0,
+        embedding_cache_size: int = 256,
+        embedding_cache_path: Optional[Union[str, Path]] = None,
+        query_cache_size: int = 1024,
+        query_cache_ttl: float = 300.0,
+        semantic_cache_threshold: Optional[float] = None,
+        semantic_cache_size: int = 64,
+        concurrent_legs: bool = False,
+        leg_deadlines: Optional[Dict[str, float]] = None,
+        cascade: bool = False,
+        latency_budget: Optional[float] = None,
+        rerank_policy: Optional[RerankPolicy] = None,
+        context_tokens: int = 400,
+        dedupe_context: bool = True,
+    ) -> None:
+        self.embedder = BGEEmbedder(workers=encode_workers)
+        self.embedding_cache = EmbeddingCache(self.embedder, max_entries=embedding_cache_size, path=embedding_cache_path)
+        self.dense = DenseIndexer(embedder=self.embedder, mode=dense_mode, **(dense_options or {}))
+        sparse_options = dict(sparse_options or {})
+        sparse_options.setdefault("use_lexical_weights", True)
+        self.sparse = SparseIndexer(embedder=self.embedder, **sparse_options)
+        self.multivector = MultiVectorIndexer(embedder=self.embedder, **(multivector_options or {}))
+        self.retriever = HybridRetriever(
+            self.dense,
+            self.sparse,
+            self.multivector,
+            concurrent=concurrent_legs,
+            leg_deadlines=leg_deadlines,
+            cascade=cascade,
+            latency_budget=latency_budget,
+        )
         self.reranker = CrossEncoderReranker()
+        self.rerank_policy = rerank_policy or RerankPolicy()
+        self.last_rerank_stats = RerankDecision()
         self.children: Dict[str, ChildChunk] = {}
         self.parents: Dict[str, ParentChunk] = {}
+        self.context = ContextAssembler()
+        self.context_tokens = context_tokens
+        self.dedupe_context = dedupe_context
+        self.metadata_index = MetadataIndex()
+        # Bumped on every index change; cached results of older generations are stale.
+        self.generation = 0
+        self.query_cache = QueryResultCache(max_entries=query_cache_size, ttl_seconds=query_cache_ttl)
+        self.semantic_cache: Optional[SemanticCache] = None
+        if semantic_cache_threshold is not None:
+            self.semantic_cache = SemanticCache(threshold=semantic_cache_threshold, max_entries=semantic_cache_size)
 
     def ingest(self, doc: DocumentBlocks) -> None:
-        parents, children = chunk_document(doc, target_min_tokens=50, target_max_tokens=120)
-        for parent in parents:
-            self.parents[parent.parent_id] = parent
-        for child in children:
+        self.ingest_many([doc])
+
+    def ingest_many(self, docs: Iterable[DocumentBlocks]) -> List[ChildChunk]:
+        """Chunk all ``docs``, then encode their children in one batch; returns the children in ingest order."""
+
+        children: List[ChildChunk] = []
+        for doc in docs:
+            parents, doc_children = chunk_document(doc, target_min_tokens=50, target_max_tokens=120)
+            for parent in parents:
+                self.parents[parent.parent_id] = parent
+            children.extend(doc_children)
+        batch = self.embedding_cache.encode_batch([child.text for child in children])
+        for idx, child in enumerate(children):
             self.children[child.chunk_id] = child
-            dense_vec = self.embedder.encode_dense(child.text)
-            lexical_weights = self.embedder.encode_lexical(child.text)
-            colbert_vectors = self.embedder.encode_colbert(child.text)
-            self.dense.add(child.chunk_id, child.text, vector=dense_vec)
-            self.sparse.add(child.chunk_id, child.text, lexical_weights=lexical_weights)
-            self.multivector.add(child.chunk_id, child.text, token_vectors=colbert_vectors)
+            self.metadata_index.add(child.chunk_id, child.metadata)
+            self.reranker.add(child)
+            self.context.add(child)
+            self.dense.add(child.chunk_id, child.text, vector=batch.dense.row(idx))
+            self.sparse.add(child.chunk_id, child.text, lexical_weights=batch.lexical[idx])
+            self.multivector.add(child.chunk_id, child.text, token_vectors=batch.colbert_vectors(idx))
+        self.generation += 1
+        return children
 
     def load_and_ingest(self, path: str) -> None:
         doc = load_document(path)
         self.ingest(doc)
 
-    def _parent_expand(self, child: ChildChunk, token_budget: int = 400) -> str:
-        siblings = [c for c in self.children.values() if c.parent_id == child.parent_id]
-        siblings.sort(key=lambda c: c.order)
-        idx = next((i for i, s in enumerate(siblings) if s.chunk_id == child.chunk_id), 0)
-        context_chunks = [child]
-        if idx > 0:
-            context_chunks.insert(0, siblings[idx - 1])
-        if idx + 1 < len(siblings):
-            context_chunks.append(siblings[idx + 1])
-        text_parts: List[str] = []
-        total_tokens = 0
-        for ch in context_chunks:
-            tokens = len(ch.text.split())
-            if total_tokens + tokens > token_budget:
-                break
-            total_tokens += tokens
-            text_parts.append(ch.text)
-        return "\n".join(text_parts)
-
-    def search(self, query: str, top_n: int = 5) -> List[Dict]:
-        fused = self.retriever.query(query, top_n=top_n * 2)
-        candidates = [self.children[cid] for cid, _ in fused if cid in self.children][: top_n * 2]
-        reranked = self.reranker.score(query, candidates)
+    def search(self, query: str, top_n: int = 5, metadata_filter: Optional[MetadataFilter] = None) -> List[Dict]:
+        """
+        Top ``top_n`` results for ``query``.
+
+        ``metadata_filter`` limits the search to matching chunks; it is
+        resolved against the metadata bitmap index and pushed down into every
+        indexer, so only eligible chunks are scored.
+        """
+
+        key = (query, top_n, metadata_filter)
+        cached = self.query_cache.get(key, self.generation)
+        if cached is not None:
+            return [dict(result) for result in cached]
+        allowed = None
+        if metadata_filter is not None:
+            allowed = self.metadata_index.match(metadata_filter)
+            if not allowed:
+                return []
+        # The semantic cache does not know about filters, so filtered queries bypass it.
+        use_semantic = self.semantic_cache is not None and allowed is None
+        encoded = self.retriever.encode(query) if use_semantic else None
+        if encoded is not None:
+            similar = self.semantic_cache.get(encoded.dense, self.generation, top_n)
+            if similar is not None:
+                self.query_cache.put(key, self.generation, similar[:top_n])
+                return [dict(result) for result in similar[:top_n]]
+        start = time.perf_counter()
+        results = self._search(query, top_n, encoded, allowed)
+        if self.retriever.last_query_stats.timed_out or self.last_rerank_stats.budget_exhausted:
+            # Degraded results of a deadline miss are not worth remembering.
+            return results
+        self.query_cache.put(key, self.generation, [dict(result) for result in results])
+        if encoded is not None:
+            cost = time.perf_counter() - start
+            self.semantic_cache.put(encoded.dense, self.generation, top_n, [dict(r) for r in results], cost)
+        return results
+
+    def _search(
+        self,
+        query: str,
+        top_n: int,
+        encoded: Optional[EncodedText] = None,
+        allowed: Optional[List[str]] = None,
+    ) -> List[Dict]:
+        depth = self.rerank_policy.max_depth(top_n)
+        fused = self.retriever.query(query, top_n=depth, encoded=encoded, allowed=allowed)
+        return self._rerank_expand(query, fused, top_n)
+
+    def search_batch(
+        self, queries: Sequence[str], top_n: int = 5, metadata_filter: Optional[MetadataFilter] = None
+    ) -> List[List[Dict]]:
+        """
+        ``search`` for many queries, returning the same per-query results.
+
+        Cached queries are served from the query cache and repeated queries
+        are computed once. The rest are encoded in one batch, looked up in
+        the semantic cache (if enabled and unfiltered) and retrieved as one
+        batch (``HybridRetriever.query_batch``). Near-duplicates within one
+        batch are each computed, as none is cached before the batch runs.
+        Leg deadlines bound each batched leg as a whole, so with deadlines
+        set a timed-out leg degrades every query of the batch; as in
+        ``search``, such results are not cached.
+        """
+
+        if metadata_filter is not None:
+            allowed: Optional[List[str]] = self.metadata_index.match(metadata_filter)
+            if not allowed:
+                return [[] for _ in queries]
+        else:
+            allowed = None
+        results: List[List[Dict]] = [[] for _ in queries]
+        pending: Dict[str, List[int]] = {}
+        for idx, query in enumerate(queries):
+            if query in pending:
+                pending[query].append(idx)
+                continue
+            cached = self.query_cache.get((query, top_n, metadata_filter), self.generation)
+            if cached is not None:
+                results[idx] = [dict(result) for result in cached]
+            else:
+                pending[query] = [idx]
+        if not pending:
+            return results
+        misses = list(pending)
+        use_semantic = self.semantic_cache is not None and allowed is None
+        encoded = self.retriever.encode_batch(misses) if use_semantic else None
+        if encoded is not None:
+            remaining, remaining_encoded = [], []
+            for query, query_encoded in zip(misses, encoded):
+                similar = self.semantic_cache.get(query_encoded.dense, self.generation, top_n)
+                if similar is None:
+                    remaining.append(query)
+                    remaining_encoded.append(query_encoded)
+                    continue
+                self.query_cache.put((query, top_n, metadata_filter), self.generation, similar[:top_n])
+                for idx in pending[query]:
+                    results[idx] = [dict(result) for result in similar[:top_n]]
+            misses, encoded = remaining, remaining_encoded
+            if not misses:
+                return results
+        depth = self.rerank_policy.max_depth(top_n)
+        start = time.perf_counter()
+        fused_lists = self.retriever.query_batch(misses, top_n=depth, encoded=encoded, allowed=allowed)
+        # Degraded results of a deadline miss are not worth remembering.
+        cacheable = not self.retriever.last_query_stats.timed_out
+        retrieval_cost = (time.perf_counter() - start) / len(misses)
+        for pos, (query, fused) in enumerate(zip(misses, fused_lists)):
+            start = time.perf_counter()
+            computed = self._rerank_expand(query, fused, top_n)
+            if cacheable and not self.last_rerank_stats.budget_exhausted:
+                self.query_cache.put((query, top_n, metadata_filter), self.generation, computed)
+                if encoded is not None:
+                    cost = retrieval_cost + time.perf_counter() - start
+                    self.semantic_cache.put(
+                        encoded[pos].dense, self.generation, top_n, [dict(r) for r in computed], cost
+                    )
+            for idx in pending[query]:
+                results[idx] = [dict(result) for result in computed]
+        return results
+
+    def _rerank_expand(self, query: str, fused: List[Tuple[str, float]], top_n: int) -> List[Dict]:
+        candidates = [(self.children[cid], score) for cid, score in fused if cid in self.children]
+        reranked, self.last_rerank_stats = self.rerank_policy.rerank(self.reranker, query, candidates, top_n)
+        contexts = self.context.assemble(
+            [child.chunk_id for child, _ in reranked], token_budget=self.context_tokens, dedupe=self.dedupe_context
+        )
         results = []
-        for child, score in reranked[:top_n]:
-            context = self._parent_expand(child)
+        for (child, score), context in zip(reranked, contexts):
             results.append(
                 {
                     "chunk_id": child.chunk_id,
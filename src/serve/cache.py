@@ -0,0 +1,145 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from operator import mul
+from typing import Any, Callable, Hashable, List, Optional, Sequence, Tuple
+
+
+@dataclass
+class QueryCacheStats:
+    """Counters exposed as ``QueryResultCache.stats``."""
+
+    hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    invalidated: int = 0
+    evictions: int = 0
+
+
+class QueryResultCache:
+    """
+    LRU cache of search results with a TTL, tied to an index generation.
+
+    Every entry remembers the index generation it was computed against; a
+    lookup under a different generation (the index changed since) or after
+    ``ttl_seconds`` is a miss and drops the entry. ``max_entries=0`` disables
+    the cache.
+    """
+
+    def __init__(
+        self, max_entries: int = 1024, ttl_seconds: float = 300.0, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.stats = QueryCacheStats()
+        self._entries: "OrderedDict[Hashable, Tuple[int, float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, generation: int) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        entry_generation, expires_at, value = entry
+        if entry_generation != generation:
+            self.stats.invalidated += 1
+        elif self.clock() >= expires_at:
+            self.stats.expired += 1
+        else:
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return value
+        del self._entries[key]
+        self.stats.misses += 1
+        return None
+
+    def put(self, key: Hashable, generation: int, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (generation, self.clock() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+@dataclass
+class SemanticCacheStats:
+    """Counters exposed as ``SemanticCache.stats``."""
+
+    hits: int = 0
+    misses: int = 0
+    invalidated: int = 0
+    evictions: int = 0
+    # Original compute time of the results served from the cache.
+    saved_seconds: float = 0.0
+    # Time spent comparing query vectors, hit or miss.
+    lookup_seconds: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class SemanticCache:
+    """
+    Search results of previously answered queries, found by embedding similarity.
+
+    A lookup serves the most similar cached query whose (normalized) dense
+    embedding has an inner product of at least ``threshold`` with the new
+    query, was computed for at least as many results and against the current
+    index generation. Entries of older generations are dropped as they are
+    met; beyond ``max_entries`` the least recently used entry is evicted.
+    Lookups scan every entry, so ``max_entries`` also bounds the lookup cost
+    (reported in ``stats.lookup_seconds``).
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 64) -> None:
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.stats = SemanticCacheStats()
+        self._entries: "OrderedDict[int, Tuple[int, List[float], int, Any, float]]" = OrderedDict()
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, q_vec: Sequence[float], generation: int, top_n: int) -> Optional[Any]:
+        start = time.perf_counter()
+        q_vec = list(q_vec)
+        best_id, best_sim = None, self.threshold
+        for entry_id, (entry_generation, vec, entry_top_n, _, _) in list(self._entries.items()):
+            if entry_generation != generation:
+                del self._entries[entry_id]
+                self.stats.invalidated += 1
+                continue
+            if entry_top_n < top_n:
+                continue
+            sim = sum(map(mul, q_vec, vec))
+            if sim >= best_sim:
+                best_id, best_sim = entry_id, sim
+        self.stats.lookup_seconds += time.perf_counter() - start
+        if best_id is None:
+            self.stats.misses += 1
+            return None
+        self._entries.move_to_end(best_id)
+        _, _, _, value, cost = self._entries[best_id]
+        self.stats.hits += 1
+        self.stats.saved_seconds += cost
+        return value
+
+    def put(self, q_vec: Sequence[float], generation: int, top_n: int, value: Any, cost_seconds: float) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[self._next_id] = (generation, list(q_vec), top_n, value, cost_seconds)
+        self._next_id += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
@@ -0,0 +1,73 @@
+from bisect import bisect_left, insort
+from typing import Dict, List, Sequence, Set, Tuple
+
+from schema.validators import ChildChunk
+
+
+class ContextAssembler:
+    """
+    Parent -> ordered children adjacency index for context expansion.
+
+    ``add`` keeps every parent's children sorted by ``order`` (ties in first
+    ingest order) and records each child's token count, so expanding a hit
+    to its neighbours is a dictionary lookup instead of a corpus scan.
+    ``assemble`` builds the windows of all hits of a query at once; with
+    ``dedupe`` a neighbour already shown in a higher-ranked hit's window is
+    left out of later windows.
+    """
+
+    def __init__(self) -> None:
+        self.children: Dict[str, ChildChunk] = {}
+        self.token_counts: Dict[str, int] = {}
+        # parent_id -> [(order, seq, chunk_id)] sorted
+        self._siblings: Dict[str, List[Tuple[int, int, str]]] = {}
+        self._seq: Dict[str, int] = {}
+
+    def add(self, child: ChildChunk) -> None:
+        previous = self.children.get(child.chunk_id)
+        seq = self._seq.setdefault(child.chunk_id, len(self._seq))
+        if previous is not None:
+            self._siblings[previous.parent_id].remove((previous.order, seq, child.chunk_id))
+        self.children[child.chunk_id] = child
+        self.token_counts[child.chunk_id] = len(child.text.split())
+        insort(self._siblings.setdefault(child.parent_id, []), (child.order, seq, child.chunk_id))
+
+    def siblings(self, parent_id: str) -> List[str]:
+        """Child ids of ``parent_id`` in reading order."""
+
+        return [chunk_id for _, _, chunk_id in self._siblings.get(parent_id, [])]
+
+    def window(self, chunk_id: str) -> List[str]:
+        """``chunk_id`` with its previous and next sibling, in reading order."""
+
+        child = self.children[chunk_id]
+        siblings = self._siblings[child.parent_id]
+        pos = bisect_left(siblings, (child.order, self._seq[chunk_id], chunk_id))
+        return [entry[2] for entry in siblings[max(pos - 1, 0) : pos + 2]]
+
+    def _fit(self, chunk_ids: Sequence[str], token_budget: int) -> List[str]:
+        """Leading ``chunk_ids`` whose token counts fit in ``token_budget``."""
+
+        fitted: List[str] = []
+        total_tokens = 0
+        for chunk_id in chunk_ids:
+            tokens = self.token_counts[chunk_id]
+            if total_tokens + tokens > token_budget:
+                break
+            total_tokens += tokens
+            fitted.append(chunk_id)
+        return fitted
+
+    def assemble(self, chunk_ids: Sequence[str], token_budget: int = 400, dedupe: bool = True) -> List[str]:
+        """Expanded context text for each hit in ``chunk_ids`` (ranked best first)."""
+
+        shown: Set[str] = set()
+        texts: List[str] = []
+        for chunk_id in chunk_ids:
+            window = self.window(chunk_id)
+            if dedupe:
+                window = [cid for cid in window if cid == chunk_id or cid not in shown]
+            fitted = self._fit(window, token_budget)
+            shown.update(fitted)
+            texts.append("\n".join(self.children[cid].text for cid in fitted))
+        return texts
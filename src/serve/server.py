@@ -0,0 +1,223 @@
+import asyncio
+import json
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, is_dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from metadata.filters import MetadataFilter
+from serve.api import SearchService
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+MAX_BODY_BYTES = 1 << 20
+
+
+@dataclass
+class BatcherStats:
+    """Counters exposed as ``QueryBatcher.stats``."""
+
+    requests: int = 0
+    batches: int = 0
+    largest_batch: int = 0
+
+
+class QueryBatcher:
+    """
+    Coalesces concurrent searches into ``SearchService.search_batch`` calls.
+
+    The first request of a batch opens a ``window``-second collection window
+    (closed early once ``max_batch`` requests are waiting); the collected
+    requests are grouped by ``(top_n, filter)`` and each group runs as one
+    batched search on ``executor``, so the event loop never scores anything
+    itself. Use a single-thread executor: ``SearchService`` is not safe for
+    concurrent use, and every batch goes through it in turn.
+    """
+
+    def __init__(self, service: SearchService, executor: Executor, window: float = 0.005, max_batch: int = 32) -> None:
+        self.service = service
+        self.executor = executor
+        self.window = window
+        self.max_batch = max_batch
+        self.stats = BatcherStats()
+        self._pending: List[Tuple[str, int, Optional[MetadataFilter], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: Set[asyncio.Task] = set()
+
+    async def search(self, query: str, top_n: int = 5, metadata_filter: Optional[MetadataFilter] = None) -> List[Dict]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, top_n, metadata_filter, future))
+        self.stats.requests += 1
+        if len(self._pending) >= self.max_batch:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._dispatch)
+        return await future
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self.stats.batches += 1
+        self.stats.largest_batch = max(self.stats.largest_batch, len(batch))
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[str, int, Optional[MetadataFilter], asyncio.Future]]) -> None:
+        try:
+            groups: Dict[Tuple[int, Optional[MetadataFilter]], List[Tuple[str, asyncio.Future]]] = {}
+            for query, top_n, metadata_filter, future in batch:
+                try:
+                    groups.setdefault((top_n, metadata_filter), []).append((query, future))
+                except TypeError as exc:  # unhashable filter: fail this request, keep the rest of the batch
+                    future.set_exception(exc)
+            loop = asyncio.get_running_loop()
+            for (top_n, metadata_filter), requests in groups.items():
+                queries = [query for query, _ in requests]
+                try:
+                    results = await loop.run_in_executor(
+                        self.executor, self.service.search_batch, queries, top_n, metadata_filter
+                    )
+                except Exception as exc:  # surfaced to every request of the group
+                    for _, future in requests:
+                        if not future.done():
+                            future.set_exception(exc)
+                    continue
+                for (_, future), result in zip(requests, results):
+                    if not future.done():
+                        future.set_result(result)
+        except Exception as exc:
+            # Never leave a request waiting on a batch that failed outside a group's search.
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+
+
+def _jsonable(value: Any) -> Any:
+    if is_dataclass(value):
+        return asdict(value)
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+
+class SearchServer:
+    """
+    Minimal asyncio HTTP/1.1 server (stdlib only) in front of ``SearchService``.
+
+    ``POST /search`` takes a JSON body ``{"query": ..., "top_n": 5,
+    "filter": {"doc_ids": [...], ...}}`` and answers ``{"results": [...]}``;
+    ``GET /health`` reports the number of indexed chunks. Every connection
+    serves one request. Searches go through a ``QueryBatcher`` backed by a
+    single worker thread.
+    """
+
+    def __init__(
+        self,
+        service: SearchService,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        batch_window: float = 0.005,
+        max_batch: int = 32,
+    ) -> None:
+        self.service = service
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search")
+        self.batcher = QueryBatcher(service, self.executor, window=batch_window, max_batch=max_batch)
+        self._server: Optional[asyncio.base_events.Server] = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        # Port 0 asks the OS for a free port; report the bound one.
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        self.executor.shutdown(wait=False)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            status, payload = await self._respond(reader)
+        except Exception as exc:
+            status, payload = 500, {"error": str(exc)}
+        body = json.dumps(payload, ensure_ascii=False, default=_jsonable).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n"
+        )
+        writer.write(head.encode("ascii") + body)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _respond(self, reader: asyncio.StreamReader) -> Tuple[int, Dict[str, Any]]:
+        request_line = (await reader.readline()).decode("latin-1").split()
+        if len(request_line) != 3:
+            return 400, {"error": "malformed request line"}
+        method, path, _ = request_line
+        headers: Dict[str, str] = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if path == "/health":
+            return 200, {"status": "ok", "chunks": len(self.service.children)}
+        if path != "/search":
+            return 404, {"error": f"unknown path {path}"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+        length = int(headers.get("content-length", "0"))
+        if length > MAX_BODY_BYTES:
+            return 400, {"error": "request body too large"}
+        try:
+            request = json.loads(await reader.readexactly(length))
+            query = request["query"]
+            top_n = int(request.get("top_n", 5))
+            metadata_filter = MetadataFilter(**request["filter"]) if request.get("filter") else None
+        except (ValueError, KeyError, TypeError, asyncio.IncompleteReadError) as exc:
+            return 400, {"error": f"invalid request: {exc}"}
+        if not isinstance(query, str):
+            return 400, {"error": "query must be a string"}
+        results = await self.batcher.search(query, top_n, metadata_filter)
+        return 200, {"results": results}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="문서를 인덱싱한 뒤 HTTP 검색 서버를 실행합니다")
+    parser.add_argument("paths", nargs="+", help="인덱싱할 문서 경로 (md/html/pdf/docx/pptx)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--batch-window-ms", type=float, default=5.0, help="질의를 모으는 시간 창(ms)")
+    parser.add_argument("--max-batch", type=int, default=32)
+    args = parser.parse_args()
+
+    search_service = SearchService()
+    for doc_path in args.paths:
+        search_service.load_and_ingest(doc_path)
+    server = SearchServer(
+        search_service,
+        host=args.host,
+        port=args.port,
+        batch_window=args.batch_window_ms / 1000,
+        max_batch=args.max_batch,
+    )
+    print(f"serving {len(search_service.children)} chunks on http://{args.host}:{args.port}")
+    asyncio.run(server.serve_forever())
@@ -0,0 +1,337 @@
+import hashlib
+import heapq
+import multiprocessing
+from array import array
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from index.embedder import BGEEmbedder, EncodedText
+from ingest.loader import load_document
+from metadata.filters import MetadataFilter
+from rerank.cross_encoder import CrossEncoderReranker
+from rerank.policy import RerankDecision, RerankPolicy
+from retrieval.hybrid import LEGS, Hits, RetrievalStats, rrf_fuse
+from schema.validators import ChildChunk, DocumentBlocks
+from serve.api import SearchService
+from serve.cache import QueryResultCache
+
+
+def shard_for(doc_id: str, shards: int) -> int:
+    """Owning shard of ``doc_id``; stable across processes and runs (unlike ``hash``)."""
+
+    digest = hashlib.blake2b(doc_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+
+def merge_hits(shard_hits: Iterable[List[Tuple[str, float, Tuple[int, int]]]], top_k: int) -> Hits:
+    """
+    Global top ``top_k`` of one leg from per-shard ``(chunk_id, score, seq)`` lists, each sorted best first.
+
+    Indexers break score ties by ingest order; ``seq`` is the global ingest
+    order, so ties come out as they would from a single index.
+    """
+
+    merged = heapq.merge(*shard_hits, key=lambda hit: (-hit[1], hit[2]))
+    return [(cid, score) for cid, score, _ in islice(merged, top_k)]
+
+
+class _Shard:
+    """Worker-side end of the shard protocol, wrapping one ``SearchService``."""
+
+    COMMANDS = ("ingest", "hits", "children", "assemble")
+
+    def __init__(self, options: Dict[str, Any]) -> None:
+        self.service = SearchService(**options)
+        # chunk_id -> (global ingest number of its document, shard-local first-add order)
+        self.seq: Dict[str, Tuple[int, int]] = {}
+
+    def ingest(self, docs: List[DocumentBlocks], doc_seqs: List[int]) -> int:
+        latest = dict(zip((doc.doc_id for doc in docs), doc_seqs))
+        for child in self.service.ingest_many(docs):
+            if child.chunk_id not in self.seq:
+                self.seq[child.chunk_id] = (latest[child.doc_id], len(self.seq))
+        return len(self.service.children)
+
+    def hits(
+        self,
+        queries: List[str],
+        encoded: List[EncodedText],
+        top_k: Tuple[int, int, int],
+        metadata_filter: Optional[MetadataFilter],
+    ) -> Tuple[List[Dict[str, List[Tuple[str, float, Tuple[int, int]]]]], List[str]]:
+        """Per-query leg hits tagged with their ingest order, plus the legs that missed their deadline."""
+
+        allowed = None
+        if metadata_filter is not None:
+            allowed = self.service.metadata_index.match(metadata_filter)
+            if not allowed:
+                return [{name: [] for name in LEGS} for _ in queries], []
+        retriever = self.service.retriever
+        legs = retriever.query_legs_batch(queries, *top_k, encoded=encoded, allowed=allowed)
+        seq = self.seq
+        hits = [
+            {name: [(cid, score, seq[cid]) for cid, score in leg_hits] for name, leg_hits in per_query.items()}
+            for per_query in legs
+        ]
+        return hits, list(retriever.last_query_stats.timed_out)
+
+    def children(self, chunk_ids: List[str]) -> Dict[str, ChildChunk]:
+        return {cid: self.service.children[cid] for cid in chunk_ids}
+
+    def assemble(self, ranked_ids: List[List[str]]) -> List[List[str]]:
+        service = self.service
+        return [
+            service.context.assemble(chunk_ids, token_budget=service.context_tokens, dedupe=service.dedupe_context)
+            for chunk_ids in ranked_ids
+        ]
+
+
+def _serve_shard(conn: Any, options: Dict[str, Any]) -> None:
+    shard = _Shard(options)
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+            if message is None:
+                break
+            command, args = message
+            try:
+                if command not in _Shard.COMMANDS:
+                    raise ValueError(f"Unknown shard command: {command}")
+                conn.send((True, getattr(shard, command)(*args)))
+            except Exception as exc:
+                conn.send((False, exc))
+    finally:
+        shard.service.retriever.close()
+        conn.close()
+
+
+class ShardedSearchService:
+    """
+    ``SearchService`` partitioned by ``doc_id`` hash across worker processes.
+
+    Every shard is a ``SearchService`` (built from ``service_options``) in its
+    own process, owning the dense, sparse and multi-vector indexes of its
+    documents; a document's parents and children live on one shard, so
+    context expansion stays shard-local. A batch of queries is encoded once
+    here and scattered to all shards over pipes; each shard returns its
+    unfused per-leg top-k lists. Leg scores do not depend on the rest of the
+    corpus (cosine, lexical weights, MaxSim), so merging the lists by score
+    gives the global per-leg top-k and RRF sees global ranks. Reranking runs
+    here on the fused candidates' chunks, fetched from their shards, and the
+    final hits are expanded by their shards. Score ties are broken by global
+    ingest order, so results equal those of one ``SearchService`` that
+    ingested the same documents in the same order.
+
+    Legs that miss a ``leg_deadlines`` entry on any shard are listed in
+    ``last_query_stats.timed_out``; such results are not cached.
+
+    ``cascade`` is not supported: cascade decisions would be made per shard.
+    Neither is ``semantic_cache_threshold``.
+    """
+
+    def __init__(
+        self,
+        shards: int = 2,
+        start_method: Optional[str] = None,
+        rerank_policy: Optional[RerankPolicy] = None,
+        query_cache_size: int = 1024,
+        query_cache_ttl: float = 300.0,
+        top_k_d: int = 20,
+        top_k_s: int = 40,
+        top_k_mv: int = 20,
+        **service_options: Any,
+    ) -> None:
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        if service_options.get("cascade"):
+            raise ValueError("cascade decides per shard and cannot be merged; use cascade=False")
+        if service_options.get("semantic_cache_threshold") is not None:
+            raise ValueError("the semantic cache is not supported across shards; use semantic_cache_threshold=None")
+        self.shards = shards
+        self.top_k = (top_k_d, top_k_s, top_k_mv)
+        self.embedder = BGEEmbedder()
+        self.reranker = CrossEncoderReranker()
+        self.rerank_policy = rerank_policy or RerankPolicy()
+        self.last_rerank_stats = RerankDecision()
+        self.last_query_stats = RetrievalStats()
+        self.chunk_counts = [0] * shards
+        self.generation = 0
+        self._docs_ingested = 0
+        self.query_cache = QueryResultCache(max_entries=query_cache_size, ttl_seconds=query_cache_ttl)
+        context = multiprocessing.get_context(start_method)
+        self._conns = []
+        self._procs = []
+        for idx in range(shards):
+            parent_conn, child_conn = context.Pipe()
+            proc = context.Process(
+                target=_serve_shard, args=(child_conn, service_options), name=f"search-shard-{idx}", daemon=True
+            )
+            proc.start()
+            child_conn.close()
+            self._conns.append(parent_conn)
+            self._procs.append(proc)
+
+    def __enter__(self) -> "ShardedSearchService":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def _scatter(self, calls: Dict[int, Tuple[str, tuple]]) -> Dict[int, Any]:
+        """Send every shard its call first, then gather, so shards work in parallel."""
+
+        for idx, call in calls.items():
+            self._conns[idx].send(call)
+        replies = {idx: self._conns[idx].recv() for idx in calls}
+        for ok, value in replies.values():
+            if not ok:
+                raise value
+        return {idx: value for idx, (_, value) in replies.items()}
+
+    def ingest(self, doc: DocumentBlocks) -> None:
+        self.ingest_many([doc])
+
+    def ingest_many(self, docs: Iterable[DocumentBlocks]) -> None:
+        """Route each document to its shard; shards ingest their parts concurrently."""
+
+        parts: Dict[int, Tuple[List[DocumentBlocks], List[int]]] = {}
+        for doc in docs:
+            part = parts.setdefault(shard_for(doc.doc_id, self.shards), ([], []))
+            part[0].append(doc)
+            part[1].append(self._docs_ingested)
+            self._docs_ingested += 1
+        for idx, count in self._scatter({idx: ("ingest", part) for idx, part in parts.items()}).items():
+            self.chunk_counts[idx] = count
+        self.generation += 1
+
+    def load_and_ingest(self, path: str) -> None:
+        self.ingest(load_document(path))
+
+    def search(self, query: str, top_n: int = 5, metadata_filter: Optional[MetadataFilter] = None) -> List[Dict]:
+        return self.search_batch([query], top_n, metadata_filter)[0]
+
+    def search_batch(
+        self, queries: Sequence[str], top_n: int = 5, metadata_filter: Optional[MetadataFilter] = None
+    ) -> List[List[Dict]]:
+        """``SearchService.search_batch`` over all shards: one scatter-gather round per stage for the batch."""
+
+        results: List[List[Dict]] = [[] for _ in queries]
+        pending: Dict[str, List[int]] = {}
+        for idx, query in enumerate(queries):
+            if query in pending:
+                pending[query].append(idx)
+                continue
+            cached = self.query_cache.get((query, top_n, metadata_filter), self.generation)
+            if cached is not None:
+                results[idx] = [dict(result) for result in cached]
+            else:
+                pending[query] = [idx]
+        if not pending:
+            return results
+        misses = list(pending)
+        computed = self._search(misses, top_n, metadata_filter)
+        # Results missing a leg that ran late on some shard are not worth remembering.
+        cacheable = not self.last_query_stats.timed_out
+        for query, (hits, decision) in zip(misses, computed):
+            if cacheable and not decision.budget_exhausted:
+                self.query_cache.put((query, top_n, metadata_filter), self.generation, hits)
+            for idx in pending[query]:
+                results[idx] = [dict(result) for result in hits]
+        return results
+
+    def _encode(self, queries: List[str]) -> List[EncodedText]:
+        # Memoryviews do not pickle; arrays keep the float32 values exactly.
+        batch = self.embedder.encode_batch(queries)
+        return [
+            EncodedText(
+                dense=array("f", batch.dense.row(idx)),
+                lexical=batch.lexical[idx],
+                colbert=[array("f", vec) for vec in batch.colbert_vectors(idx)],
+            )
+            for idx in range(len(queries))
+        ]
+
+    def _search(
+        self, queries: List[str], top_n: int, metadata_filter: Optional[MetadataFilter]
+    ) -> List[Tuple[List[Dict], RerankDecision]]:
+        everyone = range(self.shards)
+        encoded = self._encode(queries)
+        replies = self._scatter({idx: ("hits", (queries, encoded, self.top_k, metadata_filter)) for idx in everyone})
+        shard_hits = {idx: hits for idx, (hits, _) in replies.items()}
+        timed_out = set().union(*(late for _, late in replies.values()))
+        self.last_query_stats = RetrievalStats(timed_out=[name for name in LEGS if name in timed_out])
+        depth = self.rerank_policy.max_depth(top_n)
+        owner: Dict[str, int] = {}
+        fused_lists = []
+        for q_idx in range(len(queries)):
+            legs = []
+            for name, top_k in zip(LEGS, self.top_k):
+                per_shard = []
+                for idx in everyone:
+                    hits = shard_hits[idx][q_idx][name]
+                    owner.update((hit[0], idx) for hit in hits)
+                    per_shard.append(hits)
+                legs.append(merge_hits(per_shard, top_k))
+            fused_lists.append(rrf_fuse(*legs)[:depth])
+
+        wanted: Dict[int, set] = {}
+        for fused in fused_lists:
+            for cid, _ in fused:
+                wanted.setdefault(owner[cid], set()).add(cid)
+        children: Dict[str, ChildChunk] = {}
+        for fetched in self._scatter({idx: ("children", (sorted(ids),)) for idx, ids in wanted.items()}).values():
+            children.update(fetched)
+
+        reranked_lists = []
+        decisions = []
+        for query, fused in zip(queries, fused_lists):
+            candidates = [(children[cid], score) for cid, score in fused]
+            reranked, self.last_rerank_stats = self.rerank_policy.rerank(self.reranker, query, candidates, top_n)
+            reranked_lists.append(reranked)
+            decisions.append(self.last_rerank_stats)
+
+        # Each shard expands its own hits, in global rank order (dedupe never crosses a parent, so never a shard).
+        ranked_ids: Dict[int, List[List[str]]] = {}
+        for q_idx, reranked in enumerate(reranked_lists):
+            for child, _ in reranked:
+                per_query = ranked_ids.setdefault(owner[child.chunk_id], [[] for _ in queries])
+                per_query[q_idx].append(child.chunk_id)
+        texts: Dict[Tuple[int, str], str] = {}
+        assembled = self._scatter({idx: ("assemble", (ids,)) for idx, ids in ranked_ids.items()})
+        for idx, per_query in assembled.items():
+            for q_idx, (chunk_ids, contexts) in enumerate(zip(ranked_ids[idx], per_query)):
+                texts.update(((q_idx, cid), text) for cid, text in zip(chunk_ids, contexts))
+
+        output = []
+        for q_idx, (reranked, decision) in enumerate(zip(reranked_lists, decisions)):
+            hits = [
+                {
+                    "chunk_id": child.chunk_id,
+                    "parent_id": child.parent_id,
+                    "score": score,
+                    "text": texts[(q_idx, child.chunk_id)],
+                    "metadata": child.metadata,
+                }
+                for child, score in reranked
+            ]
+            output.append((hits, decision))
+        return output
+
+    def close(self) -> None:
+        """Stop the shard processes."""
+
+        for conn in self._conns:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            conn.close()
+        for proc in self._procs:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        self._conns = []
+        self._procs = []
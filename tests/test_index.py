@@ -0,0 +1,465 @@
+import random
+from typing import Dict
+
+import pytest
+
+from eval.metrics import overlap_recall_at_k
+from index.dense import DenseIndexer
+from index.embedder import BGEEmbedder
+from index.embedding_cache import EmbeddingCache
+from index.multivector import MultiVectorIndexer
+from index.sparse import SparseIndexer
+
+
+TEXTS = [
+    "finance overview and research",
+    "engineering details and compliance",
+    "transformer dissolved gas analysis",
+    "partial discharge monitoring",
+    "legal review of finance contracts",
+    "research roadmap for engineering teams",
+]
+
+
+def test_encode_all_matches_separate_encoders():
+    embedder = BGEEmbedder(dim=32, colbert_dim=16, token_cache_size=4)
+    text = "Finance research finance engineering legal compliance"
+    encoded = embedder.encode_all(text)
+    assert list(encoded.dense) == pytest.approx(embedder.encode_dense(text), abs=1e-6)
+    assert encoded.lexical == embedder.encode_lexical(text)
+    expected = embedder.encode_colbert(text)
+    assert len(encoded.colbert) == len(expected)
+    for vec, ref in zip(encoded.colbert, expected):
+        assert list(vec) == pytest.approx(ref, abs=1e-6)
+    assert encoded.colbert[0] is encoded.colbert[2]
+    assert len(embedder._token_cache) == 4
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_encode_batch_stacks_outputs_in_order(workers):
+    embedder = BGEEmbedder(dim=32, colbert_dim=16, workers=workers, batch_size=2)
+    texts = TEXTS + ["", "finance finance"]
+    try:
+        batch = embedder.encode_batch(texts)
+    finally:
+        embedder.close()
+    assert len(batch.dense) == len(texts)
+    assert batch.lexical == [embedder.encode_lexical(t) for t in texts]
+    assert len(batch.colbert_offsets) == len(texts) + 1
+    for idx, text in enumerate(texts):
+        encoded = embedder.encode_all(text)
+        assert batch.dense.row(idx).tolist() == list(encoded.dense)
+        assert [v.tolist() for v in batch.colbert_vectors(idx)] == [list(v) for v in encoded.colbert]
+    assert embedder.encode_lexical_batch(texts[:1]) == batch.lexical[:1]
+    assert embedder.encode_colbert_batch(texts)[1] == batch.colbert_offsets
+
+
+def test_embedding_cache_memory_and_disk_tiers(tmp_path):
+    embedder = BGEEmbedder(dim=32, colbert_dim=16)
+    path = tmp_path / "embeddings.sqlite"
+    cache = EmbeddingCache(embedder, max_entries=2, path=path)
+    first = cache.encode_batch(TEXTS[:3])
+    assert (cache.stats.misses, cache.stats.evictions, len(cache)) == (3, 1, 2)
+    cache.encode_batch(TEXTS[2:3])
+    assert cache.stats.hits == 1
+    again = cache.encode_batch(TEXTS[:3])
+    assert (cache.stats.hits, cache.stats.disk_hits, cache.stats.misses) == (1, 3, 3)
+    assert again.dense.data == first.dense.data
+    assert again.lexical == first.lexical
+    assert again.colbert.data == first.colbert.data and again.colbert_offsets == first.colbert_offsets
+    cache.close()
+
+    reopened = EmbeddingCache(embedder, path=path)
+    reopened.encode_batch(TEXTS[:3])
+    assert (reopened.stats.disk_hits, reopened.stats.misses) == (3, 0)
+    reopened.close()
+    disk_only = EmbeddingCache(embedder, max_entries=0, path=path)
+    disk_only.encode_batch(TEXTS[:3])
+    disk_only.encode_batch(TEXTS[:3])
+    assert (len(disk_only), disk_only.stats.disk_hits, disk_only.stats.evictions) == (0, 6, 0)
+    disk_only.close()
+    other = EmbeddingCache(BGEEmbedder(dim=16, colbert_dim=16), path=path)
+    assert len(other.encode_batch(TEXTS[:1]).dense.data) == 16
+    assert other.stats.misses == 1
+    other.close()
+
+
+def test_dense_matrix_matches_bruteforce_ranking():
+    embedder = BGEEmbedder()
+    dense = DenseIndexer(embedder=embedder)
+    for idx, text in enumerate(TEXTS):
+        dense.add(f"c{idx}", text)
+    q_vec = embedder.encode_dense("finance research")
+    expected = sorted(
+        ((f"c{idx}", sum(a * b for a, b in zip(q_vec, embedder.encode_dense(t)))) for idx, t in enumerate(TEXTS)),
+        key=lambda x: x[1],
+        reverse=True,
+    )
+    results = dense.query("finance research", top_k=3)
+    assert [cid for cid, _ in results] == [cid for cid, _ in expected[:3]]
+    assert len(dense.query("finance research", top_k=100)) == len(TEXTS)
+
+
+def test_dense_add_overwrites_existing_row():
+    dense = DenseIndexer()
+    dense.add("c1", "finance overview")
+    dense.add("c1", "engineering details")
+    assert len(dense) == 1
+    assert dense.texts["c1"] == "engineering details"
+
+
+def test_hnsw_mode_recall_against_exact():
+    embedder = BGEEmbedder()
+    dense = DenseIndexer(embedder=embedder, mode="hnsw", hnsw_m=8, ef_construction=64)
+    for idx in range(300):
+        dense.add(f"c{idx}", f"{TEXTS[idx % len(TEXTS)]} variant {idx}")
+    queries = [embedder.encode_dense(f"finance query {i}") for i in range(10)]
+    exact = [[cid for cid, _ in dense.query_vector(q, 10, exact=True)] for q in queries]
+    approx = [[cid for cid, _ in dense.query_vector(q, 10, ef_search=64)] for q in queries]
+    assert overlap_recall_at_k(approx, exact, k=10) >= 0.9
+
+
+def test_hnsw_overwrite_relinks_node():
+    embedder = BGEEmbedder(dim=32)
+    rng = random.Random(1)
+
+    def unit_vector():
+        vec = [rng.gauss(0, 1) for _ in range(32)]
+        norm = sum(x * x for x in vec) ** 0.5
+        return [x / norm for x in vec]
+
+    dense = DenseIndexer(embedder=embedder, mode="hnsw", hnsw_m=8, ef_construction=64, ef_search=32)
+    for idx in range(400):
+        dense.add(f"c{idx}", "text", vector=unit_vector())
+    for idx in range(0, 400, 2):
+        dense.add(f"c{idx}", "text", vector=unit_vector())
+    queries = [unit_vector() for _ in range(200)]
+    misses = 0
+    for q_vec in queries:
+        best = dense.query_vector(q_vec, 1, exact=True)[0][0]
+        misses += best not in [cid for cid, _ in dense.query_vector(q_vec, 5)]
+    # A fresh build of the same vectors misses 5 of 200; stale links missed 44.
+    assert misses <= 15
+
+
+def _quantized_recall(dense: DenseIndexer, embedder: BGEEmbedder) -> float:
+    for idx in range(200):
+        dense.add(f"c{idx}", f"{TEXTS[idx % len(TEXTS)]} variant {idx}")
+    queries = [embedder.encode_dense(f"finance query {i}") for i in range(10)]
+    exact = []
+    for q in queries:
+        scores = sorted(((cid, sum(a * b for a, b in zip(q, dense.vector(cid)))) for cid in dense.chunk_ids), key=lambda x: -x[1])
+        exact.append([cid for cid, _ in scores[:5]])
+    dense.train_quantizer()
+    approx = [[cid for cid, _ in dense.query_vector(q, 5)] for q in queries]
+    return overlap_recall_at_k(approx, exact, k=5)
+
+
+def test_int8_quantization_recall_and_size():
+    embedder = BGEEmbedder(dim=64)
+    dense = DenseIndexer(embedder=embedder, quantization="int8")
+    assert _quantized_recall(dense, embedder) >= 0.8
+    assert dense.bytes_per_vector() == 64
+    assert len(dense.matrix) == 0
+
+
+def test_product_quantization_with_rescoring():
+    embedder = BGEEmbedder(dim=64)
+    dense = DenseIndexer(embedder=embedder, quantization="pq", pq_subvectors=8, pq_bits=4, rescore_k=20)
+    assert _quantized_recall(dense, embedder) >= 0.8
+    assert dense.bytes_per_vector() == 8 + 64 * 4
+
+
+def test_dense_save_and_open_roundtrip(tmp_path):
+    embedder = BGEEmbedder(dim=64)
+    for options in ({}, {"mode": "hnsw", "hnsw_m": 4}, {"quantization": "int8"}):
+        dense = DenseIndexer(embedder=embedder, **options)
+        for idx, text in enumerate(TEXTS):
+            dense.add(f"c{idx}", text)
+        expected = dense.query("finance research", top_k=3)
+        path = tmp_path / "dense.idx"
+        dense.save(path)
+        reopened = DenseIndexer.open(path)
+        assert isinstance(reopened.matrix.data, memoryview)
+        assert reopened.query("finance research", top_k=3) == expected
+        reopened.add("new", "finance research")
+        assert "new" in [cid for cid, _ in reopened.query("finance research", top_k=3)]
+
+
+def test_dense_save_over_its_own_mapping(tmp_path):
+    embedder = BGEEmbedder(dim=64)
+    dense = DenseIndexer(embedder=embedder)
+    for idx in range(50):
+        dense.add(f"c{idx}", f"{TEXTS[idx % len(TEXTS)]} {idx}")
+    expected = dense.query("finance research", top_k=5)
+    path = tmp_path / "dense.idx"
+    dense.save(path)
+    reopened = DenseIndexer.open(path)
+    reopened.save(path)
+    again = DenseIndexer.open(path)
+    assert len(again.chunk_ids) == 50
+    assert again.query("finance research", top_k=5) == expected
+    assert [p.name for p in tmp_path.iterdir()] == ["dense.idx"]
+
+
+def test_open_rejects_truncated_index(tmp_path):
+    dense = DenseIndexer(embedder=BGEEmbedder(dim=64))
+    for idx in range(50):
+        dense.add(f"c{idx}", f"{TEXTS[idx % len(TEXTS)]} {idx}")
+    path = tmp_path / "dense.idx"
+    dense.save(path)
+    with open(path, "r+b") as handle:
+        handle.truncate(4096)
+    with pytest.raises(ValueError, match="truncated"):
+        DenseIndexer.open(path)
+
+
+def test_multivector_save_and_open_roundtrip(tmp_path):
+    mv = MultiVectorIndexer(embedder=BGEEmbedder(colbert_dim=16))
+    for idx, text in enumerate(TEXTS):
+        mv.add(f"c{idx}", text)
+    expected = mv.query("finance research", top_k=3)
+    path = tmp_path / "mv.idx"
+    mv.save(path)
+    reopened = MultiVectorIndexer.open(path)
+    assert [cid for cid, _ in reopened.query("finance research", top_k=3)] == [cid for cid, _ in expected]
+    reopened.add("c0", "partial discharge")
+    assert len(reopened.token_vectors) == len(TEXTS)
+
+
+def _reference_maxsim(q_vecs, doc_vecs) -> float:
+    if not q_vecs or not doc_vecs:
+        return 0.0
+    return sum(max(sum(a * b for a, b in zip(q, d)) for d in doc_vecs) for q in q_vecs) / len(q_vecs)
+
+
+def test_multivector_packed_maxsim_matches_reference():
+    embedder = BGEEmbedder(colbert_dim=16)
+    mv = MultiVectorIndexer(embedder=embedder)
+    for idx, text in enumerate(TEXTS):
+        mv.add(f"c{idx}", text)
+    mv.add("empty", "", token_vectors=[])
+    mv.add("c1", "maintenance of the transformer")
+    q_vecs = embedder.encode_colbert("transformer finance research")
+    expected = {cid: _reference_maxsim(q_vecs, mv.token_vectors[cid]) for cid in mv.token_vectors}
+    assert dict(zip(mv.chunk_ids, mv.maxsim_scores(q_vecs))) == pytest.approx(expected)
+    assert expected["c1"] == pytest.approx(_reference_maxsim(q_vecs, embedder.encode_colbert("maintenance of the transformer")))
+    subset = [mv.rows["c2"], mv.rows["c0"]]
+    assert mv.maxsim_scores(q_vecs, subset) == pytest.approx([expected["c2"], expected["c0"]])
+    top = mv.query("transformer finance research", top_k=3)
+    assert [cid for cid, _ in top] == sorted(expected, key=expected.get, reverse=True)[:3]
+
+
+def test_multivector_centroid_candidates(tmp_path):
+    embedder = BGEEmbedder(colbert_dim=16)
+    rng = random.Random(3)
+    vocab = " ".join(TEXTS).split()
+    mv = MultiVectorIndexer(embedder=embedder, num_centroids=8, nprobe=2)
+    for idx in range(60):
+        mv.add(f"c{idx}", " ".join(rng.choice(vocab) for _ in range(6)))
+    queries = [embedder.encode_colbert(" ".join(rng.sample(vocab, 3))) for _ in range(10)]
+    exact = [[cid for cid, _ in mv.query_vectors(q, top_k=5, exhaustive=True)] for q in queries]
+    probed_all = [[cid for cid, _ in mv.query_vectors(q, top_k=5, nprobe=8)] for q in queries]
+    assert probed_all == exact
+    approx = [[cid for cid, _ in mv.query_vectors(q, top_k=5)] for q in queries]
+    assert overlap_recall_at_k(approx, exact, k=5) >= 0.8
+    assert len(mv.candidates(queries[0], nprobe=1)) < len(mv)
+
+    mv.add("late", "transformer maintenance")
+    assert mv.rows["late"] in mv.candidates(embedder.encode_colbert("transformer maintenance"), nprobe=1)
+    path = tmp_path / "mv.idx"
+    mv.save(path)
+    reopened = MultiVectorIndexer.open(path)
+    assert reopened.centroids == mv.centroids
+    assert [reopened.query_vectors(q, top_k=5) for q in queries] == [mv.query_vectors(q, top_k=5) for q in queries]
+
+
+@pytest.mark.parametrize("compression, tolerance", [("float16", 1e-3), ("residual", 0.1)])
+def test_multivector_compressed_storage(tmp_path, compression, tolerance):
+    embedder = BGEEmbedder(colbert_dim=16)
+    rng = random.Random(5)
+    vocab = " ".join(TEXTS).split()
+    texts = [" ".join(rng.choice(vocab) for _ in range(6)) for _ in range(40)]
+    full = MultiVectorIndexer(embedder=embedder)
+    compressed = MultiVectorIndexer(embedder=embedder, num_centroids=8, compression=compression, residual_bits=4)
+    for idx, text in enumerate(texts):
+        full.add(f"c{idx}", text)
+        compressed.add(f"c{idx}", text)
+    compressed.train_centroids()
+    assert compressed.bytes_per_token() < full.bytes_per_token()
+    assert len(compressed.matrix) == 0
+    compressed.add("late", texts[0])
+    q_vecs = embedder.encode_colbert("transformer finance research")
+    expected = full.maxsim_scores(q_vecs) + full.maxsim_scores(q_vecs, [0])
+    assert compressed.maxsim_scores(q_vecs) == pytest.approx(expected, abs=tolerance)
+
+    path = tmp_path / "mv.idx"
+    compressed.save(path)
+    reopened = MultiVectorIndexer.open(path)
+    assert reopened.bytes_per_token() == compressed.bytes_per_token()
+    assert reopened.maxsim_scores(q_vecs) == compressed.maxsim_scores(q_vecs)
+
+
+def _reference_sparse_scores(sparse: SparseIndexer, query: str) -> Dict[str, float]:
+    chunk_terms = {cid: sparse.terms_for(cid) for cid in sparse.chunk_ids}
+    if sparse.use_lexical_weights:
+        q_weights = sparse.embedder.encode_lexical(query)
+        return {cid: sparse._lexical_score(q_weights, terms) for cid, terms in chunk_terms.items()}
+    avg_len = sum(sum(t.values()) for t in chunk_terms.values()) / len(chunk_terms)
+    scores: Dict[str, float] = {}
+    for cid, terms in chunk_terms.items():
+        for term in sparse._tokenize(query):
+            if term in terms:
+                bm25 = sparse._bm25(sparse.term_ids[term], terms[term], sum(terms.values()), avg_len)
+                scores[cid] = scores.get(cid, 0.0) + bm25
+    return scores
+
+
+def test_sparse_inverted_index_matches_exhaustive_scoring():
+    for lexical in (False, True):
+        sparse = SparseIndexer(use_lexical_weights=lexical)
+        for idx, text in enumerate(TEXTS * 3):
+            sparse.add(f"c{idx}", f"{text} {idx}")
+        sparse.add("c0", "legal compliance review")
+        reference = _reference_sparse_scores(sparse, "finance research compliance")
+        results = sparse.query("finance research compliance", top_k=len(reference))
+        assert len(results) == len(reference)
+        for cid, score in results:
+            assert score == pytest.approx(reference[cid])
+        assert [s for _, s in results] == sorted((s for _, s in results), reverse=True)
+        assert sparse.doc_freq("finance") == len(sparse.posting("finance")[0])
+
+
+def test_sparse_dynamic_pruning_matches_exhaustive():
+    rng = random.Random(3)
+    common = ["은", "는", "이", "가", "의"]
+    rare = [f"term{i}" for i in range(300)]
+    texts = [" ".join(rng.choice(common) for _ in range(20)) + " " + " ".join(rng.sample(rare, 5)) for _ in range(800)]
+    for lexical in (False, True):
+        pruned = SparseIndexer(use_lexical_weights=lexical, dynamic_pruning=True)
+        exhaustive = SparseIndexer(use_lexical_weights=lexical)
+        for idx, text in enumerate(texts):
+            pruned.add(f"c{idx}", text)
+            exhaustive.add(f"c{idx}", text)
+        for query in ("은 는 term1 term2", "의 term7", "가 이 term250 term251 term252"):
+            assert pruned.query(query, top_k=10) == exhaustive.query(query, top_k=10)
+        assert pruned.last_query_stats.skipped > 0
+        assert pruned.last_query_stats.scored < exhaustive.last_query_stats.scored
+
+
+def test_sparse_save_and_open_compressed(tmp_path):
+    for lexical in (False, True):
+        sparse = SparseIndexer(use_lexical_weights=lexical)
+        for idx, text in enumerate(TEXTS * 20):
+            sparse.add(f"c{idx}", f"{text} {idx % 7}")
+        path = tmp_path / "sparse.idx"
+        sparse.save(path)
+        reopened = SparseIndexer.open(path)
+        expected = sparse.query("finance research 3", top_k=5)
+        results = reopened.query("finance research 3", top_k=5)
+        assert [cid for cid, _ in results] == [cid for cid, _ in expected]
+        for (_, got), (_, want) in zip(results, expected):
+            assert got == (want if not lexical else pytest.approx(want, rel=0.02))
+        assert reopened.terms == sorted(reopened.terms)
+        reopened.add("c0", "partial discharge")
+        assert reopened.query("partial discharge", top_k=1)[0][0] == "c0"
+        report = sparse.size_report()
+        assert report["compressed_bytes_per_posting"] < report["memory_bytes_per_posting"]
+
+
+def test_allowed_chunks_are_pushed_down_into_every_indexer():
+    rng = random.Random(5)
+    embedder = BGEEmbedder(dim=64, colbert_dim=16)
+    texts = [" ".join(rng.sample(TEXTS, 2)) + f" {idx}" for idx in range(60)]
+    allowed = [f"c{idx}" for idx in range(0, 60, 3)]
+    dense = DenseIndexer(embedder=embedder)
+    multivector = MultiVectorIndexer(embedder=embedder)
+    sparse = SparseIndexer(embedder=embedder, dynamic_pruning=True)
+    for idx, text in enumerate(texts):
+        for index in (dense, multivector, sparse):
+            index.add(f"c{idx}", text)
+
+    def post_filtered(hits):
+        return [hit for hit in hits if hit[0] in allowed][:5]
+
+    assert dense.query("finance research", top_k=5, allowed=allowed) == post_filtered(
+        dense.query("finance research", top_k=60)
+    )
+    assert multivector.query("finance research", top_k=5, allowed=allowed) == post_filtered(
+        multivector.query("finance research", top_k=60)
+    )
+    for query in ("finance research", "partial discharge monitoring"):
+        filtered = sparse.query(query, top_k=5, allowed=allowed)
+        assert sparse.last_query_stats.filtered > 0
+        assert filtered == post_filtered(sparse.query(query, top_k=60))
+    probed = MultiVectorIndexer(embedder=embedder, num_centroids=8)
+    for idx, text in enumerate(texts):
+        probed.add(f"c{idx}", text)
+    assert {cid for cid, _ in probed.query("finance research", top_k=5, allowed=allowed)} <= set(allowed)
+
+
+def test_batched_queries_match_single_queries():
+    embedder = BGEEmbedder(dim=64, colbert_dim=16)
+    texts = [f"{text} {idx % 5}" for idx, text in enumerate(TEXTS * 5)]
+    queries = ["finance research", "partial discharge 3", "finance research", "unknown words"]
+    encoded = [embedder.encode_all(query) for query in queries]
+    dense = DenseIndexer(embedder=embedder)
+    multivector = MultiVectorIndexer(embedder=embedder)
+    for idx, text in enumerate(texts):
+        dense.add(f"c{idx}", text)
+        multivector.add(f"c{idx}", text)
+    assert dense.query_vectors_batch([e.dense for e in encoded], top_k=7) == [
+        dense.query_vector(e.dense, top_k=7) for e in encoded
+    ]
+    assert multivector.query_vectors_batch([e.colbert for e in encoded], top_k=7) == [
+        multivector.query_vectors(e.colbert, top_k=7) for e in encoded
+    ]
+    for lexical in (False, True):
+        for pruning in (False, True):
+            sparse = SparseIndexer(embedder=embedder, use_lexical_weights=lexical, dynamic_pruning=pruning)
+            for idx, text in enumerate(texts):
+                sparse.add(f"c{idx}", text)
+            allowed = [f"c{idx}" for idx in range(0, len(texts), 2)]
+            assert sparse.query_batch(queries, top_k=7) == [sparse.query(q, top_k=7) for q in queries]
+            assert sparse.query_batch(queries, top_k=7, allowed=allowed) == [
+                sparse.query(q, top_k=7, allowed=allowed) for q in queries
+            ]
+
+
+def test_quantizer_retrains_after_floats_are_released():
+    embedder = BGEEmbedder(dim=32)
+    exact = DenseIndexer(embedder=embedder)
+    for idx in range(60):
+        exact.add(f"c{idx}", f"{TEXTS[idx % len(TEXTS)]} variant {idx}")
+    queries = [embedder.encode_dense(f"finance query {i}") for i in range(10)]
+    expected = [[cid for cid, _ in exact.query_vector(q, 5)] for q in queries]
+    for options in ({"quantization": "int8"}, {"quantization": "pq", "pq_subvectors": 16, "pq_bits": 4}):
+        dense = DenseIndexer(embedder=embedder, **options)
+        for idx in range(40):
+            dense.add(f"c{idx}", f"{TEXTS[idx % len(TEXTS)]} variant {idx}")
+        dense.train_quantizer()
+        assert len(dense.matrix) == 0
+        for idx in range(40, 60):
+            dense.add(f"c{idx}", f"{TEXTS[idx % len(TEXTS)]} variant {idx}")
+        dense.train_quantizer()
+        assert len(dense.codes) == 60 * dense.quantizer.code_size
+        approx = [[cid for cid, _ in dense.query_vector(q, 5)] for q in queries]
+        assert overlap_recall_at_k(approx, expected, k=5) >= 0.6
+    with pytest.raises(ValueError):
+        DenseIndexer(embedder=embedder, quantization="int8").train_quantizer()
+
+
+def test_residual_maxsim_keeps_tokens_of_different_centroids_apart():
+    embedder = BGEEmbedder(colbert_dim=16)
+    mv = MultiVectorIndexer(embedder=embedder, num_centroids=8, compression="residual", residual_bits=1)
+    for idx in range(40):
+        mv.add(f"c{idx}", " ".join(f"w{idx}_{pos}" for pos in range(6)))
+    mv.train_centroids()
+    for idx in range(10):
+        mv.add(f"late{idx}", " ".join(f"x{idx}_{pos}" for pos in range(6)))
+    q_vecs = embedder.encode_colbert("w3_1 x4_2 finance")
+    expected = [
+        _reference_maxsim(q_vecs, [mv._row_vector(row) for row in range(mv.starts[idx], mv.ends[idx])])
+        for idx in range(len(mv))
+    ]
+    assert mv.maxsim_scores_batch([q_vecs])[0] == pytest.approx(expected, abs=1e-9)
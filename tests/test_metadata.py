@@ -1,8 +1,9 @@
 from pathlib import Path
 
-from chunk.parent_child import build_parents
+from chunk.parent_child import build_parents, chunk_document
 from ingest import markdown_html
 from metadata.enrich import _domain_tags
+from metadata.filters import MetadataFilter, MetadataIndex
 
 
 def test_metadata_contains_required_fields():
@@ -18,3 +19,30 @@ def test_metadata_contains_required_fields():
 def test_domain_tag_extraction():
     tags = _domain_tags("Finance engineering legal text")
     assert tags == ["finance", "engineering", "legal"]
+
+
+def test_metadata_bitmap_index_filters():
+    content = Path("tests/data/sample.md").read_text()
+    index = MetadataIndex()
+    children = []
+    for doc_id in ("doc-a", "doc-b"):
+        _, doc_children = chunk_document(markdown_html.parse_markdown(content, doc_id=doc_id))
+        children.extend(doc_children)
+    for child in children:
+        index.add(child.chunk_id, child.metadata)
+    assert index.match(MetadataFilter()) == [child.chunk_id for child in children]
+    doc_b = [child.chunk_id for child in children if child.metadata.doc_id == "doc-b"]
+    assert index.match(MetadataFilter(doc_ids=["doc-b", "missing"])) == doc_b
+    assert index.match(MetadataFilter(source_types=["pdf"])) == []
+    section = children[-1].metadata.section_path[:1]
+    expected = [c.chunk_id for c in children if c.metadata.doc_id == "doc-b" and c.metadata.section_path[:1] == section]
+    assert index.match(MetadataFilter(doc_ids=["doc-b"], section_prefix=section)) == expected
+    tag = "finance"
+    tagged = [c.chunk_id for c in children if tag in (c.metadata.domain_tags or [])]
+    assert index.match(MetadataFilter(domain_tags=[tag])) == tagged
+
+    moved = children[0]
+    moved.metadata.doc_id = "doc-c"
+    index.add(moved.chunk_id, moved.metadata)
+    assert index.match(MetadataFilter(doc_ids=["doc-c"])) == [moved.chunk_id]
+    assert moved.chunk_id not in index.match(MetadataFilter(doc_ids=["doc-a"]))
@@ -1,5 +1,6 @@
 from schema.validators import ChildChunk, Metadata
 from rerank.cross_encoder import CrossEncoderReranker
+from rerank.policy import RerankPolicy
 
 
 class DummyChild(ChildChunk):
@@ -41,3 +42,46 @@ def test_reranker_orders_by_overlap():
     child2 = make_child("unrelated text with few overlaps" * 5)
     scores = reranker.score("finance research", [child2, child1])
     assert scores[0][0] == child1
+
+
+def test_batched_reranker_prunes_and_caches():
+    reranker = CrossEncoderReranker(cache_size=8)
+    texts = ["finance research", "finance notes and research plans", "legal memo" * 20, "research " * 30, "misc"]
+    children = [make_child(text) for text in texts]
+    for child in children:
+        reranker.add(child)
+    full = CrossEncoderReranker().score("Finance research", children)
+    top = reranker.score_batch("Finance research", children, top_n=2)
+    assert top[:2] == full[:2]
+    assert reranker.stats.pruned > 0
+    assert reranker.stats.scored == len(top)
+
+    again = reranker.score_batch("finance  RESEARCH", children)
+    assert again == full
+    assert reranker.stats.cache_hits == len(top)
+
+    edited = make_child("finance notes and research plans")
+    edited.text = "nothing relevant here at all, sorry!"
+    reranker.add(edited)
+    assert len(reranker._cache) == 0
+
+
+def test_rerank_policy_depth_and_budget():
+    children = [make_child("finance " * (idx + 1)) for idx in range(12)]
+    policy = RerankPolicy(max_depth_factor=4.0, tolerance=0.1)
+    assert policy.depth([1.0, 0.5, 0.45, 0.3, 0.2], top_n=2) == 3
+    assert policy.depth([1.0, 0.9, 0.2, 0.1], top_n=2) == 2
+    assert RerankPolicy().depth([1.0] * 12, top_n=3) == 6
+
+    reranker = CrossEncoderReranker()
+    fused = [(child, 1.0 - idx * 0.01) for idx, child in enumerate(children)]
+    unlimited, decision = RerankPolicy().rerank(reranker, "finance", fused, top_n=3)
+    assert unlimited == reranker.score("finance", children[:6])[:3]
+    assert decision.depth == decision.reranked == 6 and not decision.budget_exhausted
+
+    ticks = iter(range(100))
+    budgeted = RerankPolicy(budget_seconds=2.5, block_size=2, clock=lambda: next(ticks))
+    results, decision = budgeted.rerank(reranker, "finance", fused, top_n=5)
+    assert decision.budget_exhausted and decision.reranked == 4
+    assert results[:4] == reranker.score("finance", children[:4])
+    assert results[4] == fused[4]
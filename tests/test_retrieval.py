@@ -1,4 +1,9 @@
+import threading
+import time
+
 from index.dense import DenseIndexer
+from index.embedder import BGEEmbedder
+from index.multivector import MultiVectorIndexer
 from index.sparse import SparseIndexer
 from retrieval.hybrid import HybridRetriever
 
@@ -14,3 +19,174 @@ def test_hybrid_rrf_fusion():
     results = retriever.query("finance research", top_k_d=2, top_k_s=2, top_n=2)
     assert results[0][0] == "c1"
     assert len(results) == 2
+
+
+def test_hybrid_keeps_an_initially_empty_multivector_index():
+    embedder = BGEEmbedder(dim=64, colbert_dim=16)
+    multivector = MultiVectorIndexer(embedder=embedder)
+    retriever = HybridRetriever(DenseIndexer(embedder=embedder), SparseIndexer(embedder=embedder), multivector)
+    assert retriever.multivector is multivector
+
+
+def test_shared_query_encoding_matches_per_leg_encoding():
+    embedder = BGEEmbedder(dim=64, colbert_dim=16)
+    dense = DenseIndexer(embedder=embedder)
+    sparse = SparseIndexer(embedder=embedder, use_lexical_weights=True)
+    multivector = MultiVectorIndexer(embedder=embedder)
+    texts = ["finance overview and research", "engineering details and compliance", "legal research memo"]
+    for idx, text in enumerate(texts):
+        for index in (dense, sparse, multivector):
+            index.add(f"c{idx}", text)
+    retriever = HybridRetriever(dense, sparse, multivector)
+    encoded = retriever.encode("finance research")
+    assert encoded is not None
+    shared = retriever.query("finance research", top_n=3)
+    per_leg = retriever.rrf_fuse(
+        dense.query("finance research", top_k=20),
+        sparse.query("finance research", top_k=40),
+        multivector.query("finance research", top_k=20),
+    )[:3]
+    assert [cid for cid, _ in shared] == [cid for cid, _ in per_leg]
+    assert HybridRetriever(DenseIndexer(), sparse, multivector).encode("finance") is None
+
+
+def test_concurrent_legs_match_sequential_and_report_timeouts():
+    embedder = BGEEmbedder(dim=64, colbert_dim=16)
+    dense = DenseIndexer(embedder=embedder)
+    sparse = SparseIndexer(embedder=embedder, use_lexical_weights=True)
+    multivector = MultiVectorIndexer(embedder=embedder)
+    texts = ["finance overview and research", "engineering details and compliance", "legal research memo"]
+    for idx, text in enumerate(texts):
+        for index in (dense, sparse, multivector):
+            index.add(f"c{idx}", text)
+    sequential = HybridRetriever(dense, sparse, multivector).query("finance research", top_n=3)
+    retriever = HybridRetriever(dense, sparse, multivector, concurrent=True)
+    assert retriever.query("finance research", top_n=3) == sequential
+    assert retriever.last_query_stats.timed_out == []
+    assert set(retriever.last_query_stats.latencies) == {"dense", "sparse", "multivector"}
+
+    release = threading.Event()
+    slow_query = multivector.query_vectors
+
+    def stalled(*args, **kwargs):
+        release.wait(5)
+        return slow_query(*args, **kwargs)
+
+    multivector.query_vectors = stalled
+    retriever.leg_deadlines = {"multivector": 0.01}
+    degraded = retriever.query("finance research", top_n=3)
+    release.set()
+    retriever.close()
+    assert retriever.last_query_stats.timed_out == ["multivector"]
+    assert "multivector" not in retriever.last_query_stats.latencies
+    assert [cid for cid, _ in degraded] == [
+        cid for cid, _ in retriever.rrf_fuse(dense.query("finance research"), sparse.query("finance research", top_k=40))
+    ][:3]
+
+
+def test_cascade_skips_later_legs_when_confident_or_over_budget():
+    embedder = BGEEmbedder(dim=64, colbert_dim=16)
+    dense = DenseIndexer(embedder=embedder)
+    sparse = SparseIndexer(embedder=embedder, use_lexical_weights=True)
+    multivector = MultiVectorIndexer(embedder=embedder)
+    texts = ["finance overview and research", "engineering details and compliance", "legal research memo"]
+    for idx, text in enumerate(texts):
+        for index in (dense, sparse, multivector):
+            index.add(f"c{idx}", text)
+
+    confident = HybridRetriever(dense, sparse, multivector, cascade=True, cascade_margin=0.0)
+    assert confident.query("finance", top_n=3) == confident.rrf_fuse(sparse.query("finance", top_k=40))[:3]
+    assert confident.last_query_stats.skipped == {"dense": "confident", "multivector": "confident"}
+
+    scored = []
+    score_candidates = dense.query_candidates
+    dense.query_candidates = lambda q_vec, chunk_ids, top_k: scored.extend(chunk_ids) or score_candidates(
+        q_vec, chunk_ids, top_k
+    )
+    full = HybridRetriever(dense, sparse, multivector, cascade=True, cascade_margin=float("inf"))
+    full.query("research", top_n=3)
+    assert full.last_query_stats.skipped == {}
+    assert sorted(scored) == ["c0", "c2"]  # restricted to the sparse matches
+    assert full.cascade_stats.runs == {"sparse": 1, "dense": 1, "multivector": 1}
+
+    full.latency_budget = 0.0
+    full.query("research", top_n=3)
+    assert full.last_query_stats.skipped == {"dense": "budget", "multivector": "budget"}
+    assert full.cascade_stats.skip_rate("multivector") == 0.5
+
+
+def test_colbert_rescoring_over_fused_candidates():
+    embedder = BGEEmbedder(dim=64, colbert_dim=16)
+    dense = DenseIndexer(embedder=embedder)
+    sparse = SparseIndexer(embedder=embedder, use_lexical_weights=True)
+    multivector = MultiVectorIndexer(embedder=embedder)
+    texts = [f"{topic} report {idx}" for idx, topic in enumerate(["finance", "legal", "research", "engineering"] * 5)]
+    for idx, text in enumerate(texts):
+        for index in (dense, sparse, multivector):
+            index.add(f"c{idx}", text)
+    query = "finance research report"
+    base = HybridRetriever(dense, sparse, multivector)
+    first_stage = base.rrf_fuse(dense.query(query, top_k=20), sparse.query(query, top_k=40))
+    candidates = [cid for cid, _ in first_stage[:6]]
+
+    scored = HybridRetriever(dense, sparse, multivector, colbert_mode="score", colbert_depth=6)
+    results = scored.query(query, top_n=8)
+    rescored = multivector.query_candidates(embedder.encode_all(query).colbert, candidates, top_k=6)
+    assert results[:6] == rescored
+    assert [cid for cid, _ in results[6:]] == [cid for cid, _ in first_stage[6:8]]
+    assert set(scored.last_query_stats.latencies) == {"dense", "sparse", "multivector"}
+
+    fused = HybridRetriever(dense, sparse, multivector, colbert_mode="rrf", colbert_depth=6)
+    expected = base.rrf_fuse(dense.query(query, top_k=20), sparse.query(query, top_k=40), rescored)
+    assert fused.query(query, top_n=5) == expected[:5]
+
+
+def test_query_batch_matches_query():
+    embedder = BGEEmbedder(dim=64, colbert_dim=16)
+    dense = DenseIndexer(embedder=embedder)
+    sparse = SparseIndexer(embedder=embedder, use_lexical_weights=True)
+    multivector = MultiVectorIndexer(embedder=embedder)
+    texts = [f"{topic} report {idx}" for idx, topic in enumerate(["finance", "legal", "research", "engineering"] * 5)]
+    for idx, text in enumerate(texts):
+        for index in (dense, sparse, multivector):
+            index.add(f"c{idx}", text)
+    queries = ["finance research report", "legal 3", "finance research report"]
+    for options in ({}, {"colbert_mode": "score", "colbert_depth": 6}):
+        retriever = HybridRetriever(dense, sparse, multivector, **options)
+        assert retriever.query_batch(queries, top_n=5) == [retriever.query(q, top_n=5) for q in queries]
+    assert retriever.query_batch([]) == []
+
+
+def test_slow_leg_does_not_starve_later_queries():
+    embedder = BGEEmbedder(dim=64, colbert_dim=16)
+    dense = DenseIndexer(embedder=embedder)
+    sparse = SparseIndexer(embedder=embedder, use_lexical_weights=True)
+    multivector = MultiVectorIndexer(embedder=embedder)
+    texts = ["finance overview and research", "engineering details and compliance", "legal research memo"]
+    for idx, text in enumerate(texts):
+        for index in (dense, sparse, multivector):
+            index.add(f"c{idx}", text)
+    fast_query = multivector.query_vectors
+    calls = []
+
+    def slow(*args, **kwargs):
+        calls.append(1)
+        time.sleep(0.3)
+        return fast_query(*args, **kwargs)
+
+    multivector.query_vectors = slow
+    deadlines = {"dense": 0.1, "sparse": 0.1, "multivector": 0.05}
+    retriever = HybridRetriever(dense, sparse, multivector, concurrent=True, leg_deadlines=deadlines)
+    expected = retriever.rrf_fuse(dense.query("finance research"), sparse.query("finance research", top_k=40))[:3]
+    for _ in range(5):
+        start = time.perf_counter()
+        fused = retriever.query("finance research", top_n=3)
+        assert time.perf_counter() - start < 0.25
+        assert retriever.last_query_stats.timed_out == ["multivector"]
+        assert [cid for cid, _ in fused] == [cid for cid, _ in expected]
+    # The late multi-vector run was not restarted while it was still going.
+    assert len(calls) == 1
+    time.sleep(0.3)
+    multivector.query_vectors = fast_query
+    assert retriever.query("finance research", top_n=3) and retriever.last_query_stats.timed_out == []
+    retriever.close()
@@ -1,7 +1,23 @@
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+from dataclasses import replace
 from pathlib import Path
 
+import pytest
+
+from chunk.parent_child import chunk_document
 from ingest import markdown_html
+from metadata.filters import MetadataFilter
+from rerank.policy import RerankPolicy
 from serve.api import SearchService
+from serve.cache import QueryResultCache, SemanticCache
+from serve.context import ContextAssembler
+from serve.server import SearchServer
+from serve.shard import ShardedSearchService, shard_for
 
 
 def test_search_service_end_to_end():
@@ -14,3 +30,371 @@ def test_search_service_end_to_end():
     for res in results:
         assert "text" in res
         assert res["metadata"].chunk_role == "child"
+
+
+def test_search_service_sparse_options():
+    content = Path("tests/data/sample.md").read_text()
+    doc = markdown_html.parse_markdown(content, doc_id="md-doc-sparse")
+    plain = SearchService()
+    pruned = SearchService(sparse_options={"dynamic_pruning": True})
+    for service in (plain, pruned):
+        service.ingest(doc)
+    assert pruned.sparse.dynamic_pruning and pruned.sparse.use_lexical_weights
+    assert pruned.search("finance engineering") == plain.search("finance engineering")
+    assert pruned.sparse.last_query_stats.scored
+
+
+def test_search_service_multivector_options():
+    content = Path("tests/data/sample.md").read_text()
+    service = SearchService(multivector_options={"num_centroids": 4, "nprobe": 2, "ndocs": 8})
+    service.ingest(markdown_html.parse_markdown(content, doc_id="md-doc-plaid"))
+    assert service.search("finance engineering")
+    assert len(service.multivector.centroids) == 4
+    encoded = service.retriever.encode("finance engineering")
+    candidates = set(service.multivector.candidates(encoded.colbert))
+    hits = service.multivector.query_vectors(encoded.colbert, top_k=5)
+    assert hits and all(service.multivector.rows[cid] in candidates for cid, _ in hits)
+
+
+def test_search_service_compressed_multivector():
+    content = Path("tests/data/sample.md").read_text()
+    doc = markdown_html.parse_markdown(content, doc_id="md-doc-compressed")
+    for options in ({"compression": "float16"}, {"compression": "residual", "num_centroids": 4}):
+        service = SearchService(multivector_options=options)
+        service.ingest(doc)
+        assert service.search("finance engineering")
+        assert len(service.multivector.matrix) == 0
+        assert service.multivector.bytes_per_token() < 4 * service.multivector.matrix.dim
+
+
+def test_reingest_reuses_cached_embeddings(tmp_path):
+    content = Path("tests/data/sample.md").read_text()
+    doc = markdown_html.parse_markdown(content, doc_id="md-doc-cache")
+    service = SearchService(embedding_cache_path=tmp_path / "embeddings.sqlite")
+    service.ingest(doc)
+    children = len(service.children)
+    service.ingest(doc)
+    assert service.embedding_cache.stats.hits == children
+    restarted = SearchService(embedding_cache_path=tmp_path / "embeddings.sqlite")
+    restarted.ingest(doc)
+    assert restarted.embedding_cache.stats.disk_hits == children
+    assert restarted.embedding_cache.stats.misses == 0
+
+
+def test_query_cache_hits_until_ingest_changes_generation():
+    content = Path("tests/data/sample.md").read_text()
+    service = SearchService()
+    service.ingest(markdown_html.parse_markdown(content, doc_id="md-doc-a"))
+    first = service.search("finance engineering")
+    first[0]["text"] = "mutated by caller"
+    second = service.search("finance engineering")
+    assert service.query_cache.stats.hits == 1
+    assert second[0]["text"] != "mutated by caller"
+    service.ingest(markdown_html.parse_markdown(content, doc_id="md-doc-b"))
+    service.search("finance engineering")
+    assert service.query_cache.stats.invalidated == 1
+
+
+def test_query_result_cache_ttl_and_lru():
+    now = [0.0]
+    cache = QueryResultCache(max_entries=2, ttl_seconds=10.0, clock=lambda: now[0])
+    cache.put("a", 0, ["A"])
+    cache.put("b", 0, ["B"])
+    assert cache.get("a", 0) == ["A"]
+    cache.put("c", 0, ["C"])
+    assert cache.get("b", 0) is None and cache.stats.evictions == 1
+    now[0] = 10.0
+    assert cache.get("a", 0) is None and cache.stats.expired == 1
+    assert cache.get("c", 1) is None and cache.stats.invalidated == 1
+    assert len(cache) == 0
+
+
+def test_semantic_cache_matches_similar_vectors():
+    cache = SemanticCache(threshold=0.9, max_entries=2)
+    cache.put([1.0, 0.0], 0, 5, ["A"], cost_seconds=0.5)
+    cache.put([0.0, 1.0], 0, 3, ["B"], cost_seconds=0.25)
+    assert cache.get([0.96, 0.28], 0, 5) == ["A"]
+    assert cache.get([0.28, 0.96], 0, 5) is None
+    assert cache.get([0.28, 0.96], 0, 3) == ["B"]
+    assert cache.stats.hit_rate == 2 / 3
+    assert cache.stats.saved_seconds == 0.75
+    cache.put([0.6, 0.8], 0, 5, ["C"], cost_seconds=0.1)
+    assert cache.stats.evictions == 1 and len(cache) == 2
+    assert cache.get([0.6, 0.8], 1, 5) is None
+    assert cache.stats.invalidated == 2 and len(cache) == 0
+
+
+def test_search_service_semantic_cache():
+    content = Path("tests/data/sample.md").read_text()
+    service = SearchService(query_cache_size=0, semantic_cache_threshold=0.99)
+    service.ingest(markdown_html.parse_markdown(content, doc_id="md-doc-sem"))
+    first = service.search("finance engineering", top_n=3)
+    assert service.search("finance engineering", top_n=2) == first[:2]
+    assert service.semantic_cache.stats.hits == 1
+    service.ingest(markdown_html.parse_markdown(content, doc_id="md-doc-sem-2"))
+    service.search("finance engineering", top_n=2)
+    assert service.semantic_cache.stats.invalidated == 1
+
+
+def test_search_service_metadata_filter():
+    content = Path("tests/data/sample.md").read_text()
+    service = SearchService()
+    service.ingest_many(markdown_html.parse_markdown(content, doc_id=doc_id) for doc_id in ("md-doc-a", "md-doc-b"))
+    results = service.search("finance engineering", top_n=50, metadata_filter=MetadataFilter(doc_ids=["md-doc-b"]))
+    expected = [cid for cid, child in service.children.items() if child.metadata.doc_id == "md-doc-b"]
+    assert sorted(result["chunk_id"] for result in results) == sorted(expected)
+    assert service.search("finance", metadata_filter=MetadataFilter(doc_ids=["missing"])) == []
+    unfiltered = service.search("finance engineering", top_n=50)
+    assert {result["metadata"].doc_id for result in unfiltered} == {"md-doc-a", "md-doc-b"}
+
+
+def test_search_batch_matches_search():
+    content = Path("tests/data/sample.md").read_text()
+    service = SearchService(query_cache_size=0)
+    service.ingest_many(markdown_html.parse_markdown(content, doc_id=doc_id) for doc_id in ("md-doc-a", "md-doc-b"))
+    queries = ["finance engineering", "research goals", "finance engineering", "없는 질의"]
+    expected = [service.search(query, top_n=3) for query in queries]
+    assert service.search_batch(queries, top_n=3) == expected
+    flt = MetadataFilter(doc_ids=["md-doc-a"])
+    assert service.search_batch(queries[:2], top_n=3, metadata_filter=flt) == [
+        service.search(query, top_n=3, metadata_filter=flt) for query in queries[:2]
+    ]
+
+    cached = SearchService()
+    cached.ingest(markdown_html.parse_markdown(content, doc_id="md-doc-a"))
+    cached.search("finance engineering", top_n=3)
+    batch = cached.search_batch(["finance engineering", "research goals"], top_n=3)
+    assert cached.query_cache.stats.hits == 1
+    assert batch[0] == cached.search("finance engineering", top_n=3)
+
+
+def test_search_records_rerank_depth_and_skips_cache_on_budget_miss():
+    content = Path("tests/data/sample.md").read_text()
+    service = SearchService(rerank_policy=RerankPolicy(max_depth_factor=4.0, tolerance=0.0))
+    service.ingest(markdown_html.parse_markdown(content, doc_id="md-doc-a"))
+    service.search("finance engineering", top_n=2)
+    assert 2 <= service.last_rerank_stats.depth <= 8
+    assert service.last_rerank_stats.reranked == service.last_rerank_stats.depth
+
+    starved = SearchService(rerank_policy=RerankPolicy(budget_seconds=0.0))
+    starved.ingest(markdown_html.parse_markdown(content, doc_id="md-doc-a"))
+    results = starved.search("finance engineering", top_n=2)
+    assert results and starved.last_rerank_stats.budget_exhausted
+    assert starved.last_rerank_stats.reranked == 0
+    assert len(starved.query_cache) == 0
+
+
+def _reference_expand(children, child, token_budget=400):
+    siblings = sorted((c for c in children if c.parent_id == child.parent_id), key=lambda c: c.order)
+    idx = next(i for i, s in enumerate(siblings) if s.chunk_id == child.chunk_id)
+    window = siblings[max(idx - 1, 0) : idx + 2]
+    parts, total = [], 0
+    for ch in window:
+        tokens = len(ch.text.split())
+        if total + tokens > token_budget:
+            break
+        total += tokens
+        parts.append(ch.text)
+    return "\n".join(parts)
+
+
+def test_context_assembler_windows_and_dedupe():
+    content = Path("tests/data/sample.md").read_text()
+    base = chunk_document(markdown_html.parse_markdown(content, doc_id="md-doc-a"))[1][0]
+    children = [
+        replace(base, chunk_id=f"c{idx}", parent_id=f"p{idx % 2}", order=(idx * 7) % 5, text=f"part {idx} " * (idx + 2))
+        for idx in range(10)
+    ]
+    assembler = ContextAssembler()
+    for child in children:
+        assembler.add(child)
+    hits = [child.chunk_id for child in children]
+    for budget in (400, 12):
+        texts = assembler.assemble(hits, token_budget=budget, dedupe=False)
+        assert texts == [_reference_expand(children, child, budget) for child in children]
+    assert assembler.siblings("p0") == [c.chunk_id for c in sorted(children, key=lambda c: c.order) if c.parent_id == "p0"]
+
+    first, second = assembler.assemble(assembler.siblings("p0")[:2])
+    assert first == _reference_expand(children, assembler.children[assembler.siblings("p0")[0]])
+    assert second == assembler.children[assembler.siblings("p0")[1]].text + "\n" + assembler.children[
+        assembler.siblings("p0")[2]
+    ].text
+
+    moved = replace(children[0], parent_id="elsewhere")
+    assembler.add(moved)
+    assert assembler.siblings("elsewhere") == ["c0"]
+    assert "c0" not in assembler.siblings("p0")
+
+
+async def _post_search(port, payload):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(
+        b"POST /search HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+        + f"Content-Length: {len(body)}\r\n\r\n".encode("ascii")
+        + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(payload)
+
+
+def test_search_server_coalesces_concurrent_requests():
+    content = Path("tests/data/sample.md").read_text()
+    service = SearchService()
+    service.ingest_many(markdown_html.parse_markdown(content, doc_id=doc_id) for doc_id in ("md-doc-a", "md-doc-b"))
+    queries = ["finance engineering", "research goals", "finance", "없는 질의"]
+
+    async def scenario():
+        server = SearchServer(service, port=0, batch_window=0.05)
+        await server.start()
+        try:
+            responses = await asyncio.gather(
+                *(_post_search(server.port, {"query": query, "top_n": 3}) for query in queries),
+                _post_search(server.port, {"query": "finance", "top_n": 3, "filter": {"doc_ids": ["md-doc-b"]}}),
+                _post_search(server.port, {"top_n": 3}),
+            )
+        finally:
+            await server.close()
+        return responses, server.batcher.stats
+
+    responses, stats = asyncio.run(scenario())
+    for (status, payload), query in zip(responses, queries):
+        assert status == 200
+        expected = service.search(query, top_n=3)
+        assert [r["chunk_id"] for r in payload["results"]] == [r["chunk_id"] for r in expected]
+        assert [r["text"] for r in payload["results"]] == [r["text"] for r in expected]
+    status, payload = responses[len(queries)]
+    assert status == 200 and payload["results"]
+    assert {r["metadata"]["doc_id"] for r in payload["results"]} == {"md-doc-b"}
+    assert responses[-1][0] == 400
+    assert stats.requests == len(queries) + 1
+    assert stats.batches == 1 and stats.largest_batch == len(queries) + 1
+
+
+def _random_docs(rng, vocab, count):
+    docs = []
+    for doc_idx in range(count):
+        sections = []
+        for section in range(3):
+            paragraphs = "\n\n".join(" ".join(rng.choice(vocab) for _ in range(40)) for _ in range(3))
+            sections.append(f"# Section {section}\n\n{paragraphs}")
+        docs.append(markdown_html.parse_markdown("\n\n".join(sections), doc_id=f"doc-{doc_idx}"))
+    return docs
+
+
+def test_sharded_search_matches_single_service():
+    rng = random.Random(7)
+    vocab = [f"term{idx}" for idx in range(300)]
+    docs = _random_docs(rng, vocab, 8)
+    single = SearchService(query_cache_size=0)
+    single.ingest_many(docs)
+    queries = [" ".join(rng.sample(vocab, 3)) for _ in range(6)]
+    flt = MetadataFilter(doc_ids=["doc-1", "doc-6"])
+
+    with ShardedSearchService(shards=3, query_cache_size=0) as sharded:
+        sharded.ingest_many(docs[:5])
+        sharded.ingest_many(docs[5:])
+        assert sum(sharded.chunk_counts) == len(single.children)
+        sharded_counts = list(sharded.chunk_counts)
+        assert len([count for count in sharded.chunk_counts if count]) > 1
+        assert sharded.search_batch(queries, top_n=4) == [single.search(query, top_n=4) for query in queries]
+        assert sharded.search(queries[0], top_n=4, metadata_filter=flt) == single.search(
+            queries[0], top_n=4, metadata_filter=flt
+        )
+    # Every chunk lives on its document's shard, and a fresh interpreter (new hash seed) routes the same way.
+    expected_counts = [0, 0, 0]
+    for child in single.children.values():
+        expected_counts[shard_for(child.doc_id, 3)] += 1
+    assert sharded_counts == expected_counts
+    doc_ids = [f"doc-{idx}" for idx in range(8)]
+    script = f"from serve.shard import shard_for; print([shard_for(d, 3) for d in {doc_ids!r}])"
+    fresh = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True, cwd="src")
+    assert fresh.stdout.strip() == str([shard_for(doc_id, 3) for doc_id in doc_ids])
+
+
+def test_search_server_rejects_bad_filter_without_stalling_batch():
+    content = Path("tests/data/sample.md").read_text()
+    service = SearchService()
+    service.ingest(markdown_html.parse_markdown(content, doc_id="md-doc-a"))
+    expected = service.search("finance", top_n=3)
+
+    async def scenario():
+        server = SearchServer(service, port=0, batch_window=0.05)
+        await server.start()
+        try:
+            over_http = await asyncio.wait_for(
+                asyncio.gather(
+                    _post_search(server.port, {"query": "finance", "top_n": 3, "filter": {"doc_ids": [["x"]]}}),
+                    _post_search(server.port, {"query": "finance", "top_n": 3}),
+                ),
+                timeout=5,
+            )
+            # A filter that slips past validation must fail alone, not hang its batch.
+            direct = await asyncio.wait_for(
+                asyncio.gather(
+                    server.batcher.search("finance", 3, [["x"]]),
+                    server.batcher.search("finance", 3),
+                    return_exceptions=True,
+                ),
+                timeout=5,
+            )
+        finally:
+            await server.close()
+        return over_http, direct
+
+    (bad, good), (failed, served) = asyncio.run(scenario())
+    assert bad[0] == 400 and "doc_ids" in bad[1]["error"]
+    assert good[0] == 200 and [r["chunk_id"] for r in good[1]["results"]] == [r["chunk_id"] for r in expected]
+    assert isinstance(failed, TypeError)
+    assert [r["chunk_id"] for r in served] == [r["chunk_id"] for r in expected]
+
+
+def test_search_batch_honours_deadlines_and_semantic_cache():
+    content = Path("tests/data/sample.md").read_text()
+    service = SearchService(semantic_cache_threshold=0.99, concurrent_legs=True, leg_deadlines={"multivector": 0.02})
+    service.ingest(markdown_html.parse_markdown(content, doc_id="md-doc-a"))
+    batched = service.multivector.query_vectors_batch
+
+    def slow(*args, **kwargs):
+        time.sleep(0.2)
+        return batched(*args, **kwargs)
+
+    service.multivector.query_vectors_batch = slow
+    degraded = service.search_batch(["finance engineering", "research goals"], top_n=3)
+    assert service.retriever.last_query_stats.timed_out == ["multivector"]
+    assert degraded[0]
+    assert len(service.query_cache) == 0 and len(service.semantic_cache) == 0
+
+    time.sleep(0.25)
+    service.multivector.query_vectors_batch = batched
+    first = service.search_batch(["finance engineering"], top_n=3)[0]
+    assert service.retriever.last_query_stats.timed_out == []
+    assert first == service.search("finance engineering", top_n=3)
+    assert len(service.semantic_cache) == 1
+    service.query_cache.clear()
+    assert service.search_batch(["finance engineering"], top_n=2) == [first[:2]]
+    assert service.semantic_cache.stats.hits == 1
+    service.retriever.close()
+
+
+def test_sharded_search_skips_cache_on_deadline_miss():
+    rng = random.Random(3)
+    vocab = [f"term{idx}" for idx in range(300)]
+    docs = _random_docs(rng, vocab, 6)
+    queries = [" ".join(rng.sample(vocab, 3)) for _ in range(4)]
+    with pytest.raises(ValueError):
+        ShardedSearchService(shards=2, semantic_cache_threshold=0.9)
+    # A negative deadline has always passed, so the multi-vector leg is never waited for.
+    with ShardedSearchService(shards=2, concurrent_legs=True, leg_deadlines={"multivector": -1.0}) as sharded:
+        sharded.ingest_many(docs)
+        assert all(sharded.search_batch(queries, top_n=3))
+        assert sharded.last_query_stats.timed_out == ["multivector"]
+        assert len(sharded.query_cache) == 0
+    with ShardedSearchService(shards=2, concurrent_legs=True, leg_deadlines={"multivector": 30.0}) as sharded:
+        sharded.ingest_many(docs)
+        sharded.search_batch(queries, top_n=3)
+        assert sharded.last_query_stats.timed_out == []
+        assert len(sharded.query_cache) == len(queries)